@@ -18,34 +18,76 @@ environment.
 
 import base64
 import json
+import logging
 import os
 import shlex
+import sqlite3
 import subprocess
 import sys
 import tempfile
+import threading
 import time
 import traceback
 import uuid
+from collections import deque
+from dataclasses import dataclass
 from datetime import UTC, datetime
-from pathlib import Path
-import logging
+from itertools import chain
 from logging.handlers import RotatingFileHandler
-import threading
-from io import StringIO
-from collections import deque
+from pathlib import Path
 
-from flask import Flask, jsonify, request, send_from_directory, g
+from flask import (
+    Flask,
+    Response,
+    g,
+    jsonify,
+    request,
+    send_file,
+    send_from_directory,
+    stream_with_context,
+)
 from werkzeug.utils import secure_filename
 
-import requests
-
 from tools.diagnostics import run_diagnostics
+
+from .__version__ import __version__
+from .chat_search import ChatSearch
+from .chat_store import ChatLog, ChatStore
+from .chunked_upload import ChunkedUploads, UploadError
+from .command_jobs import CommandJob, JobQueueFull, JobRegistry, capture
 from .config import (
-    settings,
-    get_allowed_commands,
     TERMINAL_TIMEOUT_SECONDS,
+    get_allowed_commands,
+    settings,
 )
-from .__version__ import __version__
+from .context_builder import (
+    SUMMARY_REFRESH_MESSAGES,
+    ContextBuilder,
+    Summarizer,
+    summary_message,
+)
+from .dir_listing import FIELDS as LISTING_FIELDS
+from .dir_listing import ListingCache, project
+from .doc_index import DocumentIndexes
+from .file_index import FileIndexes
+from .image_prep import ImagePreprocessor
+from .model_catalog import ModelCatalog
+from .model_residency import ModelResidency
+from .ollama_client import (
+    CancelToken,
+    OllamaCancelled,
+    OllamaClient,
+    OllamaConnectionError,
+    OllamaError,
+    OllamaTimeout,
+)
+from .ollama_pool import OllamaPool
+from .process_table import ProcessTable
+from .response_cache import ResponseCache, make_key
+from .scheduler import ModelScheduler, QueueFull, QueueTimeout, Ticket
+from .script_supervisor import ScriptSupervisor
+from .system_metrics import MetricsSampler
+from .terminal_builtins import resolve as resolve_builtin
 
 BASE_DIR = settings.root_dir
 STATIC_DIR = BASE_DIR
@@ -117,6 +159,8 @@ _load_existing_client_errors()
 
 app = Flask(__name__, static_folder=str(STATIC_DIR), static_url_path="")
 app.logger = logger
+# Behind a front server that honours X-Sendfile, let it send file bodies.
+app.config["USE_X_SENDFILE"] = settings.x_sendfile
 
 
 @app.before_request
@@ -153,9 +197,13 @@ def _log_response(response):
         response.headers["Access-Control-Allow-Origin"] = origin
     else:
         response.headers["Access-Control-Allow-Origin"] = "*"
-    response.headers["Access-Control-Allow-Methods"] = "GET,POST,OPTIONS"
-    response.headers["Access-Control-Allow-Headers"] = "Content-Type, X-User-Id"
+    response.headers["Access-Control-Allow-Methods"] = "GET,POST,PUT,DELETE,OPTIONS"
+    response.headers["Access-Control-Allow-Headers"] = (
+        "Content-Type, X-User-Id, X-Chunk-Sha256"
+    )
     return response
+
+
 for d in ("icons", "profiles", "logs", "documents"):
     (BASE_DIR / d).mkdir(exist_ok=True)
 
@@ -171,30 +219,39 @@ except Exception:  # pragma: no cover - best effort logging
     psutil = None
     logger.warning("psutil module not found; /api/system-stats will be unavailable")
 
-# In-memory store of running subprocesses.  Keys are integer PIDs and
-# values are subprocess.Popen objects.  The mapping is persisted to a
-# small JSON file so that PIDs can be verified between requests.
+# Directory listings reused while a folder's mtime is unchanged
+directory_listings = ListingCache(settings.listing_cache_size)
+# Per-user file search, built on the first search and kept current below
+file_indexes = FileIndexes(settings.file_index_content, settings.file_index_reconcile)
+# Resumable uploads streamed in chunks into temp files under each user root
+chunked_uploads = ChunkedUploads(
+    settings.upload_chunk_mb * 1024 * 1024,
+    settings.chunked_upload_max_mb * 1024 * 1024,
+    settings.upload_session_ttl,
+)
+
+# Host metrics sampled once per interval for every client
+system_metrics = MetricsSampler(
+    settings.system_stats_interval, settings.system_stats_history
+)
+# Process list walked at most once per interval, shared by all viewers
+process_table = ProcessTable(settings.process_table_interval)
+
+# Background scripts: logs, resource samples and the PID table persisted
+# under ``runtime`` so that running scripts are reattached after a restart.
 RUNTIME_DIR = Path(__file__).resolve().parent / "runtime"
 RUNTIME_DIR.mkdir(exist_ok=True)
 STATE_FILE = RUNTIME_DIR / "processes.json"
-processes: dict[int, subprocess.Popen] = {}
-
-
-def _save_state() -> None:
-    try:
-        with STATE_FILE.open("w", encoding="utf-8") as fh:
-            json.dump({pid: proc.args[-1] if hasattr(proc, "args") else "" for pid, proc in processes.items()}, fh)
-    except Exception:
-        app.logger.exception("Failed saving process state")
-
-
-def _load_state() -> dict[int, str]:
-    try:
-        with STATE_FILE.open("r", encoding="utf-8") as fh:
-            data = json.load(fh)
-            return {int(k): v for k, v in data.items()}
-    except Exception:
-        return {}
+script_supervisor = ScriptSupervisor(
+    STATE_FILE,
+    RUNTIME_DIR / "scripts",
+    log_max_bytes=settings.script_log_max_bytes,
+    log_backups=settings.script_log_backups,
+    interval=settings.script_sample_interval,
+    cpu_limit=settings.script_cpu_limit,
+    memory_limit=settings.script_memory_limit_mb * 1024 * 1024,
+)
+script_supervisor.reattach()
 
 
 # Whitelist of allowed shell commands for execute_command.
@@ -202,8 +259,126 @@ ALLOWED_COMMANDS = get_allowed_commands()
 MAX_COMMAND_LENGTH = 2000
 TERMINAL_TIMEOUT = max(1, TERMINAL_TIMEOUT_SECONDS)
 
-# Registry for asynchronous command execution
-command_jobs: dict[str, dict[str, object]] = {}
+# Registry and worker pool for asynchronous command execution
+command_jobs = JobRegistry(
+    workers=settings.terminal_workers,
+    max_queue=settings.terminal_queue,
+    ttl=settings.terminal_job_ttl,
+    max_jobs=settings.terminal_max_jobs,
+    max_output=settings.terminal_output_max_bytes,
+)
+# Seconds between SSE keep-alive comments while a command is silent
+COMMAND_STREAM_HEARTBEAT = 15.0
+
+# Append-only chat logs stored under each profile's ``user_root``
+chat_store = ChatStore(
+    lambda profile: user_root(profile),
+    max_messages=settings.chat_history_max_messages,
+)
+
+
+def _chat_logs(profile: str) -> list[tuple[str | None, ChatLog]]:
+    """Return ``profile``'s history and conversation logs for searching.
+
+    The classic history is keyed ``None``, conversations by their id.
+    """
+    logs: list[tuple[str | None, ChatLog]] = [(None, chat_store.log(profile))]
+    for conversation in chat_store.conversations(profile):
+        try:
+            logs.append((conversation, chat_store.conversation(profile, conversation)))
+        except ValueError:
+            continue
+    return logs
+
+
+# Full-text index over each profile's stored messages
+chat_search = ChatSearch(_chat_logs)
+
+# Token budgets used to size the history sent with each prompt
+context_builder = ContextBuilder(
+    settings.ollama_context_tokens, settings.ollama_model_context_tokens
+)
+
+# Pooled client through which all Ollama traffic is sent; with several
+# OLLAMA_URLS requests are balanced over the backends
+_ollama_backends = [
+    OllamaClient(
+        url,
+        pool_size=settings.ollama_pool_size,
+        connect_timeout=settings.ollama_connect_timeout,
+        read_timeout=settings.ollama_read_timeout,
+        retries=settings.ollama_retries,
+    )
+    for url in settings.ollama_urls
+]
+ollama_client: OllamaClient | OllamaPool = (
+    OllamaPool(_ollama_backends, interval=settings.ollama_health_interval)
+    if len(_ollama_backends) > 1
+    else _ollama_backends[0]
+)
+
+# Per-model admission control in front of Ollama; every backend adds its
+# share of generation slots
+scheduler = ModelScheduler(
+    settings.ollama_max_concurrent * len(_ollama_backends),
+    settings.ollama_max_queue,
+    {
+        model: limit * len(_ollama_backends)
+        for model, limit in settings.ollama_model_concurrency.items()
+    },
+)
+QUEUE_REPORT_INTERVAL = 1.0
+QUEUE_RETRY_AFTER = 5
+QUEUE_TIMEOUT_MESSAGE = "Timed out waiting for a free model slot. Please retry."
+CANCELLED_MESSAGE = "Generation cancelled"
+
+# Downscaled copies of chat images, keyed by content hash
+image_preprocessor = ImagePreprocessor(
+    settings.ollama_image_max_side,
+    quality=settings.ollama_image_quality,
+    cache_size=settings.ollama_image_cache,
+    max_sides=settings.ollama_model_image_max_side,
+)
+
+# Embedded chunks of each profile's documents for retrieval
+document_indexes = DocumentIndexes(
+    lambda profile: user_root(profile),
+    lambda texts: ollama_client.embed(settings.ollama_embed_model, texts),
+    model=settings.ollama_embed_model,
+    chunk_chars=settings.documents_chunk_chars,
+    rescan_interval=settings.documents_rescan_interval,
+)
+
+# Cancel tokens of generations in progress, keyed by request id
+generations: dict[str, CancelToken] = {}
+generations_lock = threading.Lock()
+
+# Replies to identical requests, shared by concurrent duplicates; a duplicate
+# waits at most as long as its own request could have taken
+response_cache = ResponseCache(
+    settings.ollama_cache_size,
+    settings.ollama_cache_ttl,
+    wait_timeout=settings.ollama_queue_timeout + settings.ollama_read_timeout,
+)
+
+# Background summaries queue behind every interactive request
+SUMMARY_PRIORITY = -10
+
+
+def _summarize(model: str, prompt: str) -> str:
+    """Generate a summary once :data:`scheduler` grants ``model`` a slot."""
+    ticket = scheduler.enqueue(model, priority=SUMMARY_PRIORITY)
+    if not scheduler.wait(ticket, timeout=settings.ollama_queue_timeout):
+        scheduler.abandon(ticket, timed_out=True)
+        raise QueueTimeout(QUEUE_TIMEOUT_MESSAGE)
+    try:
+        return ollama_client.generate(model, prompt).get("response", "")
+    finally:
+        scheduler.release(ticket)
+
+
+# Optional background summaries of turns that fell out of the budget
+summarizer = Summarizer(_summarize) if settings.ollama_summarize else None
 
 
 def _is_windows() -> bool:
@@ -212,15 +387,10 @@ def _is_windows() -> bool:
 
 def load_chat_history(profile: str) -> list[dict]:
     """Load chat history for ``profile`` from disk."""
-    path = user_root(profile) / "chat_history.json"
-    if path.exists():
-        try:
-            with path.open("r", encoding="utf-8") as fh:
-                data = json.load(fh)
-                if isinstance(data, list):
-                    return data
-        except Exception:
-            app.logger.exception("Failed reading chat history for %s", profile)
+    try:
+        return chat_store.load(profile)
+    except Exception:
+        app.logger.exception("Failed reading chat history for %s", profile)
     return []
 
 
@@ -230,17 +400,10 @@ def detect_ollama_models() -> tuple[list[str], str | None]:
     error: str | None = None
 
     try:
-        # Call Ollama API to list models
-        response = requests.get("http://localhost:11434/api/tags", timeout=5)
-        if response.status_code == 200:
-            data = response.json()
-            if "models" in data:
-                models = [model["name"] for model in data["models"]]
-        else:
-            error = f"Ollama API returned status {response.status_code}"
-    except requests.exceptions.ConnectionError:
+        models = ollama_client.list_models()
+    except OllamaConnectionError:
         error = "Cannot connect to Ollama. Make sure Ollama is running (ollama serve)"
-    except requests.exceptions.Timeout:
+    except OllamaTimeout:
         error = "Ollama request timed out"
     except Exception as exc:
         error = str(exc)
@@ -252,15 +415,40 @@ def detect_ollama_models() -> tuple[list[str], str | None]:
     return models, error
 
 
+# Cached model list shared by the chat endpoints
+model_catalog = ModelCatalog(detect_ollama_models, ttl=settings.ollama_models_ttl)
+
+# Which models Ollama has loaded, and how long each should stay loaded
+residency = ModelResidency(
+    lambda: ollama_client.running_models(),
+    lambda model, keep_alive: ollama_client.load_model(model, keep_alive),
+    keep_alive=settings.ollama_model_keep_alive,
+    default_keep_alive=settings.ollama_keep_alive,
+)
+
+
 @app.route("/api/ollama/models")
 def list_ollama_models():
-    """Return a list of available models from Ollama."""
-    models, error = detect_ollama_models()
+    """Return a list of available models from Ollama.
+
+    The list is served from :data:`model_catalog`; pass ``?refresh=1`` to
+    bypass the cache and query Ollama immediately.  ``loaded`` names the
+    models that are already in memory and answer without a cold start.
+    """
+    if request.args.get("refresh"):
+        models, error = model_catalog.refresh()
+    else:
+        models, error = model_catalog.get()
 
     if error and not models:
         return jsonify({"ok": False, "models": [], "error": error}), 500
 
-    response = {"ok": True, "models": models}
+    running = residency.running()
+    response = {
+        "ok": True,
+        "models": models,
+        "loaded": [m for m in models if m in running],
+    }
     if error:
         response["warning"] = error
 
@@ -273,104 +461,719 @@ def list_ollama_models():
 
 @app.get("/api/ollama/history/<profile>")
 def get_chat_history(profile: str):
-    """Return stored chat history for the given profile."""
-    history = load_chat_history(profile)
-    return jsonify({"history": history})
+    """Return stored chat history for the given profile.
+
+    ``?limit=`` returns only the newest messages and ``?before=`` pages
+    backwards from a message index; the response's ``start`` is the cursor
+    for the next older page.
+    """
+    try:
+        before = request.args.get("before", type=int)
+        limit = request.args.get("limit", type=int)
+        history, start, total = chat_store.page(profile, before, limit)
+    except Exception as exc:
+        app.logger.exception("Failed reading chat history for %s", profile)
+        return json_error(str(exc), 500)
+    return jsonify({"history": history, "start": start, "total": total})
+
+
+def _default_model(models: list[str], has_image: bool) -> str:
+    """Pick a sensible model when the client did not choose one."""
+    if has_image:
+        return "llava:7b" if "llava:7b" in models else "llava"
+    return (
+        "llama3.2:3b"
+        if "llama3.2:3b" in models
+        else (models[0] if models else "llama3.2")
+    )
+
+
+def _build_prompt(prompt: str, history: list[dict]) -> str:
+    """Flatten ``history`` and ``prompt`` into a single prompt.
+
+    ``history`` is expected to be trimmed to the model's budget already.
+    """
+    if not history:
+        return prompt
+    context = "\n".join([f"{msg['role']}: {msg['content']}" for msg in history])
+    return f"{context}\nuser: {prompt}\nassistant:"
+
+
+def _documents_block(excerpts: list[dict]) -> str:
+    """Format retrieved document chunks to precede the user's prompt."""
+    if not excerpts:
+        return ""
+    parts = [f"[{e['path']}]\n{e['text'].strip()}" for e in excerpts]
+    return (
+        "Excerpts from the user's documents that may help:\n\n"
+        + "\n\n".join(parts)
+        + "\n\n"
+    )
+
+
+def _conversation_window(conv_log: ChatLog, model: str, prompt: str) -> list[dict]:
+    """Return the newest stored messages that fit ``model``'s budget.
+
+    With summaries enabled, older turns are represented by the cached
+    summary and a fresher one is requested in the background once enough
+    messages have fallen out of the window.
+    """
+    summary = conv_log.load_summary() if summarizer else None
+    budget = context_builder.history_budget(
+        model, prompt, summary["text"] if summary else None
+    )
+    start = conv_log.window_start(budget)
+    history = conv_log.read(start)
+    if summarizer and start > 0:
+        if summary is None or start - summary["upto"] >= SUMMARY_REFRESH_MESSAGES:
+            summarizer.schedule(conv_log, model, start)
+        if summary:
+            history.insert(0, summary_message(summary["text"]))
+    return history
+
+
+def _append_turn(history: list[dict], prompt: str, response_text: str) -> list[dict]:
+    history = list(history or [])
+    history.append({"role": "user", "content": prompt})
+    history.append({"role": "assistant", "content": response_text})
+    return history
+
+
+def save_chat_turn(profile: str, prompt: str, response_text: str) -> None:
+    """Append one user/assistant exchange to ``profile``'s history."""
+    try:
+        chat_store.append(profile, _append_turn([], prompt, response_text))
+        chat_search.note_append(profile, None, chat_store.log(profile))
+    except Exception:
+        app.logger.exception("Failed writing chat history for %s", profile)
+
+
+# How conversation history reaches the model: flattened into the prompt,
+# via the ``context`` tokens returned by ``/api/generate`` (server-side
+# conversations only), or as a ``/api/chat`` message list.
+CONTEXT_MODES = ("prompt", "context", "chat")
+
+
+@dataclass
+class ChatTurn:
+    """One ``/api/ollama/chat`` exchange.
+
+    In the classic protocol the client owns ``history`` and gets the whole
+    updated list back.  When ``conversation`` is set the server owns the
+    history in ``conv_log`` and only the new assistant message is returned
+    together with the conversation's new ``version``.
+    """
+
+    model: str
+    prompt: str
+    history: list[dict]
+    images: list[str] | None = None
+    profile: str | None = None
+    conversation: str | None = None
+    conv_log: ChatLog | None = None
+    client_version: int | None = None
+    mode: str = "prompt"
+    keep_alive: str | None = None
+    context: list[int] | None = None
+    cancel: CancelToken | None = None
+    image_info: dict | None = None
+    documents: list[dict] | None = None
+
+    @property
+    def sent_prompt(self) -> str:
+        """The prompt as sent to the model, after any document excerpts."""
+        return _documents_block(self.documents or []) + self.prompt
+
+    @property
+    def full_prompt(self) -> str:
+        if self.mode == "context" and self.context:
+            # Ollama already holds everything said so far in ``context``.
+            return self.sent_prompt
+        return _build_prompt(self.sent_prompt, self.history)
+
+    def messages(self) -> list[dict]:
+        """Return the ``/api/chat`` message list for this turn."""
+        messages = [{"role": m["role"], "content": m["content"]} for m in self.history]
+        user: dict[str, object] = {"role": "user", "content": self.sent_prompt}
+        if self.images:
+            user["images"] = self.images
+        messages.append(user)
+        return messages
+
+    def request(self, stream: bool = False):
+        """Send the turn to Ollama using the selected context mode."""
+        if self.mode == "chat":
+            return ollama_client.chat(
+                self.model,
+                self.messages(),
+                stream=stream,
+                keep_alive=self.keep_alive,
+                cancel=self.cancel,
+            )
+        return ollama_client.generate(
+            self.model,
+            self.full_prompt,
+            images=self.images,
+            stream=stream,
+            context=self.context if self.mode == "context" else None,
+            keep_alive=self.keep_alive,
+            cancel=self.cancel,
+        )
+
+    def cache_key(self) -> str:
+        """Return the :data:`response_cache` key for this turn's input."""
+        history = [(m.get("role"), m.get("content")) for m in self.history]
+        material = {"mode": self.mode, "history": history, "context": self.context}
+        return make_key(self.model, self.sent_prompt, material, self.images)
+
+    def text_of(self, chunk: dict) -> str:
+        """Extract generated text from an Ollama response or stream chunk."""
+        if self.mode == "chat":
+            return (chunk.get("message") or {}).get("content", "")
+        return chunk.get("response", "")
+
+    def finish(self, response_text: str, final: dict | None = None) -> dict:
+        """Persist the exchange and return the JSON reply for it.
+
+        ``final`` is Ollama's last response object; in ``context`` mode its
+        ``context`` tokens are stored for the next turn.
+        """
+        reply: dict[str, object] = {
+            "ok": True,
+            "response": response_text,
+            "model": self.model,
+        }
+        if self.image_info:
+            reply["image"] = self.image_info
+        if self.documents:
+            reply["sources"] = [
+                {"path": e["path"], "offset": e["offset"], "score": e["score"]}
+                for e in self.documents
+            ]
+        if self.conv_log is not None:
+            messages = _append_turn([], self.prompt, response_text)
+            with self.conv_log.lock:
+                base = len(self.conv_log)
+                version = self.conv_log.append(messages)
+                if self.mode == "context" and final and final.get("context"):
+                    self.conv_log.save_context(self.model, final["context"])
+            chat_search.note_append(self.profile, self.conversation, self.conv_log)
+            reply["conversation"] = self.conversation
+            reply["version"] = version
+            reply["message"] = messages[-1]
+            if self.client_version is not None and self.client_version != base:
+                # The client missed messages; it should fetch them with
+                # ``?since=<its version>``.
+                reply["resync"] = True
+            return reply
+        if self.profile:
+            save_chat_turn(self.profile, self.prompt, response_text)
+        reply["history"] = _append_turn(self.history, self.prompt, response_text)
+        return reply
+
+
+def _track_generation(request_id: str) -> CancelToken:
+    """Register a cancellable generation under ``request_id``."""
+    token = CancelToken()
+    with generations_lock:
+        generations[request_id] = token
+    return token
+
+
+def _untrack_generation(request_id: str, token: CancelToken) -> None:
+    with generations_lock:
+        if generations.get(request_id) is token:
+            del generations[request_id]
+
+
+def _ndjson(obj: dict) -> str:
+    return json.dumps(obj) + "\n"
+
+
+def _stream_ollama(turn: ChatTurn, ticket: Ticket, cache_key: str | None = None):
+    """Return an NDJSON response forwarding tokens as Ollama produces them.
+
+    Each line is a JSON object: ``{"token": ...}`` while generating and a
+    final ``{"done": true, ...}`` carrying the same fields as the
+    non-streaming reply.  While the request waits for a model slot it
+    receives ``{"queued": <position>}`` lines.  When a slot is free straight
+    away the first upstream chunk is fetched before the response starts so
+    connection errors still produce a regular JSON error.  A completed reply
+    is stored under ``cache_key``.
+
+    If the client disconnects, the WSGI server closes the generator at its
+    next write; closing it closes the upstream stream so Ollama stops too.
+    """
+
+    def _cleanup():
+        scheduler.release(ticket)
+        if turn.cancel is not None:
+            _untrack_generation(ticket.id, turn.cancel)
+
+    upstream = None
+    first = None
+    if ticket.started is not None:
+        upstream = turn.request(stream=True)
+        try:
+            first = next(upstream, None)
+        except OllamaError as exc:
+            _cleanup()
+            return _ollama_error(exc)
+
+    def _events():
+        nonlocal upstream
+        parts: list[str] = []
+        final: dict | None = None
+        head = [first] if first is not None else []
+        try:
+            if upstream is None:
+                deadline = time.monotonic() + settings.ollama_queue_timeout
+                while True:
+                    yield _ndjson({"queued": scheduler.position(ticket.id)})
+                    remaining = deadline - time.monotonic()
+                    if scheduler.wait(
+                        ticket, timeout=max(0, min(QUEUE_REPORT_INTERVAL, remaining))
+                    ):
+                        break
+                    if ticket.cancelled:
+                        yield _ndjson(
+                            {"ok": False, "error": CANCELLED_MESSAGE, "cancelled": True}
+                        )
+                        return
+                    if time.monotonic() >= deadline:
+                        scheduler.abandon(ticket, timed_out=True)
+                        yield _ndjson({"ok": False, "error": QUEUE_TIMEOUT_MESSAGE})
+                        return
+                upstream = turn.request(stream=True)
+            for line in chain(head, upstream):
+                try:
+                    chunk = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if chunk.get("error"):
+                    yield _ndjson({"ok": False, "error": chunk["error"]})
+                    return
+                token = turn.text_of(chunk)
+                if token:
+                    parts.append(token)
+                    yield _ndjson({"token": token})
+                if chunk.get("done"):
+                    final = chunk
+                    residency.mark_loaded(turn.model)
+                    break
+        except OllamaCancelled:
+            yield _ndjson({"ok": False, "error": CANCELLED_MESSAGE, "cancelled": True})
+            return
+        except OllamaError as exc:
+            yield _ndjson({"ok": False, "error": str(exc)})
+            return
+        except GeneratorExit:
+            logger.info("Client disconnected, stopping generation %s", ticket.id)
+            raise
+        finally:
+            if upstream is not None:
+                upstream.close()
+            _cleanup()
+        text = "".join(parts)
+        if cache_key and final is not None:
+            response_cache.put(
+                cache_key,
+                dict(
+                    final, response=text, message={"role": "assistant", "content": text}
+                ),
+            )
+        reply = turn.finish(text, final)
+        reply["done"] = True
+        yield _ndjson(reply)
+
+    response = Response(stream_with_context(_events()), mimetype="application/x-ndjson")
+    # Frees the slot even if the client goes away before streaming starts.
+    response.call_on_close(_cleanup)
+    return response
+
+
+def _stream_cached(turn: ChatTurn, result: dict):
+    """Replay a cached reply in the streaming format."""
+    text = turn.text_of(result)
+
+    def _events():
+        if text:
+            yield _ndjson({"token": text})
+        reply = turn.finish(text, result)
+        reply.update(done=True, cached=True)
+        yield _ndjson(reply)
+
+    return Response(stream_with_context(_events()), mimetype="application/x-ndjson")
+
+
+def _retry_later(message: str, status: int):
+    response = jsonify({"ok": False, "error": message})
+    response.headers["Retry-After"] = str(QUEUE_RETRY_AFTER)
+    return response, status
+
+
+def _ollama_error(exc: OllamaError):
+    """Translate an :class:`OllamaError` into a JSON error response."""
+    if isinstance(exc, OllamaCancelled):
+        return (
+            jsonify({"ok": False, "error": CANCELLED_MESSAGE, "cancelled": True}),
+            409,
+        )
+    if isinstance(exc, OllamaConnectionError):
+        message = "Cannot connect to Ollama. Please ensure Ollama is running."
+    elif isinstance(exc, OllamaTimeout):
+        message = (
+            "Request timed out. The model may be loading or the prompt is too complex."
+        )
+    else:
+        message = str(exc)
+    return jsonify({"ok": False, "error": message}), 500
 
 
 @app.route("/api/ollama/chat", methods=["POST"])
 def run_ollama():
-    """Run a prompt against Ollama via HTTP API."""
+    """Run a prompt against Ollama via HTTP API.
+
+    Set ``"stream": true`` in the body to receive newline delimited JSON
+    tokens as they are generated instead of a single response.
+
+    Requests pass through :data:`scheduler`: a full queue is rejected with
+    429, and a request that waited ``OLLAMA_QUEUE_TIMEOUT`` seconds without
+    getting a model slot fails with 503.  ``request_id`` names the request
+    for ``/api/ollama/queue?id=`` and ``priority`` moves it ahead of
+    lower-priority requests.
+
+    Concurrent identical requests (same model, prompt, history and images)
+    share one generation; with ``OLLAMA_CACHE_SIZE`` set, replies are also
+    kept in :data:`response_cache`.  Shared and cached replies carry
+    ``"cached": true``.  Send ``"cache": false`` to always generate a fresh
+    reply.  Streaming requests are answered from and
+    stored into the cache but are not coalesced.
+
+    A queued or running request can be stopped with ``/api/ollama/cancel``
+    using its ``request_id`` (also returned in ``X-Request-ID``); it then
+    fails with 409 and ``"cancelled": true``.
+
+    Passing ``"conversation": "<id>"`` together with ``profile`` switches to
+    the server-side protocol: the stored conversation is used as history,
+    the client sends only the new prompt (optionally with the ``version`` it
+    last saw) and receives only the new assistant message and version.
+
+    ``context_mode`` (default ``OLLAMA_CONTEXT_MODE``) selects how history is
+    sent, see :data:`CONTEXT_MODES`.  ``context`` needs a conversation and
+    falls back to ``prompt`` without one.
+
+    An ``image`` is downscaled and re-encoded by :data:`image_preprocessor`
+    first; the reply's ``image`` field reports the bytes saved.
+
+    With ``"documents": true`` the profile's documents are searched with the
+    prompt (see :data:`document_indexes`) and the best chunks are placed
+    before it; the reply's ``sources`` lists where they came from.
+    """
     data = request.get_json(silent=True) or {}
     model = data.get("model")
     prompt = data.get("prompt", "")
     image_b64 = data.get("image")
     history = data.get("history", [])
     profile = data.get("profile")
+    conversation = data.get("conversation")
 
     if not prompt and not image_b64:
         return jsonify({"ok": False, "error": "prompt is required"}), 400
 
-    # Get available models and set defaults
-    models, _ = detect_ollama_models()
+    mode = data.get("context_mode") or settings.ollama_context_mode
+    if mode not in CONTEXT_MODES:
+        return json_error(f"context_mode must be one of {', '.join(CONTEXT_MODES)}")
 
-    # If no model specified, use defaults
+    # If no model specified, use defaults from the cached model list
     if not model:
-        if image_b64:
-            model = "llava:7b" if "llava:7b" in models else "llava"
-        else:
-            model = "llama3.2:3b" if "llama3.2:3b" in models else (models[0] if models else "llama3.2")
+        models, _ = model_catalog.get()
+        model = _default_model(models, bool(image_b64))
 
-    # Prepare the request to Ollama API
-    ollama_url = "http://localhost:11434/api/generate"
-
-    # Build the request payload
-    payload = {
-        "model": model,
-        "prompt": prompt,
-        "stream": False  # Always false for simplicity
-    }
+    excerpts: list[dict] = []
+    if data.get("documents") and prompt:
+        if not profile:
+            return json_error("profile is required for documents")
+        try:
+            excerpts = document_indexes.index(profile).search(
+                prompt, settings.documents_top_k
+            )
+        except OllamaError as exc:
+            return _ollama_error(exc)
+        except ValueError as exc:  # unusable embeddings
+            return json_error(str(exc), 502)
+    # History is fitted around the prompt as sent, excerpts included.
+    budget_prompt = _documents_block(excerpts) + prompt
+
+    conv_log = None
+    client_version = None
+    context = None
+    if conversation is not None:
+        if not profile:
+            return json_error("profile is required for conversations")
+        try:
+            conv_log = chat_store.conversation(profile, conversation)
+            if data.get("version") is not None:
+                client_version = int(data["version"])
+        except (TypeError, ValueError) as exc:
+            return json_error(str(exc))
+        if mode == "context":
+            context = conv_log.load_context(model)
+            if context and len(context) > context_builder.budget_for(model):
+                # Start over from a trimmed window rather than let the
+                # cached context grow past the model's budget.
+                context = None
+        history = (
+            [] if context else _conversation_window(conv_log, model, budget_prompt)
+        )
+    else:
+        if mode == "context":
+            mode = "prompt"
+        history = context_builder.fit(history, model, budget_prompt)
 
-    # Add image if provided (for multimodal models)
+    image = None
     if image_b64:
-        payload["images"] = [image_b64]
+        if not isinstance(image_b64, str):
+            return json_error("image must be a base64 string")
+        try:
+            image = image_preprocessor.prepare(image_b64, model)
+        except ValueError as exc:
+            return json_error(str(exc))
+
+    turn = ChatTurn(
+        model=model,
+        prompt=prompt,
+        history=history,
+        # Add image if provided (for multimodal models)
+        images=[image.data] if image else None,
+        profile=profile,
+        conversation=conversation,
+        conv_log=conv_log,
+        client_version=client_version,
+        mode=mode,
+        keep_alive=data.get("keep_alive") or residency.keep_alive_for(model),
+        context=context,
+        image_info=image.as_dict() if image else None,
+        documents=excerpts,
+    )
+
+    try:
+        priority = int(data.get("priority") or 0)
+    except (TypeError, ValueError):
+        return json_error("priority must be an integer")
+    ticket_id = data.get("request_id") or g.request_id
+    # Identical requests in flight share one generation even when the cache
+    # keeps no replies (OLLAMA_CACHE_SIZE=0).
+    cache_key = None
+    if data.get("cache", True) is not False:
+        cache_key = turn.cache_key()
+
+    if data.get("stream"):
+        cached = (
+            response_cache.get(cache_key)
+            if cache_key and response_cache.enabled
+            else None
+        )
+        if cached is not None:
+            return _stream_cached(turn, cached)
+        try:
+            ticket = scheduler.enqueue(
+                turn.model, priority=priority, ticket_id=ticket_id
+            )
+        except QueueFull as exc:
+            return _retry_later(str(exc), 429)
+        turn.cancel = _track_generation(ticket_id)
+        return _stream_ollama(turn, ticket, cache_key)
+
+    def generate() -> dict:
+        ticket = scheduler.enqueue(turn.model, priority=priority, ticket_id=ticket_id)
+        if not scheduler.wait(ticket, timeout=settings.ollama_queue_timeout):
+            if ticket.cancelled:
+                raise OllamaCancelled(CANCELLED_MESSAGE)
+            scheduler.abandon(ticket, timed_out=True)
+            raise QueueTimeout(QUEUE_TIMEOUT_MESSAGE)
+        try:
+            result = turn.request()
+        finally:
+            scheduler.release(ticket)
+        residency.mark_loaded(turn.model)
+        return result
+
+    status = "miss"
+    turn.cancel = _track_generation(ticket_id)
+    try:
+        result = None
+        while result is None:
+            try:
+                if cache_key:
+                    result, status = response_cache.get_or_compute(cache_key, generate)
+                else:
+                    result = generate()
+            except OllamaCancelled:
+                # Only give up if this request was cancelled, not the one
+                # it was coalesced with.
+                if turn.cancel.cancelled:
+                    raise
+    except QueueFull as exc:
+        return _retry_later(str(exc), 429)
+    except (QueueTimeout, TimeoutError) as exc:
+        return _retry_later(str(exc), 503)
+    except OllamaError as exc:
+        return _ollama_error(exc)
+    except Exception as exc:
+        app.logger.exception("Error calling Ollama API")
+        return jsonify({"ok": False, "error": str(exc)}), 500
+    finally:
+        _untrack_generation(ticket_id, turn.cancel)
+
+    reply = turn.finish(turn.text_of(result), result)
+    if status != "miss":
+        reply["cached"] = True
+    return jsonify(reply)
+
+
+@app.get("/api/ollama/queue")
+def ollama_queue():
+    """Report per-model queue state and timings.
+
+    With ``?id=<request_id>`` only that request's queue position is
+    returned: ``0`` once it is running, ``null`` if it is unknown.
+    """
+    ticket_id = request.args.get("id")
+    if ticket_id:
+        return jsonify({"id": ticket_id, "position": scheduler.position(ticket_id)})
+    return jsonify({"ok": True, "models": scheduler.stats()})
+
+
+@app.route("/api/ollama/cancel", methods=["POST"])
+def cancel_ollama():
+    """Cancel a queued or running generation by its ``request_id``.
+
+    A queued request is dropped at once; a running one stops at the next
+    token and its upstream connection is closed so Ollama stops generating.
+    """
+    data = request.get_json(silent=True) or {}
+    request_id = data.get("request_id")
+    if not request_id:
+        return json_error("request_id is required")
+    with generations_lock:
+        token = generations.get(request_id)
+    if token is None:
+        return json_error("Unknown request", 404)
+    token.cancel()
+    scheduler.cancel(request_id)
+    return jsonify({"ok": True, "request_id": request_id})
+
+
+@app.get("/api/ollama/backends")
+def ollama_backends():
+    """Report health, installed models and load of each Ollama backend."""
+    if isinstance(ollama_client, OllamaPool):
+        return jsonify({"ok": True, "backends": ollama_client.stats()})
+    return jsonify(
+        {
+            "ok": True,
+            "backends": [
+                {"url": ollama_client.base_url, "healthy": ollama_client.is_running()}
+            ],
+        }
+    )
+
 
-    # Add context from history if available
-    if history:
-        context = "\n".join([f"{msg['role']}: {msg['content']}" for msg in history[-5:]])  # Last 5 messages
-        payload["prompt"] = f"{context}\nuser: {prompt}\nassistant:"
+@app.get("/api/ollama/ps")
+def ollama_loaded_models():
+    """Report which models are loaded or loading, per Ollama's ``/api/ps``.
 
+    Results are cached for a few seconds; ``?refresh=1`` asks Ollama now.
+    """
+    snapshot = residency.snapshot(refresh=bool(request.args.get("refresh")))
+    return jsonify({"ok": snapshot["error"] is None, **snapshot})
+
+
+@app.route("/api/ollama/warm", methods=["POST"])
+def warm_ollama_models():
+    """Start loading ``model`` (or a list of ``models``) in the background."""
+    data = request.get_json(silent=True) or {}
+    models = data.get("models") or ([data["model"]] if data.get("model") else [])
+    if not isinstance(models, list) or not all(isinstance(m, str) for m in models):
+        return json_error("models must be a list of model names")
+    if not models:
+        return json_error("model is required")
+    residency.warm(models)
+    return jsonify({"ok": True, "warming": models}), 202
+
+
+@app.get("/api/ollama/images")
+def ollama_images():
+    """Report image pre-processing cache counters and bytes saved."""
+    return jsonify({"ok": True, "images": image_preprocessor.stats()})
+
+
+@app.get("/api/ollama/documents/<profile>/search")
+def search_documents(profile: str):
+    """Return the document chunks most similar to ``?q=`` (``&k=`` results)."""
+    query = request.args.get("q", "").strip()
+    if not query:
+        return json_error("q is required")
+    k = max(1, min(request.args.get("k", settings.documents_top_k, type=int), 50))
     try:
-        # Make request to Ollama
-        response = requests.post(ollama_url, json=payload, timeout=60)
+        results = document_indexes.index(profile).search(query, k)
+    except OllamaError as exc:
+        return _ollama_error(exc)
+    except ValueError as exc:  # unusable embeddings
+        return json_error(str(exc), 502)
+    return jsonify({"ok": True, "results": results})
 
-        if response.status_code != 200:
-            error_msg = response.text or f"Ollama returned status {response.status_code}"
-            return jsonify({"ok": False, "error": error_msg}), 500
 
-        # Parse response
-        result = response.json()
-        response_text = result.get("response", "")
+@app.get("/api/ollama/cache")
+def ollama_cache():
+    """Report response cache size and hit/miss/coalesced counters."""
+    return jsonify({"ok": True, "cache": response_cache.stats()})
 
-        # Update conversation history
-        if history:
-            history.append({"role": "user", "content": prompt})
-            history.append({"role": "assistant", "content": response_text})
-        else:
-            history = [
-                {"role": "user", "content": prompt},
-                {"role": "assistant", "content": response_text}
-            ]
 
-        # Save to profile if provided
-        if profile:
-            try:
-                path = user_root(profile) / "chat_history.json"
-                with path.open("w", encoding="utf-8") as fh:
-                    json.dump(history, fh)
-            except Exception:
-                app.logger.exception("Failed writing chat history for %s", profile)
+@app.get("/api/ollama/search")
+def search_chat_history():
+    """Search ``profile``'s stored messages for ``?q=``.
 
-        return jsonify({
+    Results are ranked and carry the message's ``conversation`` (``null``
+    for the classic history), its ``index`` in that log (usable as a
+    ``before`` cursor for paging), and a ``snippet`` around the first match
+    at ``offset`` within the message.
+    """
+    query = request.args.get("q", "").strip()
+    profile = request.args.get("profile", "")
+    if not query or not profile:
+        return json_error("q and profile are required")
+    limit = max(1, min(request.args.get("limit", 20, type=int), 100))
+    started = time.perf_counter()
+    results = chat_search.search(profile, query, limit)
+    return jsonify(
+        {
             "ok": True,
-            "response": response_text,
-            "model": model,
-            "history": history
-        })
-
-    except requests.exceptions.ConnectionError:
-        return jsonify({
-            "ok": False,
-            "error": "Cannot connect to Ollama. Please ensure Ollama is running."
-        }), 500
-    except requests.exceptions.Timeout:
-        return jsonify({
-            "ok": False,
-            "error": "Request timed out. The model may be loading or the prompt is too complex."
-        }), 500
-    except Exception as exc:
-        app.logger.exception("Error calling Ollama API")
-        return jsonify({"ok": False, "error": str(exc)}), 500
+            "results": results,
+            "took": round((time.perf_counter() - started) * 1000, 2),
+        }
+    )
+
+
+@app.get("/api/ollama/conversations/<profile>/<conversation>")
+def get_conversation(profile: str, conversation: str):
+    """Return messages of a server-side conversation after ``?since=``.
+
+    Clients use this to resync after a reply flagged ``resync`` or to load a
+    conversation; ``version`` is the total number of stored messages.
+    """
+    since = request.args.get("since", 0, type=int)
+    try:
+        conv_log = chat_store.conversation(profile, conversation)
+    except ValueError as exc:
+        return json_error(str(exc))
+    with conv_log.lock:
+        version = len(conv_log)
+        messages = conv_log.read(max(0, since))
+    return jsonify(
+        {"conversation": conversation, "messages": messages, "version": version}
+    )
 
 
 @app.route("/")
@@ -446,15 +1249,44 @@ def process_icons_endpoint():
 
 @app.route("/api/system-stats")
 def system_stats():
-    """Return current CPU and RAM utilisation as percentages."""
+    """Return current CPU and RAM utilisation as percentages.
+
+    Values come from the background sampler, along with per-core CPU,
+    memory used, and disk and network throughput in bytes per second.
+    """
+    if not system_metrics.available:
+        return jsonify({"ok": False, "error": "psutil is not installed"}), 500
     try:
-        cpu = psutil.cpu_percent()
-        ram = psutil.virtual_memory().percent
-        return jsonify({"cpu": cpu, "ram": ram})
+        return jsonify(system_metrics.latest())
     except Exception as exc:
         return jsonify({"ok": False, "error": str(exc)}), 500
 
 
+@app.get("/api/system-stats/history")
+def system_stats_history():
+    """Return sampled metrics of the last ``?window=`` seconds as columns."""
+    if not system_metrics.available:
+        return jsonify({"ok": False, "error": "psutil is not installed"}), 500
+    window = request.args.get("window", type=float)
+    if window is not None and window <= 0:
+        return json_error("window must be positive")
+    return jsonify({"ok": True, **system_metrics.history(window)})
+
+
+@app.get("/api/processes")
+def list_processes():
+    """Return the host's process table in columns.
+
+    With ``?since=<version>`` (the ``version`` of an earlier response) only
+    rows added, changed or removed since then are returned, unless that
+    version is too old, in which case ``full`` is true.
+    """
+    if not process_table.available:
+        return jsonify({"ok": False, "error": "psutil is not installed"}), 500
+    since = request.args.get("since", type=int)
+    return jsonify({"ok": True, **process_table.snapshot(since)})
+
+
 @app.route("/api/list-icons")
 def list_icons():
     """Return a list of available PNG icon filenames."""
@@ -557,34 +1389,108 @@ def json_error(message: str, status: int = 400):
     return jsonify({"ok": False, "error": message}), status
 
 
+def _index_update(
+    root: Path, changed: tuple[Path, ...] = (), removed: tuple[Path, ...] = ()
+) -> None:
+    """Report file changes to the user's search index, if they have one."""
+    index = file_indexes.existing(root)
+    if index is None:
+        return
+    try:
+        for path in removed:
+            index.note_removed(path)
+        for path in changed:
+            index.note_changed(path)
+    except sqlite3.Error:
+        # The periodic reconcile catches up with whatever was missed.
+        logger.warning("Updating the file index under %s failed", root, exc_info=True)
+
+
 @app.route("/api/list-directory")
 def list_directory():
-    """Return contents of a directory as JSON."""
+    """Return contents of a directory as JSON.
+
+    Optional query arguments:
+
+    ``sort``
+        ``name`` (default), ``size``, ``mtime`` or ``type``; ``order=desc``
+        reverses it.  Folders come first unless ``dirs_first=0``.
+    ``limit`` / ``cursor``
+        Page size and the ``nextCursor`` of the previous page.  Without a
+        limit the whole directory is returned.
+    ``fields``
+        Comma-separated subset of ``name,path,isDir,size,mtime``.
+    """
     rel = request.args.get("path", "")
     root = _get_user_root()
     if root is None:
         return json_error("user required", 401)
+    fields = tuple(
+        f.strip() for f in request.args.get("fields", "").split(",") if f.strip()
+    )
+    fields = fields or LISTING_FIELDS
+    if any(field not in LISTING_FIELDS for field in fields):
+        return json_error(f"fields must be among {','.join(LISTING_FIELDS)}")
+    limit = request.args.get("limit", type=int)
+    if limit is not None:
+        limit = max(1, min(limit, 5000))
     try:
         abs_path = safe_join(root, rel)
-        if not abs_path.exists() or not abs_path.is_dir():
-            return json_error("Not a directory")
-        items = []
-        for entry in os.scandir(abs_path):
-            info = entry.stat()
-            items.append(
-                {
-                    "name": entry.name,
-                    "path": str(Path(rel) / entry.name),
-                    "isDir": entry.is_dir(),
-                    "size": info.st_size,
-                    "mtime": int(info.st_mtime),
-                }
-            )
-        return jsonify({"items": items, "path": rel})
     except ValueError:
         return json_error("Invalid path")
+    if not abs_path.exists() or not abs_path.is_dir():
+        return json_error("Not a directory")
+    try:
+        entries, total, next_cursor = directory_listings.page(
+            abs_path,
+            sort=request.args.get("sort", "name"),
+            descending=request.args.get("order") == "desc",
+            dirs_first=request.args.get("dirs_first", "1") != "0",
+            cursor=request.args.get("cursor") or None,
+            limit=limit,
+        )
+    except ValueError as exc:
+        return json_error(str(exc))
     except Exception as exc:
         return json_error(str(exc), 500)
+    items = [project(entry, rel, fields) for entry in entries]
+    return jsonify(
+        {"items": items, "path": rel, "total": total, "nextCursor": next_cursor}
+    )
+
+
+@app.route("/api/search")
+def search_files():
+    """Find files and folders whose name contains ``q``.
+
+    ``path`` limits the search to one folder's subtree, ``limit`` caps the
+    results (default 50) and ``content=1`` also matches file text when
+    content indexing is enabled.  The first search builds the index.
+    """
+    query = request.args.get("q", "").strip()
+    if not query:
+        return json_error("q is required")
+    root = _get_user_root()
+    if root is None:
+        return json_error("user required", 401)
+    rel = request.args.get("path", "")
+    try:
+        folder = safe_join(root, rel)
+    except ValueError:
+        return json_error("Invalid path")
+    limit = max(1, min(request.args.get("limit", 50, type=int), 1000))
+    started = time.perf_counter()
+    try:
+        results = file_indexes.index(root).search(
+            query,
+            path=folder.relative_to(root).as_posix() if folder != root else "",
+            limit=limit,
+            content=request.args.get("content") == "1",
+        )
+    except sqlite3.Error as exc:
+        return json_error(str(exc), 500)
+    took = round((time.perf_counter() - started) * 1000, 2)
+    return jsonify({"ok": True, "results": results, "tookMs": took})
 
 
 @app.route("/api/create-folder", methods=["POST"])
@@ -601,6 +1507,8 @@ def create_folder():
         base = safe_join(root, rel)
         abs_path = base / name
         abs_path.mkdir(parents=False, exist_ok=False)
+        directory_listings.invalidate(abs_path)
+        _index_update(root, changed=(abs_path,))
         return jsonify({"success": True})
     except FileExistsError:
         return json_error("Folder exists")
@@ -624,6 +1532,9 @@ def rename_item():
         abs_path = safe_join(root, rel)
         dst = abs_path.parent / new_name
         abs_path.rename(dst)
+        directory_listings.invalidate(abs_path)
+        directory_listings.invalidate(dst)
+        _index_update(root, changed=(dst,), removed=(abs_path,))
         return jsonify({"success": True})
     except FileNotFoundError:
         return json_error("Not found", 404)
@@ -648,6 +1559,8 @@ def delete_item():
             os.rmdir(abs_path)
         else:
             abs_path.unlink()
+        directory_listings.invalidate(abs_path)
+        _index_update(root, removed=(abs_path,))
         return jsonify({"success": True})
     except FileNotFoundError:
         return json_error("Not found", 404)
@@ -659,6 +1572,41 @@ def delete_item():
         return json_error(str(exc), 500)
 
 
+@app.route("/api/download")
+def download_file():
+    """Send one of the user's files.
+
+    ``path`` is relative to the user's root; since media elements cannot
+    set headers, the user may also be given as ``?user=``.  Responses carry
+    an ETag and Last-Modified and honour ``If-None-Match``,
+    ``If-Modified-Since`` and ``Range``, so revalidating costs a 304 and
+    seeking in a large video fetches only the requested bytes.  The body
+    is a file object handed to the WSGI server's ``wsgi.file_wrapper``
+    (``sendfile`` under gunicorn) or, with ``X_SENDFILE``, left to the
+    front server.  ``download=1`` asks the browser to save the file.
+    """
+    rel = request.args.get("path", "")
+    root = _get_user_root()
+    if root is None:
+        return json_error("user required", 401)
+    try:
+        abs_path = safe_join(root, rel)
+    except ValueError:
+        return json_error("Invalid path")
+    if not rel or not abs_path.is_file():
+        return json_error("Not found", 404)
+    response = send_file(
+        abs_path,
+        conditional=True,
+        etag=True,
+        max_age=0,
+        as_attachment=request.args.get("download") == "1",
+    )
+    # Revalidate every time; a 304 is cheap and edits show up at once.
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
 @app.route("/api/upload", methods=["POST"])
 def upload_file():
     rel = request.form.get("path", "")
@@ -675,6 +1623,9 @@ def upload_file():
         directory.mkdir(parents=True, exist_ok=True)
         dest = directory / file.filename
         file.save(dest)
+        # Overwriting a file leaves the folder's mtime unchanged.
+        directory_listings.invalidate(dest)
+        _index_update(root, changed=(dest,))
         return jsonify({"success": True})
     except ValueError:
         return jsonify({"ok": False, "error": "Invalid path"}), 400
@@ -682,6 +1633,85 @@ def upload_file():
         return jsonify({"ok": False, "error": str(exc)}), 500
 
 
+@app.route("/api/uploads", methods=["POST"])
+def start_upload():
+    """Start a resumable upload of ``name`` (``size`` bytes) into ``path``.
+
+    The client then PUTs each chunk to ``/api/uploads/<id>?offset=N`` (in
+    any order, in parallel if it likes, optionally with an
+    ``X-Chunk-Sha256`` header) and POSTs ``/api/uploads/<id>/complete``.
+    ``GET /api/uploads/<id>`` lists the chunks still missing, for resuming.
+    """
+    data = request.get_json(silent=True) or {}
+    name = data.get("name")
+    size = data.get("size")
+    chunk_size = data.get("chunk_size")
+    # bool is an int subclass; JSON true must not pass as a size.
+    if not name or not isinstance(size, int) or isinstance(size, bool):
+        return json_error("name and size are required")
+    if chunk_size is not None and (
+        not isinstance(chunk_size, int) or isinstance(chunk_size, bool)
+    ):
+        return json_error("chunk_size must be an integer")
+    root = _get_user_root()
+    if root is None:
+        return json_error("user required", 401)
+    try:
+        directory = safe_join(root, data.get("path", ""))
+        dest = safe_join(directory, name)
+        if dest.parent != directory:
+            raise ValueError(name)
+    except ValueError:
+        return json_error("Invalid path")
+    try:
+        upload = chunked_uploads.create(root, dest, size, chunk_size)
+    except UploadError as exc:
+        return json_error(str(exc), exc.status)
+    return jsonify({"ok": True, **upload})
+
+
+@app.route("/api/uploads/<upload_id>", methods=["GET", "PUT", "DELETE"])
+def upload_chunk(upload_id: str):
+    """Report, receive a chunk of, or abandon an upload."""
+    root = _get_user_root()
+    if root is None:
+        return json_error("user required", 401)
+    try:
+        if request.method == "GET":
+            return jsonify({"ok": True, **chunked_uploads.status(root, upload_id)})
+        if request.method == "DELETE":
+            chunked_uploads.abort(root, upload_id)
+            return jsonify({"ok": True})
+        offset = request.args.get("offset", type=int)
+        if offset is None:
+            return json_error("offset is required")
+        # request.stream reads the body as it arrives instead of spooling it.
+        result = chunked_uploads.write_chunk(
+            root,
+            upload_id,
+            offset,
+            request.stream,
+            request.headers.get("X-Chunk-Sha256"),
+        )
+    except UploadError as exc:
+        return json_error(str(exc), exc.status)
+    return jsonify({"ok": True, **result})
+
+
+@app.route("/api/uploads/<upload_id>/complete", methods=["POST"])
+def finish_upload(upload_id: str):
+    root = _get_user_root()
+    if root is None:
+        return json_error("user required", 401)
+    try:
+        dest = chunked_uploads.complete(root, upload_id)
+    except UploadError as exc:
+        return json_error(str(exc), exc.status)
+    directory_listings.invalidate(dest)
+    _index_update(root, changed=(dest,))
+    return jsonify({"ok": True, "path": dest.relative_to(root).as_posix()})
+
+
 @app.route("/api/run-script", methods=["POST"])
 def run_script():
     """Start a Python script as a background process.
@@ -689,7 +1719,10 @@ def run_script():
     Expects JSON payload with a "script_name" key specifying the
     filename (relative to the project root) of the Python script to
     execute.  The script is launched using the same Python interpreter
-    as this server.  Returns the PID of the spawned process.
+    as this server, with its output captured to a log (see
+    ``/api/script-log/<pid>``).  Optional "cpu_limit" (seconds) and
+    "memory_limit_mb" override the configured rlimits.  Returns the PID
+    of the spawned process.
     """
     data = request.get_json(silent=True) or {}
     script_name = data.get("script_name")
@@ -698,11 +1731,17 @@ def run_script():
     script_path = BASE_DIR / script_name
     if not script_path.exists():
         return jsonify({"ok": False, "error": f"Script '{script_name}' not found"}), 404
+    limits = {}
+    try:
+        if data.get("cpu_limit") is not None:
+            limits["cpu_limit"] = max(0, int(data["cpu_limit"]))
+        if data.get("memory_limit_mb") is not None:
+            limits["memory_limit"] = max(0, int(data["memory_limit_mb"])) * 1024 * 1024
+    except (TypeError, ValueError):
+        return jsonify({"ok": False, "error": "Limits must be integers"}), 400
     try:
-        proc = subprocess.Popen([sys.executable, str(script_path)])
-        processes[proc.pid] = proc
-        _save_state()
-        return jsonify({"pid": proc.pid, "script": script_name})
+        entry = script_supervisor.start(script_path, script_name, **limits)
+        return jsonify({"pid": entry.pid, "script": script_name})
     except Exception as exc:
         return jsonify({"ok": False, "error": str(exc)}), 500
 
@@ -718,36 +1757,37 @@ def stop_script():
     pid = data.get("pid")
     if pid is None:
         return jsonify({"ok": False, "error": "pid is required"}), 400
-    state = _load_state()
-    if pid not in state:
+    entry = script_supervisor.get(pid) if isinstance(pid, int) else None
+    if entry is None:
         return jsonify({"ok": False, "error": f"Process {pid} not found"}), 404
-    proc = processes.get(pid)
-    if not proc:
+    if not script_supervisor.stop(pid):
         return jsonify({"ok": False, "error": f"Process {pid} not running"}), 404
-    proc.terminate()
-    try:
-        proc.wait(timeout=5)
-    except subprocess.TimeoutExpired:
-        proc.kill()
-    processes.pop(pid, None)
-    _save_state()
     return jsonify({"stopped": pid})
 
 
 @app.route("/api/list-scripts")
 def list_scripts():
-    """Return a list of running background scripts and their PIDs."""
-    alive = []
-    # Remove processes that have exited
-    for pid, proc in list(processes.items()):
-        if proc.poll() is not None:
-            processes.pop(pid)
-        else:
-            alive.append(
-                {"pid": pid, "script": proc.args[-1] if hasattr(proc, "args") else ""}
-            )
-    _save_state()
-    return jsonify({"processes": alive})
+    """Return running background scripts with their CPU and memory use.
+
+    Recently exited scripts are listed under ``exited`` with their exit
+    code.
+    """
+    return jsonify(script_supervisor.snapshot())
+
+
+@app.get("/api/script-log/<int:pid>")
+def script_log(pid: int):
+    """Return a script's captured output.
+
+    ``?offset=<n>`` returns the output after byte ``n`` and the ``offset``
+    to continue from; otherwise the last ``?tail=`` lines (default 100).
+    """
+    offset = request.args.get("offset", type=int)
+    tail = max(0, min(request.args.get("tail", 100, type=int), 10_000))
+    result = script_supervisor.read_log(pid, offset, tail)
+    if result is None:
+        return json_error(f"Process {pid} not found", 404)
+    return jsonify({"ok": True, **result})
 
 
 @app.route("/api/execute-command", methods=["POST"])
@@ -778,13 +1818,24 @@ def execute_command():
     if command_name not in ALLOWED_COMMANDS:
         return json_error("Command not permitted")
 
-    job_id = uuid.uuid4().hex
-    buffer = StringIO()
+    builtin = None
+    if settings.terminal_builtins and not _is_windows():
+        builtin = resolve_builtin(tokens)
 
-    def _run():
+    def _run(job: CommandJob):
         job_status = "finished"
         error_message: str | None = None
+        returncode: int | None = -1
         try:
+            if builtin is not None:
+                returncode = builtin(job, time.monotonic() + TERMINAL_TIMEOUT)
+                if returncode is None:
+                    returncode = -1
+                    error_message = (
+                        f"Command timed out after {TERMINAL_TIMEOUT} seconds"
+                    )
+                    job_status = "error"
+                return
             if _is_windows():
                 popen_args = ["cmd", "/c", cmd_line]
                 use_shell = True
@@ -792,64 +1843,117 @@ def execute_command():
                 popen_args = tokens
                 use_shell = False
 
+            # Binary pipes: output is kept as bytes so offsets are stable.
             proc = subprocess.Popen(
                 popen_args,
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
-                text=True,
                 shell=use_shell,
             )
-            try:
-                out, err = proc.communicate(timeout=TERMINAL_TIMEOUT)
-                buffer.write((out or "") + (err or ""))
-                command_jobs[job_id]["returncode"] = proc.returncode
-            except subprocess.TimeoutExpired:
-                proc.kill()
-                out, err = proc.communicate()
-                buffer.write((out or "") + (err or ""))
-                command_jobs[job_id]["returncode"] = -1
-                timeout_message = (
-                    f"Command timed out after {TERMINAL_TIMEOUT} seconds"
-                )
-                error_message = timeout_message
-                job_status = "error"
-            except Exception as exc:  # pragma: no cover - best effort
-                buffer.write(str(exc))
-                command_jobs[job_id]["returncode"] = -1
-                error_message = str(exc)
+            returncode = capture(proc, job, TERMINAL_TIMEOUT)
+            if returncode is None:
+                returncode = -1
+                error_message = f"Command timed out after {TERMINAL_TIMEOUT} seconds"
                 job_status = "error"
         except Exception as exc:  # pragma: no cover - propagate to job
-            buffer.write(str(exc))
-            command_jobs[job_id]["returncode"] = -1
+            job.write(str(exc))
             error_message = str(exc)
             job_status = "error"
         finally:
-            command_jobs[job_id]["status"] = job_status
-            command_jobs[job_id]["output"] = buffer.getvalue().strip()
-            if error_message:
-                command_jobs[job_id]["error"] = error_message
+            job.finish(job_status, returncode, error_message)
+            if command_name == "ollama":
+                # ``ollama pull``/``ollama rm`` change the installed models
+                model_catalog.invalidate()
+
+    try:
+        job = command_jobs.submit(cmd_line, _run)
+    except JobQueueFull as exc:
+        return _retry_later(str(exc), 429)
+    return jsonify({"job_id": job.id})
+
+
+def _job_offset() -> int | None:
+    """Return the ``offset`` query argument, or ``None`` when absent."""
+    offset = request.args.get("offset", type=int)
+    if offset is None:
+        offset = request.headers.get("Last-Event-ID", type=int)
+    return None if offset is None else max(0, offset)
+
 
-    command_jobs[job_id] = {"status": "running"}
-    thread = threading.Thread(target=_run, daemon=True)
-    thread.start()
-    return jsonify({"job_id": job_id})
+@app.get("/api/command-jobs")
+def command_jobs_stats():
+    """Return worker, queue depth and latency statistics for commands."""
+    return jsonify({"ok": True, "jobs": command_jobs.stats()})
 
 
 @app.get("/api/command-status/<job_id>")
 def command_status(job_id: str):
+    """Report a command's state and output.
+
+    With ``?offset=<n>`` only the output after byte ``n`` is returned,
+    together with the ``offset`` to pass next, while the command runs and
+    after it ends.  Without it the whole output is returned once the
+    command has finished.
+    """
     job = command_jobs.get(job_id)
     if not job:
         return json_error("Unknown job ID", 404)
-    if job.get("status") == "finished":
-        return jsonify({
-            "status": "finished",
-            "returncode": job.get("returncode", 0),
-            "output": job.get("output", ""),
-        })
-    if job.get("status") == "error":
-        message = job.get("error") or "Command failed"
-        return json_error(message, 408)
-    return jsonify({"status": "running"})
+    offset = _job_offset()
+    text, next_offset, done = job.read(offset or 0)
+    if offset is None:
+        if not done:
+            return jsonify({"status": job.status})
+        text = text.strip()
+    payload = {"status": job.status, "output": text, "offset": next_offset}
+    if done:
+        payload["returncode"] = job.returncode
+    if job.status == "error":
+        payload.update(ok=False, error=job.error or "Command failed")
+        return jsonify(payload), 408
+    return jsonify(payload)
+
+
+@app.get("/api/command-stream/<job_id>")
+def command_stream(job_id: str):
+    """Stream a command's output as server-sent events.
+
+    Each ``output`` event carries new text and has the byte offset after it
+    as its id, so a reconnecting ``EventSource`` resumes where it stopped
+    (``?offset=`` works too).  A final ``end`` event reports the status and
+    exit code.
+    """
+    job = command_jobs.get(job_id)
+    if not job:
+        return json_error("Unknown job ID", 404)
+    start = _job_offset() or 0
+
+    def _events():
+        offset = start
+        while True:
+            job.wait(offset, COMMAND_STREAM_HEARTBEAT)
+            text, next_offset, done = job.read(offset)
+            if next_offset != offset:
+                offset = next_offset
+                data = json.dumps({"output": text, "offset": offset})
+                yield f"id: {offset}\nevent: output\ndata: {data}\n\n"
+            elif not done:
+                yield ": keep-alive\n\n"
+            if done:
+                data = json.dumps(
+                    {
+                        "status": job.status,
+                        "returncode": job.returncode,
+                        "error": job.error,
+                    }
+                )
+                yield f"event: end\ndata: {data}\n\n"
+                return
+
+    return Response(
+        stream_with_context(_events()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.route("/api/log-client-error", methods=["POST"])
@@ -896,6 +2000,10 @@ if __name__ == "__main__":
             "boot",
             extra={"request_id": "-", "path": "startup", "status": 0, "duration": 0},
         )
+        if isinstance(ollama_client, OllamaPool):
+            ollama_client.start()
+        # Load the default models now so the first chat skips the cold start.
+        residency.warm(settings.ollama_warm_models)
         app.run(host=settings.host, port=settings.port, debug=False, use_reloader=False)
     except Exception:
         logger.exception("server crashed")
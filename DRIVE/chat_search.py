@@ -0,0 +1,169 @@
+"""Full-text search over a profile's stored chat messages.
+
+:class:`ChatSearch` keeps an in-memory inverted index per profile covering
+the classic chat history and every server-side conversation.  It is built
+from the logs the first time a profile is searched and then kept current
+incrementally: turns persisted by the chat endpoint are added as they are
+written, and any messages appended by other means are picked up from the
+log tails on the next search.  Results are ranked with BM25 and only the
+matching messages are read back (one seek each via the log's offset
+index) to cut snippets.
+"""
+
+from __future__ import annotations
+
+import math
+import re
+import threading
+from collections import Counter
+from typing import Callable
+
+from .chat_store import ChatLog
+
+WORD_RE = re.compile(r"\w+")
+# BM25 parameters.
+K1 = 1.2
+B = 0.75
+# Characters of context shown on each side of the first match.
+SNIPPET_CONTEXT = 60
+
+LogLister = Callable[[str], list[tuple[str | None, ChatLog]]]
+
+
+def tokenize(text: str) -> list[str]:
+    return WORD_RE.findall(text.lower())
+
+
+class _LogState:
+    __slots__ = ("log", "generation", "indexed")
+
+    def __init__(self, log: ChatLog) -> None:
+        self.log = log
+        self.generation = log.generation
+        self.indexed = 0
+
+
+class _ProfileIndex:
+    def __init__(self) -> None:
+        self.logs: dict[str | None, _LogState] = {}
+        self.docs: list[tuple[str | None, int]] = []
+        self.lengths: list[int] = []
+        self.postings: dict[str, dict[int, int]] = {}
+
+    def add(self, key: str | None, index: int, message: dict) -> None:
+        terms = Counter(tokenize(str(message.get("content", ""))))
+        doc = len(self.docs)
+        self.docs.append((key, index))
+        self.lengths.append(sum(terms.values()))
+        for term, count in terms.items():
+            self.postings.setdefault(term, {})[doc] = count
+
+    def sync(self, key: str | None, chat_log: ChatLog) -> bool:
+        """Index new messages of ``chat_log``; False if it must be rebuilt."""
+        state = self.logs.get(key)
+        if state is None:
+            state = self.logs[key] = _LogState(chat_log)
+        if state.log is not chat_log:
+            return False
+        with chat_log.lock:
+            if chat_log.generation != state.generation or len(chat_log) < state.indexed:
+                return False
+            start = state.indexed
+            messages = chat_log.read(start)
+            state.indexed = start + len(messages)
+        for offset, message in enumerate(messages):
+            if isinstance(message, dict):
+                self.add(key, start + offset, message)
+        return True
+
+
+class ChatSearch:
+    """BM25 search over chat logs, one lazily built index per profile.
+
+    ``logs_for(profile)`` lists ``(conversation, log)`` pairs to index;
+    the classic history is listed with conversation ``None``.
+    """
+
+    def __init__(self, logs_for: LogLister) -> None:
+        self._logs_for = logs_for
+        self._indexes: dict[str, _ProfileIndex] = {}
+        self._lock = threading.Lock()
+
+    def note_append(
+        self, profile: str, conversation: str | None, chat_log: ChatLog
+    ) -> None:
+        """Index messages just appended to ``chat_log`` if ``profile`` is indexed."""
+        with self._lock:
+            index = self._indexes.get(profile)
+            if index is not None and not index.sync(conversation, chat_log):
+                del self._indexes[profile]
+
+    def search(
+        self, profile: str, query: str, limit: int = 20
+    ) -> list[dict[str, object]]:
+        """Return up to ``limit`` messages matching ``query``, best first."""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        with self._lock:
+            index = self._sync(profile)
+            ranked = self._rank(index, terms, limit)
+        return [self._result(index, doc, score, terms) for doc, score in ranked]
+
+    def _sync(self, profile: str) -> _ProfileIndex:
+        index = self._indexes.get(profile)
+        logs = self._logs_for(profile)
+        if index is None or not all(index.sync(key, log) for key, log in logs):
+            # New profile, or a log was compacted and renumbered: rebuild.
+            index = _ProfileIndex()
+            for key, chat_log in logs:
+                index.sync(key, chat_log)
+        self._indexes[profile] = index
+        return index
+
+    @staticmethod
+    def _rank(
+        index: _ProfileIndex, terms: list[str], limit: int
+    ) -> list[tuple[int, float]]:
+        count = len(index.docs)
+        if not count:
+            return []
+        avg_length = sum(index.lengths) / count or 1.0
+        scores: dict[int, float] = {}
+        for term in terms:
+            postings = index.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc, tf in postings.items():
+                norm = K1 * (1 - B + B * index.lengths[doc] / avg_length)
+                scores[doc] = scores.get(doc, 0.0) + idf * tf * (K1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda item: (-item[1], -item[0]))[:limit]
+
+    @staticmethod
+    def _result(
+        index: _ProfileIndex, doc: int, score: float, terms: list[str]
+    ) -> dict[str, object]:
+        conversation, position = index.docs[doc]
+        messages = index.logs[conversation].log.read(position, position + 1)
+        message = messages[0] if messages else {}
+        content = str(message.get("content", ""))
+        match = re.search(
+            r"\b(" + "|".join(map(re.escape, terms)) + r")\b", content, re.IGNORECASE
+        )
+        start = match.start() if match else 0
+        end = match.end() if match else 0
+        lo = max(0, start - SNIPPET_CONTEXT)
+        hi = min(len(content), end + SNIPPET_CONTEXT)
+        snippet = (
+            ("…" if lo else "") + content[lo:hi] + ("…" if hi < len(content) else "")
+        )
+        return {
+            "conversation": conversation,
+            "index": position,
+            "role": message.get("role"),
+            "offset": start,
+            "length": end - start,
+            "snippet": snippet,
+            "score": round(score, 4),
+        }
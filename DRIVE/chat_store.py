@@ -0,0 +1,433 @@
+"""Append-only chat history storage.
+
+Each profile's chat messages live in ``users/<id>/chat_history.jsonl`` with
+one JSON object per line.  A sidecar ``chat_history.idx`` holds the byte
+offset of every line as little-endian unsigned 64-bit integers, so a page of
+messages can be read with a single seek no matter how long the log is.
+``chat_history.tok`` holds each message's estimated token count (unsigned
+32-bit) so prompt windows can be sized without reading message text.
+
+New messages are appended with one ``write`` call; nothing already on disk
+is rewritten.  When a log grows past its retention limit it is compacted in
+a background thread, which copies the most recent messages into a new file
+and swaps it in atomically.  A torn last line left behind by a crash is
+dropped, and the index is rebuilt whenever it does not match the log.
+
+Server-owned conversations use the same format, one log per conversation
+under ``users/<id>/conversations/``.  Their message count doubles as the
+conversation version, so they are never compacted.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import sys
+import threading
+from array import array
+from pathlib import Path
+from typing import Callable
+
+from .context_builder import estimate_tokens, message_tokens, window_start
+
+logger = logging.getLogger("server")
+
+HISTORY_NAME = "chat_history"
+CONVERSATIONS_DIR = "conversations"
+
+
+def _array(typecode: str, data: bytes = b"") -> array:
+    arr = array(typecode)
+    data = data[: len(data) - len(data) % arr.itemsize]
+    if data:
+        arr.frombytes(data)
+        if sys.byteorder != "little":  # pragma: no cover - big endian hosts
+            arr.byteswap()
+    return arr
+
+
+def _offsets(data: bytes = b"") -> array:
+    return _array("Q", data)
+
+
+def _array_bytes(arr: array) -> bytes:
+    if sys.byteorder != "little":  # pragma: no cover - big endian hosts
+        arr = array(arr.typecode, arr)
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def _line_tokens(line: bytes) -> int:
+    try:
+        return message_tokens(json.loads(line))
+    except (json.JSONDecodeError, AttributeError):
+        return estimate_tokens(line.decode("utf-8", errors="ignore"))
+
+
+def safe_conversation_id(value: str) -> str:
+    """Validate a client supplied conversation id."""
+    value = str(value)
+    if not value or len(value) > 64 or not all(c.isalnum() or c in "-_" for c in value):
+        raise ValueError("Invalid conversation id")
+    return value
+
+
+class ChatLog:
+    """Append-only JSONL message log with an offset index for one profile."""
+
+    def __init__(self, directory: Path, name: str = HISTORY_NAME) -> None:
+        self.directory = directory
+        self.name = name
+        self.path = directory / f"{name}.jsonl"
+        self.index_path = directory / f"{name}.idx"
+        self.tokens_path = directory / f"{name}.tok"
+        self.lock = threading.RLock()
+        self._offsets = _offsets()
+        self._tokens = _array("I")
+        self._size = 0
+        self.compacting = False
+        # Bumped whenever compaction renumbers the messages.
+        self.generation = 0
+        self._open()
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    # -- loading ---------------------------------------------------------
+    def _open(self) -> None:
+        legacy = self.directory / f"{self.name}.json"
+        if not self.path.exists() and legacy.exists():
+            self._migrate(legacy)
+        if not self.path.exists():
+            self.path.touch()
+        self._size = self.path.stat().st_size
+        try:
+            self._offsets = _offsets(self.index_path.read_bytes())
+        except FileNotFoundError:
+            self._offsets = _offsets()
+        if not self._index_matches():
+            self._offsets = _offsets()
+        start = self._offsets[-1] if self._offsets else 0
+        if self._offsets:
+            # The last indexed line is already known to be complete.
+            with self.path.open("rb") as fh:
+                fh.seek(start)
+                start += len(fh.readline())
+        if start < self._size or not self.index_path.exists():
+            self._scan_from(start)
+        self._load_tokens()
+
+    def _load_tokens(self) -> None:
+        """Load cached token estimates, computing any that are missing."""
+        try:
+            tokens = _array("I", self.tokens_path.read_bytes())
+        except FileNotFoundError:
+            tokens = _array("I")
+        if len(tokens) > len(self._offsets):
+            tokens = _array("I")
+        if len(tokens) < len(self._offsets) or not self.tokens_path.exists():
+            tokens.extend(_line_tokens(line) for line in self._read_lines(len(tokens)))
+            self.tokens_path.write_bytes(_array_bytes(tokens))
+        self._tokens = tokens
+
+    def _index_matches(self) -> bool:
+        if not self._offsets:
+            return True
+        last = self._offsets[-1]
+        if last >= self._size:
+            return False
+        if last == 0:
+            return True
+        with self.path.open("rb") as fh:
+            fh.seek(last - 1)
+            return fh.read(1) == b"\n"
+
+    def _scan_from(self, start: int) -> None:
+        """Index complete lines from ``start`` and drop a torn tail."""
+        added = _offsets()
+        pos = start
+        with self.path.open("rb") as fh:
+            fh.seek(start)
+            for line in fh:
+                if not line.endswith(b"\n"):
+                    break
+                if line.strip():
+                    added.append(pos)
+                pos += len(line)
+        if pos < self._size:
+            logger.warning(
+                "Dropping %d torn bytes from %s", self._size - pos, self.path
+            )
+            with self.path.open("r+b") as fh:
+                fh.truncate(pos)
+            self._size = pos
+        self._offsets.extend(added)
+        self.index_path.write_bytes(_array_bytes(self._offsets))
+
+    def _migrate(self, legacy: Path) -> None:
+        """Import a ``chat_history.json`` written by older versions."""
+        try:
+            data = json.loads(legacy.read_text(encoding="utf-8"))
+        except Exception:
+            logger.exception("Failed reading legacy chat history %s", legacy)
+            return
+        messages = (
+            [m for m in data if isinstance(m, dict)] if isinstance(data, list) else []
+        )
+        tmp = self.path.with_suffix(".jsonl.tmp")
+        tmp.write_bytes(b"".join(self._encode(m) for m in messages))
+        os.replace(tmp, self.path)
+        legacy.rename(legacy.with_name(legacy.name + ".migrated"))
+
+    # -- reading and writing ---------------------------------------------
+    @staticmethod
+    def _encode(message: dict) -> bytes:
+        return (
+            json.dumps(message, ensure_ascii=False, separators=(",", ":")) + "\n"
+        ).encode("utf-8")
+
+    def append(self, messages: list[dict]) -> int:
+        """Append ``messages`` and return the new message count."""
+        if not messages:
+            return len(self)
+        with self.lock:
+            lines = [self._encode(m) for m in messages]
+            new = _offsets()
+            pos = self._size
+            for line in lines:
+                new.append(pos)
+                pos += len(line)
+            with self.path.open("ab") as fh:
+                fh.write(b"".join(lines))
+            with self.index_path.open("ab") as fh:
+                fh.write(_array_bytes(new))
+            tokens = _array("I")
+            tokens.extend(message_tokens(m) for m in messages)
+            with self.tokens_path.open("ab") as fh:
+                fh.write(_array_bytes(tokens))
+            self._offsets.extend(new)
+            self._tokens.extend(tokens)
+            self._size = pos
+            return len(self)
+
+    def _read_lines(self, start: int = 0, stop: int | None = None) -> list[bytes]:
+        with self.lock:
+            count = len(self._offsets)
+            stop = count if stop is None else max(0, min(stop, count))
+            start = max(0, min(start, stop))
+            if start == stop:
+                return []
+            begin = self._offsets[start]
+            end = self._offsets[stop] if stop < count else self._size
+            with self.path.open("rb") as fh:
+                fh.seek(begin)
+                chunk = fh.read(end - begin)
+        return [line for line in chunk.splitlines() if line.strip()]
+
+    def read(self, start: int = 0, stop: int | None = None) -> list[dict]:
+        """Return messages ``start`` (inclusive) to ``stop`` (exclusive)."""
+        messages = []
+        for line in self._read_lines(start, stop):
+            try:
+                messages.append(json.loads(line))
+            except json.JSONDecodeError:
+                logger.warning("Skipping corrupt chat history line in %s", self.path)
+        return messages
+
+    def page(
+        self, before: int | None = None, limit: int | None = None
+    ) -> tuple[list[dict], int]:
+        """Return up to ``limit`` messages preceding index ``before``.
+
+        The result is ``(messages, start)`` where ``start`` is the index of
+        the first returned message and serves as the next ``before`` cursor.
+        """
+        with self.lock:
+            stop = len(self) if before is None else max(0, min(before, len(self)))
+            start = 0 if limit is None else max(0, stop - max(0, limit))
+            return self.read(start, stop), start
+
+    def window_start(self, budget: int) -> int:
+        """Return the index of the oldest message in the newest ``budget`` tokens."""
+        with self.lock:
+            return window_start(self._tokens, budget)
+
+    # -- sidecar state ---------------------------------------------------
+    def _sidecar(self, kind: str) -> Path:
+        return self.directory / f"{self.name}.{kind}.json"
+
+    def _load_sidecar(self, kind: str) -> dict | None:
+        try:
+            data = json.loads(self._sidecar(kind).read_text(encoding="utf-8"))
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        return data if isinstance(data, dict) else None
+
+    def _save_sidecar(self, kind: str, payload: dict) -> None:
+        path = self._sidecar(kind)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(payload, separators=(",", ":")), encoding="utf-8")
+        os.replace(tmp, path)
+
+    def load_context(self, model: str) -> list[int] | None:
+        """Return the saved Ollama ``context`` if it matches this log.
+
+        The tokens are only reusable for the same ``model`` and when no
+        message was added since they were saved.
+        """
+        data = self._load_sidecar("ctx")
+        with self.lock:
+            if (
+                not data
+                or data.get("model") != model
+                or data.get("version") != len(self)
+            ):
+                return None
+        context = data.get("context")
+        return context if isinstance(context, list) else None
+
+    def save_context(self, model: str, context: list[int]) -> None:
+        """Store ``context`` as the state after the current last message."""
+        with self.lock:
+            self._save_sidecar(
+                "ctx", {"model": model, "version": len(self), "context": context}
+            )
+
+    def load_summary(self) -> dict | None:
+        """Return ``{"upto": n, "text": ...}`` summarizing messages before ``n``."""
+        data = self._load_sidecar("summary")
+        if not data or not isinstance(data.get("upto"), int):
+            return None
+        return data
+
+    def save_summary(self, upto: int, text: str) -> None:
+        with self.lock:
+            self._save_sidecar("summary", {"upto": upto, "text": text})
+
+    def compact(self, keep: int) -> None:
+        """Rewrite the log so only the newest ``keep`` messages remain.
+
+        The bulk of the log is copied without holding :attr:`lock`, so
+        appends and reads carry on meanwhile; the lock is only taken to
+        copy whatever was appended during the copy and swap the files in.
+        """
+        with self.lock:
+            drop = max(0, len(self) - keep)
+            if not drop:
+                return
+            base = self._offsets[drop]
+            count, end, generation = len(self), self._size, self.generation
+            offsets = _offsets()
+            offsets.extend(o - base for o in self._offsets[drop:])
+            tokens = self._tokens[drop:]
+        tmp_log = self.path.with_suffix(".jsonl.tmp")
+        tmp_index = self.index_path.with_suffix(".idx.tmp")
+        tmp_tokens = self.tokens_path.with_suffix(".tok.tmp")
+        # Bytes before ``end`` never change, so they can be copied unlocked.
+        with self.path.open("rb") as src, tmp_log.open("wb") as dst:
+            src.seek(base)
+            _copy(src, dst, end - base)
+        with self.lock:
+            if self.generation != generation:  # compacted meanwhile
+                tmp_log.unlink(missing_ok=True)
+                return
+            if self._size > end:
+                with self.path.open("rb") as src, tmp_log.open("ab") as dst:
+                    src.seek(end)
+                    _copy(src, dst, self._size - end)
+                offsets.extend(o - base for o in self._offsets[count:])
+                tokens.extend(self._tokens[count:])
+            tmp_index.write_bytes(_array_bytes(offsets))
+            tmp_tokens.write_bytes(_array_bytes(tokens))
+            os.replace(tmp_log, self.path)
+            os.replace(tmp_index, self.index_path)
+            os.replace(tmp_tokens, self.tokens_path)
+            self._offsets = offsets
+            self._tokens = tokens
+            self._size -= base
+            self.generation += 1
+
+
+def _copy(src, dst, length: int) -> None:
+    """Copy ``length`` bytes from ``src`` to ``dst`` in 1 MiB blocks."""
+    while length > 0:
+        block = src.read(min(1 << 20, length))
+        if not block:
+            break
+        dst.write(block)
+        length -= len(block)
+
+
+class ChatStore:
+    """Per-profile :class:`ChatLog` registry with background compaction.
+
+    ``root_for`` maps a profile id to its directory.  ``max_messages`` is the
+    retention limit; a log is compacted once it exceeds that by a quarter so
+    compaction is amortised over many appends.  ``0`` keeps everything.
+    """
+
+    def __init__(self, root_for: Callable[[str], Path], max_messages: int = 0) -> None:
+        self._root_for = root_for
+        self.max_messages = max_messages
+        self._logs: dict[Path, ChatLog] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, directory: Path, name: str) -> ChatLog:
+        key = directory / name
+        with self._lock:
+            chat_log = self._logs.get(key)
+            if chat_log is None:
+                chat_log = self._logs[key] = ChatLog(directory, name)
+            return chat_log
+
+    def log(self, profile: str) -> ChatLog:
+        return self._get(self._root_for(profile), HISTORY_NAME)
+
+    def conversation(self, profile: str, conversation_id: str) -> ChatLog:
+        """Return the server-owned log for ``conversation_id``.
+
+        ``ValueError`` is raised for ids that are not safe file names.
+        """
+        name = safe_conversation_id(conversation_id)
+        directory = self._root_for(profile) / CONVERSATIONS_DIR
+        directory.mkdir(exist_ok=True)
+        return self._get(directory, name)
+
+    def conversations(self, profile: str) -> list[str]:
+        """Return the ids of ``profile``'s server-side conversations."""
+        directory = self._root_for(profile) / CONVERSATIONS_DIR
+        if not directory.is_dir():
+            return []
+        return sorted(path.stem for path in directory.glob("*.jsonl"))
+
+    def load(self, profile: str) -> list[dict]:
+        return self.log(profile).read()
+
+    def page(self, profile: str, before: int | None = None, limit: int | None = None):
+        chat_log = self.log(profile)
+        messages, start = chat_log.page(before, limit)
+        return messages, start, len(chat_log)
+
+    def append(self, profile: str, messages: list[dict]) -> int:
+        chat_log = self.log(profile)
+        count = chat_log.append(messages)
+        if self.max_messages and count > self.max_messages * 1.25:
+            self._schedule_compaction(chat_log)
+        return count
+
+    def _schedule_compaction(self, chat_log: ChatLog) -> None:
+        with chat_log.lock:
+            if chat_log.compacting:
+                return
+            chat_log.compacting = True
+
+        def _run() -> None:
+            try:
+                chat_log.compact(self.max_messages)
+            except Exception:
+                logger.exception("Chat history compaction failed for %s", chat_log.path)
+            finally:
+                chat_log.compacting = False
+
+        threading.Thread(target=_run, daemon=True).start()
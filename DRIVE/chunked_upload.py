@@ -0,0 +1,247 @@
+"""Resumable, chunked uploads written straight to disk.
+
+``/api/upload`` takes one multipart body, which Werkzeug spools in full
+before ``file.save`` copies it, and an interrupted upload starts over.
+Here an upload is a session: :meth:`ChunkedUploads.create` reserves a temp
+file of the final size under ``users/<id>/.uploads/<upload id>/``, each
+chunk is streamed from the request body into its slice of that file with
+``os.pwrite`` (so chunks may arrive in any order and in parallel), and
+:meth:`ChunkedUploads.complete` renames the finished file into place.
+
+Chunk ``n`` covers bytes ``n * chunk_size`` up to the next boundary.  Its
+SHA-256 is computed while it is written and, if the client sent one,
+compared with it; only chunks that arrived whole and intact are recorded
+in the session's ``session.json``.  That file survives disconnects and
+restarts, so a client resumes by asking which chunks are still missing.
+Sessions untouched for ``ttl`` seconds are removed.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import BinaryIO
+
+logger = logging.getLogger("server")
+
+UPLOADS_DIR = ".uploads"
+READ_CHUNK = 64 * 1024
+_ID = re.compile(r"^[0-9a-f]{32}$")
+
+
+class UploadError(Exception):
+    """A request the upload protocol refuses; ``status`` is the HTTP code."""
+
+    def __init__(self, message: str, status: int = 400) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+class ChunkedUploads:
+    """Upload sessions kept under each user's root."""
+
+    def __init__(
+        self,
+        chunk_size: int = 8 * 1024 * 1024,
+        max_bytes: int = 0,
+        ttl: float = 86400.0,
+    ) -> None:
+        self.chunk_size = chunk_size
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._locks: dict[str, threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+
+    # -- sessions ------------------------------------------------------
+
+    def _dir(self, root: Path, upload_id: str) -> Path:
+        if not _ID.match(upload_id):
+            raise UploadError("Unknown upload", 404)
+        return root / UPLOADS_DIR / upload_id
+
+    def _lock(self, upload_id: str) -> threading.Lock:
+        with self._locks_lock:
+            return self._locks.setdefault(upload_id, threading.Lock())
+
+    def _load(self, root: Path, upload_id: str) -> dict:
+        try:
+            text = (self._dir(root, upload_id) / "session.json").read_text(
+                encoding="utf-8"
+            )
+        except FileNotFoundError:
+            raise UploadError("Unknown upload", 404) from None
+        try:
+            return json.loads(text)
+        except ValueError:  # truncated by a crash mid-write
+            raise UploadError("Upload session is damaged", 409) from None
+
+    def _save(self, root: Path, session: dict) -> None:
+        path = self._dir(root, session["id"]) / "session.json"
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(session), encoding="utf-8")
+        os.replace(tmp, path)
+
+    @staticmethod
+    def _describe(session: dict) -> dict[str, object]:
+        received = sorted(int(index) for index in session["chunks"])
+        have = set(received)
+        return {
+            "id": session["id"],
+            "path": session["dest"],
+            "size": session["size"],
+            "chunkSize": session["chunkSize"],
+            "chunks": session["count"],
+            "received": received,
+            "missing": [
+                index for index in range(session["count"]) if index not in have
+            ],
+        }
+
+    def create(
+        self, root: Path, dest: Path, size: int, chunk_size: int | None = None
+    ) -> dict[str, object]:
+        """Start uploading ``size`` bytes to ``dest`` (a path under ``root``)."""
+        if size < 0:
+            raise UploadError("size must not be negative")
+        if self.max_bytes and size > self.max_bytes:
+            raise UploadError("File too large", 413)
+        chunk_size = chunk_size or self.chunk_size
+        if not 64 * 1024 <= chunk_size <= 64 * 1024 * 1024:
+            raise UploadError("chunk_size must be between 64 KiB and 64 MiB")
+        self.cleanup(root)
+        if shutil.disk_usage(root).free < size:
+            raise UploadError("Not enough disk space", 507)
+        upload_id = uuid.uuid4().hex
+        directory = self._dir(root, upload_id)
+        directory.mkdir(parents=True)
+        with open(directory / "data", "wb") as handle:
+            handle.truncate(size)
+        session = {
+            "id": upload_id,
+            "dest": dest.relative_to(root).as_posix(),
+            "size": size,
+            "chunkSize": chunk_size,
+            "count": max(1, -(-size // chunk_size)),
+            "chunks": {},
+            "updated": time.time(),
+        }
+        self._save(root, session)
+        return self._describe(session)
+
+    def status(self, root: Path, upload_id: str) -> dict[str, object]:
+        return self._describe(self._load(root, upload_id))
+
+    def write_chunk(
+        self,
+        root: Path,
+        upload_id: str,
+        offset: int,
+        stream: BinaryIO,
+        checksum: str | None = None,
+    ) -> dict[str, object]:
+        """Write the chunk starting at ``offset`` from ``stream``.
+
+        The body must be exactly the chunk's length.  A short body (a
+        dropped connection) or a ``checksum`` mismatch leaves the chunk
+        missing so the client can send it again.
+        """
+        session = self._load(root, upload_id)
+        size, chunk_size = session["size"], session["chunkSize"]
+        if offset < 0 or offset % chunk_size or (offset >= size and size):
+            raise UploadError("offset must be a chunk boundary inside the file")
+        index = offset // chunk_size
+        length = min(chunk_size, size - offset)
+        digest = hashlib.sha256()
+        written = 0
+        try:
+            fd = os.open(self._dir(root, upload_id) / "data", os.O_WRONLY)
+        except FileNotFoundError:  # completed or aborted meanwhile
+            raise UploadError("Unknown upload", 404) from None
+        try:
+            while written < length:
+                block = stream.read(min(READ_CHUNK, length - written))
+                if not block:
+                    break
+                os.pwrite(fd, block, offset + written)
+                digest.update(block)
+                written += len(block)
+            extra = stream.read(1)
+        finally:
+            os.close(fd)
+        if written < length or extra:
+            raise UploadError(f"chunk {index} must be exactly {length} bytes")
+        sha256 = digest.hexdigest()
+        if checksum and checksum.lower() != sha256:
+            raise UploadError(f"checksum mismatch for chunk {index}", 422)
+        with self._lock(upload_id):
+            session = self._load(root, upload_id)
+            session["chunks"][str(index)] = sha256
+            session["updated"] = time.time()
+            self._save(root, session)
+        return {"index": index, "sha256": sha256, **self._describe(session)}
+
+    def complete(self, root: Path, upload_id: str) -> Path:
+        """Move the finished upload to its destination and return that path."""
+        with self._lock(upload_id):
+            session = self._load(root, upload_id)
+            missing = self._describe(session)["missing"]
+            if missing:
+                raise UploadError(f"{len(missing)} chunks missing", 409)
+            directory = self._dir(root, upload_id)
+            dest = root / session["dest"]
+            try:
+                dest.parent.mkdir(parents=True, exist_ok=True)
+                # Same filesystem as the destination, so this is atomic.
+                os.replace(directory / "data", dest)
+            except (IsADirectoryError, NotADirectoryError, FileExistsError):
+                # The session is kept so the upload can be completed later.
+                raise UploadError(
+                    f"{session['dest']} conflicts with an existing item", 409
+                ) from None
+            except OSError as exc:
+                logger.error("Completing upload %s failed: %s", upload_id, exc)
+                raise UploadError("Could not save the upload", 500) from None
+            shutil.rmtree(directory, ignore_errors=True)
+        with self._locks_lock:
+            self._locks.pop(upload_id, None)
+        return dest
+
+    def abort(self, root: Path, upload_id: str) -> None:
+        directory = self._dir(root, upload_id)
+        if not directory.exists():
+            raise UploadError("Unknown upload", 404)
+        shutil.rmtree(directory, ignore_errors=True)
+        with self._locks_lock:
+            self._locks.pop(upload_id, None)
+
+    def cleanup(self, root: Path) -> int:
+        """Remove sessions of ``root`` idle for longer than ``ttl``."""
+        base = root / UPLOADS_DIR
+        if not base.is_dir():
+            return 0
+        removed = 0
+        cutoff = time.time() - self.ttl
+        for directory in base.iterdir():
+            try:
+                updated = json.loads(
+                    (directory / "session.json").read_text(encoding="utf-8")
+                )["updated"]
+            except (OSError, ValueError, KeyError):
+                try:
+                    updated = directory.stat().st_mtime
+                except OSError:
+                    continue
+            if updated < cutoff:
+                shutil.rmtree(directory, ignore_errors=True)
+                removed += 1
+        if removed:
+            logger.info("Removed %d stale uploads under %s", removed, root)
+        return removed
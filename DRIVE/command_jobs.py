@@ -0,0 +1,337 @@
+"""Live output capture for terminal commands run in the background.
+
+Each :class:`CommandJob` owns a byte buffer that reader threads fill from
+the process's stdout and stderr as data arrives, so clients can follow a
+long ``ping`` or ``cat`` while it runs.  Readers ask for the output after a
+byte ``offset`` and get back only what is new plus the offset to resume
+from; :meth:`CommandJob.wait` lets a streaming reader block until more
+output arrives instead of polling.
+
+Only the last ``max_output`` bytes of a job are kept: older output is
+dropped from the front of the buffer while offsets keep counting from the
+start, so a reader that falls behind skips ahead instead of the server
+holding unbounded output.  :class:`JobRegistry` runs jobs on a fixed set of
+worker threads behind a bounded queue, rejects work once that queue is
+full and forgets finished jobs after a TTL or when too many accumulate.
+"""
+
+from __future__ import annotations
+
+import queue
+import subprocess
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Callable
+
+# Bytes requested per read from a process pipe.
+READ_CHUNK = 64 * 1024
+# Finished jobs whose timings feed the latency statistics.
+LATENCY_SAMPLES = 256
+
+
+class JobQueueFull(Exception):
+    """Raised when every worker is busy and the wait queue is full."""
+
+
+def _complete_utf8(data: bytes | bytearray) -> int:
+    """Return the length of ``data`` without a trailing partial UTF-8 character."""
+    end = len(data)
+    for back in range(1, min(4, end) + 1):
+        byte = data[end - back]
+        if byte & 0xC0 == 0x80:
+            continue  # continuation byte; keep looking for the lead byte
+        if byte < 0x80:
+            need = 1
+        elif byte < 0xE0:
+            need = 2
+        elif byte < 0xF0:
+            need = 3
+        else:
+            need = 4
+        return end if back >= need else end - back
+    return end
+
+
+class CommandJob:
+    """Status and the most recent output of one command.
+
+    ``max_output`` bounds the bytes kept (0 keeps everything).
+    """
+
+    def __init__(self, command: str, max_output: int = 0) -> None:
+        self.id = uuid.uuid4().hex
+        self.command = command
+        self.status = "queued"
+        self.returncode: int | None = None
+        self.error: str | None = None
+        self.submitted = time.time()
+        self.started: float | None = None
+        self.finished: float | None = None
+        self.max_output = max_output
+        # Bytes dropped from the front of ``_output``; offsets are absolute.
+        self.dropped = 0
+        self._output = bytearray()
+        self._cond = threading.Condition()
+
+    @property
+    def done(self) -> bool:
+        return self.status not in ("queued", "running")
+
+    def start(self) -> None:
+        with self._cond:
+            self.status = "running"
+            self.started = time.time()
+
+    def write(self, data: bytes | str) -> None:
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        if not data:
+            return
+        with self._cond:
+            self._output += data
+            excess = len(self._output) - self.max_output
+            if self.max_output and excess > 0:
+                # Never start the kept output inside a UTF-8 character.
+                while (
+                    excess < len(self._output) and self._output[excess] & 0xC0 == 0x80
+                ):
+                    excess += 1
+                # Deleting from the front of a bytearray does not move the
+                # remaining bytes, so the buffer works as a ring.
+                del self._output[:excess]
+                self.dropped += excess
+            self._cond.notify_all()
+
+    def finish(
+        self, status: str, returncode: int | None, error: str | None = None
+    ) -> None:
+        with self._cond:
+            self.status = status
+            self.returncode = returncode
+            self.error = error
+            self.finished = time.time()
+            self._cond.notify_all()
+
+    def read(self, offset: int = 0) -> tuple[str, int, bool]:
+        """Return ``(text, next_offset, done)`` for output after byte ``offset``.
+
+        Output that was already dropped is skipped.  While the job runs, a
+        multi-byte character split across reads is held back until it is
+        complete.  ``done`` is sampled together with the output, so a
+        reader that sees it true has received everything.
+        """
+        with self._cond:
+            done = self.done
+            kept = len(self._output) if done else _complete_utf8(self._output)
+            end = self.dropped + kept
+            start = max(self.dropped, min(offset, end))
+            data = bytes(self._output[start - self.dropped : kept])
+        return data.decode("utf-8", errors="replace"), end, done
+
+    def output(self) -> str:
+        """Return all output that is still kept."""
+        return self.read(0)[0]
+
+    def wait(self, offset: int, timeout: float | None = None) -> bool:
+        """Block until output beyond ``offset`` exists or the job ends.
+
+        Returns False if ``timeout`` expired first.
+        """
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: self.done
+                or self.dropped + _complete_utf8(self._output) > offset,
+                timeout,
+            )
+
+    def as_dict(self) -> dict[str, object]:
+        with self._cond:
+            return {
+                "id": self.id,
+                "command": self.command,
+                "status": self.status,
+                "returncode": self.returncode,
+                "submitted": self.submitted,
+                "started": self.started,
+                "finished": self.finished,
+                "bytes": self.dropped + len(self._output),
+                "dropped": self.dropped,
+            }
+
+
+def pump(stream, job: CommandJob) -> None:
+    """Copy ``stream`` into ``job`` chunk by chunk until EOF."""
+    read = getattr(stream, "read1", stream.read)
+    try:
+        while True:
+            chunk = read(READ_CHUNK)
+            if not chunk:
+                break
+            job.write(chunk)
+    except (OSError, ValueError):
+        pass  # pipe closed underneath us after a kill
+    finally:
+        try:
+            stream.close()
+        except OSError:
+            pass
+
+
+def capture(proc, job: CommandJob, timeout: float) -> int | None:
+    """Stream ``proc``'s stdout and stderr into ``job`` until it exits.
+
+    Returns the exit code, or ``None`` if the process was killed after
+    ``timeout`` seconds.
+    """
+    readers = [
+        threading.Thread(target=pump, args=(stream, job), daemon=True)
+        for stream in (proc.stdout, proc.stderr)
+        if stream is not None
+    ]
+    for reader in readers:
+        reader.start()
+    try:
+        returncode = proc.wait(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+        returncode = None
+    for reader in readers:
+        reader.join()
+    return returncode
+
+
+class JobRegistry:
+    """Thread-safe job table with a bounded worker pool.
+
+    At most ``workers`` jobs run at once and ``max_queue`` more wait;
+    :meth:`submit` raises :class:`JobQueueFull` beyond that.  Finished jobs
+    are forgotten ``ttl`` seconds after they end, and the least recently
+    looked-up ones go first once more than ``max_jobs`` are kept.
+    """
+
+    def __init__(
+        self,
+        workers: int = 4,
+        max_queue: int = 16,
+        ttl: float = 600.0,
+        max_jobs: int = 200,
+        max_output: int = 1024 * 1024,
+    ) -> None:
+        self.workers = max(1, workers)
+        self.max_queue = max(1, max_queue)
+        self.ttl = ttl
+        self.max_jobs = max_jobs
+        self.max_output = max_output
+        self._jobs: OrderedDict[str, CommandJob] = OrderedDict()
+        self._queue: queue.Queue = queue.Queue(self.max_queue)
+        self._threads: list[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._running = 0
+        self._submitted = 0
+        self._rejected = 0
+        self._evicted = 0
+        self._waits: deque[float] = deque(maxlen=LATENCY_SAMPLES)
+        self._runs: deque[float] = deque(maxlen=LATENCY_SAMPLES)
+
+    def submit(self, command: str, target: Callable[[CommandJob], None]) -> CommandJob:
+        """Queue ``target(job)`` for a new job running ``command``.
+
+        ``target`` should finish the job; one that returns without doing
+        so, or raises, finishes it as an error.
+        """
+        job = CommandJob(command, self.max_output)
+        with self._lock:
+            self._start_workers()
+            try:
+                self._queue.put_nowait((job, target))
+            except queue.Full:
+                self._rejected += 1
+                raise JobQueueFull(
+                    "Too many commands are running; try again shortly"
+                ) from None
+            self._submitted += 1
+            self._jobs[job.id] = job
+            self._evict()
+        return job
+
+    def get(self, job_id: str) -> CommandJob | None:
+        with self._lock:
+            self._evict()
+            job = self._jobs.get(job_id)
+            if job is not None:
+                self._jobs.move_to_end(job_id)
+            return job
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._evict()
+            return len(self._jobs)
+
+    def stats(self) -> dict[str, object]:
+        with self._lock:
+            self._evict()
+            finished = sum(1 for job in self._jobs.values() if job.done)
+            return {
+                "workers": self.workers,
+                "running": self._running,
+                "queued": self._queue.qsize(),
+                "maxQueue": self.max_queue,
+                "jobs": len(self._jobs),
+                "finished": finished,
+                "submitted": self._submitted,
+                "rejected": self._rejected,
+                "evicted": self._evicted,
+                "queueWaitMs": _summary(self._waits),
+                "runMs": _summary(self._runs),
+            }
+
+    def _start_workers(self) -> None:
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._work, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _work(self) -> None:
+        while True:
+            job, target = self._queue.get()
+            with self._lock:
+                self._running += 1
+            job.start()
+            try:
+                target(job)
+            except Exception as exc:
+                job.write(str(exc))
+                job.finish("error", -1, str(exc))
+            finally:
+                if not job.done:
+                    job.finish("error", -1, "Command ended without a result")
+                with self._lock:
+                    self._running -= 1
+                    self._waits.append((job.started - job.submitted) * 1000)
+                    self._runs.append((job.finished - job.started) * 1000)
+
+    def _evict(self) -> None:
+        """Drop expired finished jobs, then the least recently used ones."""
+        now = time.time()
+        finished = [job for job in self._jobs.values() if job.done]
+        excess = len(self._jobs) - self.max_jobs
+        for job in finished:
+            if now - job.finished > self.ttl or excess > 0:
+                del self._jobs[job.id]
+                self._evicted += 1
+                excess -= 1
+
+
+def _summary(samples: deque[float]) -> dict[str, float | int]:
+    if not samples:
+        return {"count": 0, "avg": 0.0, "p95": 0.0, "max": 0.0}
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered),
+        "avg": round(sum(ordered) / len(ordered), 2),
+        "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 2),
+        "max": round(ordered[-1], 2),
+    }
@@ -28,6 +28,30 @@ def _split_csv(value: str) -> list[str]:
     return [item.strip() for item in value.split(",") if item.strip()]
 
 
+def _int_map(value: str) -> dict[str, int]:
+    """Parse ``"name=123,other=456"`` into a dict, skipping bad entries."""
+    result: dict[str, int] = {}
+    for item in _split_csv(value):
+        name, _, number = item.rpartition("=")
+        if name and number.strip().isdigit():
+            result[name.strip()] = int(number)
+    return result
+
+
+def _str_map(value: str) -> dict[str, str]:
+    """Parse ``"name=value,other=value"`` into a dict, skipping bad entries."""
+    result: dict[str, str] = {}
+    for item in _split_csv(value):
+        name, _, text = item.rpartition("=")
+        if name and text.strip():
+            result[name.strip()] = text.strip()
+    return result
+
+
+def _env_flag(name: str, default: str = "0") -> bool:
+    return os.getenv(name, default).strip().lower() in {"1", "true", "yes", "on"}
+
+
 def _root_dir() -> Path:
     """Determine a valid application root directory.
 
@@ -78,7 +102,79 @@ class Settings:
         default_factory=lambda: list(TERMINAL_WHITELIST)
     )
     max_upload_mb: int = int(os.getenv("MAX_UPLOAD_MB", "25"))
+    x_sendfile: bool = _env_flag("X_SENDFILE", "0")
+    upload_chunk_mb: int = int(os.getenv("UPLOAD_CHUNK_MB", "8"))
+    chunked_upload_max_mb: int = int(os.getenv("CHUNKED_UPLOAD_MAX_MB", "0"))
+    upload_session_ttl: float = float(os.getenv("UPLOAD_SESSION_TTL", "86400"))
+    listing_cache_size: int = int(os.getenv("LISTING_CACHE_SIZE", "64"))
+    file_index_content: bool = _env_flag("FILE_INDEX_CONTENT", "0")
+    file_index_reconcile: float = float(os.getenv("FILE_INDEX_RECONCILE", "300"))
     terminal_timeout_seconds: int = TERMINAL_TIMEOUT_SECONDS
+    terminal_builtins: bool = _env_flag("TERMINAL_BUILTINS", "1")
+    terminal_workers: int = int(os.getenv("TERMINAL_WORKERS", "4"))
+    terminal_queue: int = int(os.getenv("TERMINAL_QUEUE", "16"))
+    terminal_job_ttl: float = float(os.getenv("TERMINAL_JOB_TTL", "600"))
+    terminal_max_jobs: int = int(os.getenv("TERMINAL_MAX_JOBS", "200"))
+    terminal_output_max_bytes: int = int(
+        os.getenv("TERMINAL_OUTPUT_MAX_BYTES", "1048576")
+    )
+    script_log_max_bytes: int = int(os.getenv("SCRIPT_LOG_MAX_BYTES", "1048576"))
+    script_log_backups: int = int(os.getenv("SCRIPT_LOG_BACKUPS", "3"))
+    script_sample_interval: float = float(os.getenv("SCRIPT_SAMPLE_INTERVAL", "2"))
+    script_cpu_limit: int = int(os.getenv("SCRIPT_CPU_LIMIT", "0"))
+    script_memory_limit_mb: int = int(os.getenv("SCRIPT_MEMORY_LIMIT_MB", "0"))
+    system_stats_interval: float = float(os.getenv("SYSTEM_STATS_INTERVAL", "2"))
+    system_stats_history: int = int(os.getenv("SYSTEM_STATS_HISTORY", "900"))
+    process_table_interval: float = float(os.getenv("PROCESS_TABLE_INTERVAL", "2"))
+    ollama_url: str = os.getenv("OLLAMA_URL", "http://localhost:11434")
+    ollama_urls: list[str] = field(
+        default_factory=lambda: _split_csv(os.getenv("OLLAMA_URLS", ""))
+        or [os.getenv("OLLAMA_URL", "http://localhost:11434")]
+    )
+    ollama_health_interval: float = float(os.getenv("OLLAMA_HEALTH_INTERVAL", "15"))
+    ollama_models_ttl: float = float(os.getenv("OLLAMA_MODELS_TTL", "30"))
+    ollama_pool_size: int = int(os.getenv("OLLAMA_POOL_SIZE", "10"))
+    ollama_connect_timeout: float = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "3"))
+    ollama_read_timeout: float = float(os.getenv("OLLAMA_READ_TIMEOUT", "60"))
+    ollama_retries: int = int(os.getenv("OLLAMA_RETRIES", "2"))
+    ollama_context_mode: str = os.getenv("OLLAMA_CONTEXT_MODE", "prompt")
+    ollama_keep_alive: str = os.getenv("OLLAMA_KEEP_ALIVE", "")
+    ollama_model_keep_alive: dict[str, str] = field(
+        default_factory=lambda: _str_map(os.getenv("OLLAMA_MODEL_KEEP_ALIVE", ""))
+    )
+    ollama_warm_models: list[str] = field(
+        default_factory=lambda: _split_csv(
+            os.getenv("OLLAMA_WARM_MODELS", "llama3.2:3b,llava:7b")
+        )
+    )
+    ollama_context_tokens: int = int(os.getenv("OLLAMA_CONTEXT_TOKENS", "2048"))
+    ollama_model_context_tokens: dict[str, int] = field(
+        default_factory=lambda: _int_map(os.getenv("OLLAMA_MODEL_CONTEXT_TOKENS", ""))
+    )
+    ollama_summarize: bool = _env_flag("OLLAMA_SUMMARIZE")
+    ollama_max_concurrent: int = int(os.getenv("OLLAMA_MAX_CONCURRENT", "2"))
+    ollama_model_concurrency: dict[str, int] = field(
+        default_factory=lambda: _int_map(os.getenv("OLLAMA_MODEL_CONCURRENCY", ""))
+    )
+    ollama_max_queue: int = int(os.getenv("OLLAMA_MAX_QUEUE", "8"))
+    ollama_queue_timeout: float = float(os.getenv("OLLAMA_QUEUE_TIMEOUT", "60"))
+    ollama_cache_size: int = int(os.getenv("OLLAMA_CACHE_SIZE", "0"))
+    ollama_cache_ttl: float = float(os.getenv("OLLAMA_CACHE_TTL", "300"))
+    ollama_image_max_side: int = int(os.getenv("OLLAMA_IMAGE_MAX_SIDE", "1024"))
+    ollama_model_image_max_side: dict[str, int] = field(
+        default_factory=lambda: _int_map(os.getenv("OLLAMA_MODEL_IMAGE_MAX_SIDE", ""))
+    )
+    ollama_image_quality: int = int(os.getenv("OLLAMA_IMAGE_QUALITY", "85"))
+    ollama_image_cache: int = int(os.getenv("OLLAMA_IMAGE_CACHE", "64"))
+    ollama_embed_model: str = os.getenv("OLLAMA_EMBED_MODEL", "nomic-embed-text")
+    documents_top_k: int = int(os.getenv("DOCUMENTS_TOP_K", "4"))
+    documents_chunk_chars: int = int(os.getenv("DOCUMENTS_CHUNK_CHARS", "800"))
+    documents_rescan_interval: float = float(
+        os.getenv("DOCUMENTS_RESCAN_INTERVAL", "30")
+    )
+    chat_history_max_messages: int = int(
+        os.getenv("CHAT_HISTORY_MAX_MESSAGES", "10000")
+    )
 
 
 settings = Settings()
@@ -0,0 +1,145 @@
+"""Fit chat history into a per-model token budget.
+
+A fixed "last N messages" window either overflows a small model's context
+on long messages or wastes it on short ones.  :class:`ContextBuilder` keeps
+as many of the newest messages as fit into the model's prompt budget, so the
+prompt size (and therefore prompt evaluation time) stays predictable.
+
+Token counts are estimated from the text length; stored conversations keep
+the estimate of every message next to the log (see
+:class:`DRIVE.chat_store.ChatLog`) so it is computed only once.  Messages
+that no longer fit can optionally be collapsed into a summary which is
+generated in the background and cached with the conversation.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+from typing import Callable, Sequence
+
+logger = logging.getLogger("server")
+
+# Rough average for English text with the tokenizers used by llama-style
+# models; good enough to keep prompts inside a budget.
+CHARS_PER_TOKEN = 4
+# Role markers and separators added around every message.
+MESSAGE_OVERHEAD = 4
+
+# How many messages may fall out of the window before the summary is redone.
+SUMMARY_REFRESH_MESSAGES = 8
+# Most messages fed into a single summarization request.
+SUMMARY_MAX_MESSAGES = 200
+
+SUMMARY_PROMPT = (
+    "Summarize the following conversation in a few sentences. Keep names, "
+    "facts and decisions that later messages may refer to.\n\n{transcript}\n\nSummary:"
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Return an estimate of the number of tokens in ``text``."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def message_tokens(message: dict) -> int:
+    """Return the estimated prompt cost of one chat message."""
+    return estimate_tokens(str(message.get("content", ""))) + MESSAGE_OVERHEAD
+
+
+def window_start(tokens: Sequence[int], budget: int) -> int:
+    """Return the first index of the newest messages fitting ``budget``."""
+    total = 0
+    start = len(tokens)
+    while start > 0 and total + tokens[start - 1] <= budget:
+        start -= 1
+        total += tokens[start]
+    return start
+
+
+class ContextBuilder:
+    """Select the history that fits a model's prompt budget.
+
+    ``default_budget`` applies to every model without an entry in
+    ``budgets``.  The budget covers the history, the optional summary and
+    the new prompt together.
+    """
+
+    def __init__(
+        self, default_budget: int, budgets: dict[str, int] | None = None
+    ) -> None:
+        self.default_budget = default_budget
+        self.budgets = dict(budgets or {})
+
+    def budget_for(self, model: str) -> int:
+        return self.budgets.get(model, self.default_budget)
+
+    def history_budget(
+        self, model: str, prompt: str, summary: str | None = None
+    ) -> int:
+        """Return the tokens left for history after ``prompt`` and ``summary``."""
+        used = estimate_tokens(prompt) + MESSAGE_OVERHEAD
+        if summary:
+            used += estimate_tokens(summary) + MESSAGE_OVERHEAD
+        return max(0, self.budget_for(model) - used)
+
+    def fit(self, messages: list[dict], model: str, prompt: str) -> list[dict]:
+        """Return the newest ``messages`` that fit next to ``prompt``."""
+        budget = self.history_budget(model, prompt)
+        start = window_start([message_tokens(m) for m in messages], budget)
+        return messages[start:]
+
+
+def summary_message(summary: str) -> dict:
+    return {
+        "role": "system",
+        "content": f"Summary of the earlier conversation: {summary}",
+    }
+
+
+class Summarizer:
+    """Collapse old conversation turns into a cached summary.
+
+    ``generate(model, prompt)`` must return the model's text.  Summaries are
+    produced in a background thread so they never delay a reply; a turn uses
+    whatever summary is already cached.
+    """
+
+    def __init__(self, generate: Callable[[str, str], str]) -> None:
+        self._generate = generate
+        self._running: set[str] = set()
+        self._lock = threading.Lock()
+
+    def schedule(self, conv_log, model: str, upto: int) -> bool:
+        """Summarize ``conv_log`` messages before ``upto`` in the background."""
+        key = str(conv_log.path)
+        with self._lock:
+            if key in self._running:
+                return False
+            self._running.add(key)
+        threading.Thread(
+            target=self._run, args=(key, conv_log, model, upto), daemon=True
+        ).start()
+        return True
+
+    def _run(self, key: str, conv_log, model: str, upto: int) -> None:
+        try:
+            previous = conv_log.load_summary()
+            start = 0
+            lines = []
+            if previous and previous["upto"] <= upto:
+                start = previous["upto"]
+                lines.append(f"Earlier summary: {previous['text']}")
+            # Keep the summarization prompt itself bounded for huge backlogs.
+            start = max(start, upto - SUMMARY_MAX_MESSAGES)
+            for message in conv_log.read(start, upto):
+                lines.append(f"{message.get('role')}: {message.get('content')}")
+            text = self._generate(
+                model, SUMMARY_PROMPT.format(transcript="\n".join(lines))
+            )
+            conv_log.save_summary(upto, text.strip())
+        except Exception:
+            logger.exception("Summarizing %s failed", conv_log.path)
+        finally:
+            with self._lock:
+                self._running.discard(key)
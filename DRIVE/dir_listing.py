@@ -0,0 +1,236 @@
+"""Sorted, paginated and cached directory listings for the file manager.
+
+Listing a folder with tens of thousands of files used to stat every entry
+on every request and send everything at once.  :class:`ListingCache`
+scans a directory once (one ``stat`` per entry) and keeps the result keyed
+by the directory's path and ``st_mtime_ns``; creating, renaming or deleting
+an entry changes that mtime, so a stale listing is never served for those.
+Writes that only change a file's contents leave the directory mtime alone,
+which is why the app also calls :meth:`ListingCache.invalidate` after its
+own writes.
+
+Each cached listing keeps one sorted order per sort key it was asked for,
+so a page in either direction is a bisect plus a slice.  Pages are
+addressed by keyset cursors (the sort key of the last entry sent), which
+stay correct when entries are added or removed between requests.
+
+Dot entries are left out, as in the search index: the app keeps its own
+state (``.uploads``, ``.file_index``, ``.doc_index``) in dot folders of the
+user's root.
+"""
+
+from __future__ import annotations
+
+import base64
+import binascii
+import json
+import os
+import stat
+import threading
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from pathlib import Path
+
+SORT_KEYS = ("name", "size", "mtime", "type")
+FIELDS = ("name", "path", "isDir", "size", "mtime")
+
+
+class Entry:
+    __slots__ = ("name", "is_dir", "size", "mtime")
+
+    def __init__(self, name: str, is_dir: bool, size: int, mtime: int) -> None:
+        self.name = name
+        self.is_dir = is_dir
+        self.size = size
+        self.mtime = mtime
+
+
+def _sort_key(entry: Entry, sort: str, dirs_first: bool) -> tuple:
+    rank = 0 if entry.is_dir or not dirs_first else 1
+    name = entry.name.casefold()
+    if sort == "size":
+        primary: object = entry.size
+    elif sort == "mtime":
+        primary = entry.mtime
+    elif sort == "type":
+        primary = "" if entry.is_dir else os.path.splitext(name)[1]
+    else:
+        primary = name
+    return (rank, primary, name, entry.name)
+
+
+class Listing:
+    """One scan of a directory and the orders computed from it."""
+
+    def __init__(self, mtime_ns: int, entries: list[Entry]) -> None:
+        self.mtime_ns = mtime_ns
+        self.entries = entries
+        self._orders: dict[tuple[str, bool], tuple[list[tuple], list[Entry]]] = {}
+        self._lock = threading.Lock()
+
+    def order(self, sort: str, dirs_first: bool) -> tuple[list[tuple], list[Entry]]:
+        """Return ``(keys, entries)`` sorted ascending by ``sort``."""
+        with self._lock:
+            cached = self._orders.get((sort, dirs_first))
+            if cached is None:
+                pairs = sorted(
+                    (_sort_key(e, sort, dirs_first), e) for e in self.entries
+                )
+                cached = ([key for key, _ in pairs], [entry for _, entry in pairs])
+                self._orders[(sort, dirs_first)] = cached
+            return cached
+
+
+def encode_cursor(key: tuple) -> str:
+    raw = json.dumps(list(key), separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """Return the sort key stored in ``cursor``; ValueError if it is malformed."""
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (binascii.Error, UnicodeError, ValueError) as exc:
+        raise ValueError("Invalid cursor") from exc
+    if not isinstance(key, list) or len(key) != 4:
+        raise ValueError("Invalid cursor")
+    return tuple(key)
+
+
+def _scan(path: Path) -> list[Entry]:
+    entries = []
+    with os.scandir(path) as it:
+        for entry in it:
+            if entry.name.startswith("."):
+                continue
+            try:
+                info = entry.stat()
+            except OSError:
+                # Dangling symlink: describe the link itself.
+                try:
+                    info = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+            entries.append(
+                Entry(
+                    entry.name,
+                    stat.S_ISDIR(info.st_mode),
+                    info.st_size,
+                    int(info.st_mtime),
+                )
+            )
+    return entries
+
+
+class ListingCache:
+    """LRU of directory listings validated by the directory's mtime."""
+
+    def __init__(self, max_entries: int = 64) -> None:
+        self.max_entries = max_entries
+        self._listings: OrderedDict[str, Listing] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def listing(self, path: Path) -> Listing:
+        """Return the listing of directory ``path``, scanning it if needed."""
+        key = str(path)
+        mtime_ns = path.stat().st_mtime_ns
+        with self._lock:
+            cached = self._listings.get(key)
+            if cached is not None and cached.mtime_ns == mtime_ns:
+                self._listings.move_to_end(key)
+                self.hits += 1
+                return cached
+            self.misses += 1
+        listing = Listing(mtime_ns, _scan(path))
+        if self.max_entries > 0:
+            with self._lock:
+                self._listings[key] = listing
+                self._listings.move_to_end(key)
+                while len(self._listings) > self.max_entries:
+                    self._listings.popitem(last=False)
+        return listing
+
+    def invalidate(self, path: Path) -> None:
+        """Forget the listing of ``path`` (a directory or a file in it)."""
+        with self._lock:
+            self._listings.pop(str(path), None)
+            self._listings.pop(str(path.parent), None)
+
+    def page(
+        self,
+        path: Path,
+        sort: str = "name",
+        descending: bool = False,
+        dirs_first: bool = True,
+        cursor: str | None = None,
+        limit: int | None = None,
+    ) -> tuple[list[Entry], int, str | None]:
+        """Return ``(entries, total, next_cursor)`` for one page of ``path``.
+
+        Raises :class:`ValueError` for an unknown ``sort`` or bad ``cursor``.
+        """
+        if sort not in SORT_KEYS:
+            raise ValueError(f"sort must be one of {', '.join(SORT_KEYS)}")
+        keys, entries = self.listing(path).order(sort, dirs_first)
+        after = decode_cursor(cursor) if cursor else None
+        want = len(entries) if limit is None else limit
+        try:
+            if descending:
+                indices = _descending(keys, dirs_first, after, want + 1)
+            else:
+                start = bisect_right(keys, after) if after is not None else 0
+                indices = range(start, min(len(keys), start + want + 1))
+        except TypeError:
+            raise ValueError("Cursor does not match this sort order") from None
+        indices = list(indices)
+        chunk = [entries[i] for i in indices[:want]]
+        more = len(indices) > want and chunk
+        next_cursor = encode_cursor(keys[indices[want - 1]]) if more else None
+        return chunk, len(entries), next_cursor
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._listings),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+def _descending(
+    keys: list[tuple], dirs_first: bool, after: tuple | None, count: int
+) -> list[int]:
+    """Return up to ``count`` indices of ``keys`` in descending order after ``after``.
+
+    With ``dirs_first`` directories (rank 0) still come before files, each
+    group reversed on its own.
+    """
+    split = bisect_left(keys, (1,)) if dirs_first else len(keys)
+    groups = [(0, split), (split, len(keys))]
+    group = after[0] if after is not None and dirs_first else 0
+    indices: list[int] = []
+    for number, (lo, hi) in enumerate(groups):
+        if number < group:
+            continue
+        top = hi
+        if after is not None and number == group:
+            top = max(lo, bisect_left(keys, after, lo, hi))
+        for index in range(top - 1, lo - 1, -1):
+            if len(indices) == count:
+                return indices
+            indices.append(index)
+    return indices
+
+
+def project(entry: Entry, rel: str, fields: tuple[str, ...]) -> dict[str, object]:
+    """Return the API dict of ``entry`` restricted to ``fields``."""
+    values = {
+        "name": entry.name,
+        "path": str(Path(rel) / entry.name),
+        "isDir": entry.is_dir,
+        "size": entry.size,
+        "mtime": entry.mtime,
+    }
+    return {field: values[field] for field in fields}
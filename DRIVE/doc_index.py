@@ -0,0 +1,406 @@
+"""Semantic search over a profile's documents for chat context.
+
+Text files under ``users/<id>/documents`` are split into overlapping chunks
+and embedded through Ollama.  The vectors of all chunks are stored
+L2-normalised as one flat little-endian float32 file
+(``users/<id>/.doc_index/vectors.f32``) next to a JSON manifest that records,
+per file, its mtime and size, the character span of every chunk and the
+row of its first vector.  Updates re-embed only files whose mtime or size
+changed and drop rows of deleted files; unchanged vectors are copied over.
+Scanning and embedding happen without holding the index lock, in a
+background thread started by a search at most every ``rescan_interval``
+seconds.  If the embedding size changes the index is rebuilt.
+
+A query is embedded the same way and scored against every row with a dot
+product (cosine similarity), using NumPy when it is installed.  Only the
+best ``k`` chunks are read back from disk and handed to the chat prompt.
+"""
+
+from __future__ import annotations
+
+import heapq
+import json
+import logging
+import math
+import os
+import threading
+import time
+from array import array
+from pathlib import Path
+from typing import Callable
+
+from .chat_store import _array, _array_bytes
+
+logger = logging.getLogger("server")
+
+try:  # optional dependency
+    import numpy as np  # type: ignore
+except Exception:  # pragma: no cover - pure Python scoring is used instead
+    np = None
+
+DOCUMENTS_DIR = "documents"
+INDEX_DIR = ".doc_index"
+TEXT_SUFFIXES = frozenset(
+    {
+        ".txt",
+        ".md",
+        ".markdown",
+        ".rst",
+        ".csv",
+        ".json",
+        ".html",
+        ".htm",
+        ".xml",
+        ".py",
+        ".js",
+        ".ts",
+        ".css",
+        ".yaml",
+        ".yml",
+        ".ini",
+        ".cfg",
+        ".toml",
+        ".log",
+    }
+)
+# Larger files are skipped; they would dominate the index and embedding time.
+MAX_FILE_BYTES = 1_000_000
+# Texts sent per embedding request.
+EMBED_BATCH = 32
+
+Embedder = Callable[[list[str]], list[list[float]]]
+
+
+def chunk_spans(
+    text: str, size: int = 800, overlap: int = 100
+) -> list[tuple[int, int]]:
+    """Split ``text`` into ``(start, end)`` spans of about ``size`` characters.
+
+    Chunks end at a paragraph, line or word break where possible and
+    overlap by ``overlap`` characters so a sentence cut in two is still
+    found whole in one of them.
+    """
+    spans: list[tuple[int, int]] = []
+    start = 0
+    length = len(text)
+    while start < length:
+        end = min(length, start + size)
+        if end < length:
+            for sep in ("\n\n", "\n", " "):
+                cut = text.rfind(sep, start + size // 2, end)
+                if cut != -1:
+                    end = cut + len(sep)
+                    break
+        if text[start:end].strip():
+            spans.append((start, end))
+        if end >= length:
+            break
+        start = max(end - overlap, start + 1)
+    return spans
+
+
+def _normalize(vector: list[float]) -> list[float]:
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return [x / norm for x in vector]
+
+
+class DocumentIndex:
+    """Chunk vectors of the text files below ``root``.
+
+    ``embed(texts)`` returns one vector per text; ``model`` is recorded so
+    switching the embedding model rebuilds the index.  :attr:`lock` guards
+    the loaded manifest and vectors; updates are serialised separately so
+    searches keep using the current index while a new one is embedded.
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        index_dir: Path,
+        embed: Embedder,
+        model: str = "",
+        chunk_chars: int = 800,
+        overlap: int = 100,
+        rescan_interval: float = 30.0,
+    ) -> None:
+        self.root = root
+        self.index_dir = index_dir
+        self._embed = embed
+        self.model = model
+        self.chunk_chars = chunk_chars
+        self.overlap = overlap
+        self.rescan_interval = rescan_interval
+        self.lock = threading.Lock()
+        self._updating = threading.Lock()
+        self._scanned: float | None = None
+        self._manifest: dict | None = None
+        self._vectors = array("f")
+
+    @property
+    def manifest_path(self) -> Path:
+        return self.index_dir / "manifest.json"
+
+    @property
+    def vectors_path(self) -> Path:
+        return self.index_dir / "vectors.f32"
+
+    def __len__(self) -> int:
+        with self.lock:
+            self._load()
+            return sum(len(f["chunks"]) for f in self._manifest["files"].values())
+
+    def update(self, wait: bool = True) -> dict[str, int]:
+        """Bring the index in line with the files on disk.
+
+        Returns how many files were ``embedded`` and ``removed``.  With
+        ``wait=False`` nothing is done if another update is running.
+        """
+        if not self._updating.acquire(blocking=wait):
+            return {"embedded": 0, "removed": 0}
+        try:
+            return self._update()
+        finally:
+            self._updating.release()
+
+    def _update(self) -> dict[str, int]:
+        with self.lock:
+            self._load()
+            files = self._manifest["files"]
+            dim = self._manifest["dim"]
+            old_vectors = self._vectors
+        current = self._scan()
+        self._scanned = time.monotonic()
+        changed = {
+            rel
+            for rel, stat in current.items()
+            if rel not in files
+            or [files[rel]["mtime"], files[rel]["size"]] != list(stat)
+        }
+        removed = [rel for rel in files if rel not in current]
+        if not changed and not removed:
+            return {"embedded": 0, "removed": 0}
+
+        embedded = {rel: self._embed_file(rel) for rel in sorted(changed)}
+        sizes = {len(vector) for _, vectors in embedded.values() for vector in vectors}
+        if len(sizes) > 1:
+            raise ValueError("Embeddings of different sizes")
+        if sizes and dim and sizes != {dim}:
+            # The model now returns vectors of another size; start over.
+            logger.info("Embedding size changed; rebuilding %s", self.index_dir)
+            for rel in sorted(current):
+                if rel not in embedded:
+                    embedded[rel] = self._embed_file(rel)
+            files, dim, changed = {}, 0, set(current)
+        dim = dim or (sizes.pop() if sizes else 0)
+
+        vectors = array("f")
+        kept: dict[str, dict] = {}
+        for rel, entry in files.items():
+            if rel in current and rel not in changed:
+                start = entry["row"] * dim
+                kept[rel] = dict(entry, row=len(vectors) // dim if dim else 0)
+                vectors.extend(old_vectors[start : start + len(entry["chunks"]) * dim])
+        for rel, (spans, embeddings) in embedded.items():
+            row = len(vectors) // dim if dim else 0
+            for embedding in embeddings:
+                vectors.extend(_normalize(embedding))
+            kept[rel] = {
+                "mtime": current[rel][0],
+                "size": current[rel][1],
+                "row": row,
+                "chunks": [list(span) for span in spans],
+            }
+        with self.lock:
+            self._manifest = {"model": self.model, "dim": dim, "files": kept}
+            self._vectors = vectors
+            self._save()
+        return {"embedded": len(changed), "removed": len(removed)}
+
+    def refresh(self) -> threading.Thread | None:
+        """Run :meth:`update` in a background thread.
+
+        Returns the thread, or None if an update is already running.
+        """
+        if self._updating.locked():
+            return None
+        self._scanned = time.monotonic()
+        thread = threading.Thread(target=self._refresh, daemon=True)
+        thread.start()
+        return thread
+
+    def _refresh(self) -> None:
+        try:
+            self.update(wait=False)
+        except Exception:
+            logger.exception("Updating document index in %s failed", self.index_dir)
+
+    def search(self, query: str, k: int = 4) -> list[dict[str, object]]:
+        """Return the ``k`` chunks most similar to ``query``, best first.
+
+        Searches never wait for embedding: once ``rescan_interval`` has
+        passed (and on first use) the folder is rescanned in the background
+        while the index as it stands answers, which is empty until the
+        first build has finished.
+        """
+        if (
+            self._scanned is None
+            or time.monotonic() - self._scanned >= self.rescan_interval
+        ):
+            self.refresh()
+        if not len(self):
+            return []
+        embeddings = self._embed_all([query])
+        if len(embeddings) != 1:
+            raise ValueError(f"Got {len(embeddings)} embeddings for 1 query")
+        query_vector = _normalize(embeddings[0])
+        with self.lock:
+            rows = self._rows()
+            dim = self._manifest["dim"]
+            if not rows or len(query_vector) != dim:
+                return []
+            if np is not None:
+                matrix = np.frombuffer(self._vectors, dtype=np.float32).reshape(-1, dim)
+                scores = matrix @ np.asarray(query_vector, dtype=np.float32)
+                best = [(float(scores[i]), int(i)) for i in np.argsort(-scores)[:k]]
+            else:
+                vectors = self._vectors
+                best = heapq.nlargest(
+                    k,
+                    (
+                        (
+                            sum(
+                                a * b
+                                for a, b in zip(
+                                    vectors[i * dim : (i + 1) * dim], query_vector
+                                )
+                            ),
+                            i,
+                        )
+                        for i in range(len(rows))
+                    ),
+                )
+            results = []
+            texts: dict[str, str] = {}
+            for score, index in best:
+                rel, (start, end) = rows[index]
+                if rel not in texts:
+                    texts[rel] = self._read(rel)
+                results.append(
+                    {
+                        "path": rel,
+                        "offset": start,
+                        "text": texts[rel][start:end],
+                        "score": round(score, 4),
+                    }
+                )
+            return results
+
+    def _rows(self) -> list[tuple[str, tuple[int, int]]]:
+        rows: list[tuple[str, tuple[int, int]]] = [None] * (
+            sum(len(f["chunks"]) for f in self._manifest["files"].values())
+        )
+        for rel, entry in self._manifest["files"].items():
+            for offset, span in enumerate(entry["chunks"]):
+                rows[entry["row"] + offset] = (rel, tuple(span))
+        return rows
+
+    def _embed_file(self, rel: str) -> tuple[list[tuple[int, int]], list]:
+        text = self._read(rel)
+        spans = chunk_spans(text, self.chunk_chars, self.overlap) if text else []
+        embeddings = self._embed_all([text[a:b] for a, b in spans])
+        if len(embeddings) != len(spans):
+            raise ValueError(
+                f"Got {len(embeddings)} embeddings for {len(spans)} chunks"
+            )
+        return spans, embeddings
+
+    def _embed_all(self, texts: list[str]) -> list[list[float]]:
+        vectors: list[list[float]] = []
+        for i in range(0, len(texts), EMBED_BATCH):
+            vectors.extend(self._embed(texts[i : i + EMBED_BATCH]))
+        return vectors
+
+    def _scan(self) -> dict[str, tuple[int, int]]:
+        found: dict[str, tuple[int, int]] = {}
+        if not self.root.is_dir():
+            return found
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+            for name in filenames:
+                path = Path(dirpath, name)
+                if path.suffix.lower() not in TEXT_SUFFIXES:
+                    continue
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                if stat.st_size <= MAX_FILE_BYTES:
+                    rel = path.relative_to(self.root).as_posix()
+                    found[rel] = (stat.st_mtime_ns, stat.st_size)
+        return found
+
+    def _read(self, rel: str) -> str:
+        try:
+            return (self.root / rel).read_text(encoding="utf-8", errors="replace")
+        except OSError:
+            return ""
+
+    def _load(self) -> None:
+        if self._manifest is not None:
+            return
+        empty = {"model": self.model, "dim": 0, "files": {}}
+        try:
+            manifest = json.loads(self.manifest_path.read_text(encoding="utf-8"))
+            vectors = _array("f", self.vectors_path.read_bytes())
+        except (OSError, ValueError):
+            self._manifest, self._vectors = empty, array("f")
+            return
+        rows = sum(len(f["chunks"]) for f in manifest.get("files", {}).values())
+        if manifest.get("model") != self.model or len(vectors) != rows * manifest.get(
+            "dim", 0
+        ):
+            logger.info("Rebuilding document index in %s", self.index_dir)
+            self._manifest, self._vectors = empty, array("f")
+            return
+        self._manifest, self._vectors = manifest, vectors
+
+    def _save(self) -> None:
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        tmp_vectors = self.vectors_path.with_suffix(".tmp")
+        tmp_vectors.write_bytes(_array_bytes(self._vectors))
+        os.replace(tmp_vectors, self.vectors_path)
+        tmp_manifest = self.manifest_path.with_suffix(".tmp")
+        tmp_manifest.write_text(json.dumps(self._manifest), encoding="utf-8")
+        os.replace(tmp_manifest, self.manifest_path)
+
+
+class DocumentIndexes:
+    """One :class:`DocumentIndex` per profile, created on first use."""
+
+    def __init__(
+        self,
+        root_for: Callable[[str], Path],
+        embed: Embedder,
+        model: str = "",
+        **options,
+    ) -> None:
+        self._root_for = root_for
+        self._embed = embed
+        self.model = model
+        self._options = options
+        self._indexes: dict[Path, DocumentIndex] = {}
+        self._lock = threading.Lock()
+
+    def index(self, profile: str) -> DocumentIndex:
+        root = self._root_for(profile)
+        with self._lock:
+            index = self._indexes.get(root)
+            if index is None:
+                index = self._indexes[root] = DocumentIndex(
+                    root / DOCUMENTS_DIR,
+                    root / INDEX_DIR,
+                    self._embed,
+                    self.model,
+                    **self._options,
+                )
+            return index
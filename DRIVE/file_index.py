@@ -0,0 +1,449 @@
+"""Per-user file search backed by SQLite.
+
+Each user tree gets an index at ``users/<id>/.file_index/index.sqlite3``
+holding the relative path, name, type, size and mtime of every file and
+folder, plus optionally the text of small text files.  Names (and content)
+go into an FTS5 table with the trigram tokenizer, so substring queries of
+three or more characters are answered from the index instead of a scan;
+without FTS5 the index falls back to ``LIKE`` over the names.
+
+The index is built the first time a user searches.  After that the file
+endpoints report each create, rename, delete and upload, and a background
+reconcile compares sizes and mtimes with the disk at most once per
+``reconcile_interval`` seconds to catch changes made behind the app's back.
+Hidden (dot) entries, which include the index itself, are not indexed.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+logger = logging.getLogger("server")
+
+INDEX_DIR = ".file_index"
+TEXT_SUFFIXES = frozenset(
+    {
+        ".txt",
+        ".md",
+        ".markdown",
+        ".rst",
+        ".csv",
+        ".json",
+        ".html",
+        ".htm",
+        ".xml",
+        ".py",
+        ".js",
+        ".ts",
+        ".css",
+        ".yaml",
+        ".yml",
+        ".ini",
+        ".cfg",
+        ".toml",
+        ".log",
+    }
+)
+# Larger text files are indexed by name only.
+MAX_CONTENT_BYTES = 256 * 1024
+# Rows inserted per statement while building.
+BATCH = 2000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    is_dir INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+def _fts_available() -> bool:
+    try:
+        sqlite3.connect(":memory:").execute(
+            "CREATE VIRTUAL TABLE t USING fts5(x, tokenize='trigram')"
+        )
+    except sqlite3.Error:
+        return False
+    return True
+
+
+FTS = _fts_available()
+
+
+def _quote(query: str) -> str:
+    """Return ``query`` as one FTS5 phrase (a substring for trigrams)."""
+    return '"' + query.replace('"', '""') + '"'
+
+
+def _like(query: str) -> str:
+    return (
+        "%" + query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+    )
+
+
+class FileIndex:
+    """The search index of the files below ``root``."""
+
+    def __init__(
+        self,
+        root: Path,
+        db_path: Path,
+        content: bool = False,
+        reconcile_interval: float = 300.0,
+    ) -> None:
+        self.root = root
+        self.db_path = db_path
+        self.content = content
+        self.reconcile_interval = reconcile_interval
+        self.lock = threading.RLock()
+        self._db: sqlite3.Connection | None = None
+        self._reconciled = 0.0
+        self._reconciling = False
+
+    # -- storage -------------------------------------------------------
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(self.db_path, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.executescript(_SCHEMA)
+            if FTS:
+                db.execute(
+                    "CREATE VIRTUAL TABLE IF NOT EXISTS names "
+                    "USING fts5(name, content, tokenize='trigram')"
+                )
+            self._db = db
+        return self._db
+
+    @property
+    def built(self) -> bool:
+        """Whether the index exists and was built with the current ``content`` setting."""
+        with self.lock:
+            meta = dict(self._connect().execute("SELECT key, value FROM meta"))
+        return "built" in meta and meta.get("content") == str(int(self.content))
+
+    def close(self) -> None:
+        with self.lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    # -- scanning ------------------------------------------------------
+
+    def _rel(self, path: Path) -> str:
+        return path.relative_to(self.root).as_posix()
+
+    def _walk(self, top: Path):
+        """Yield ``(rel, name, is_dir, size, mtime)`` for everything below ``top``."""
+        stack = [top]
+        while stack:
+            directory = stack.pop()
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.name.startswith("."):
+                            continue
+                        try:
+                            info = entry.stat(follow_symlinks=False)
+                            is_dir = entry.is_dir(follow_symlinks=False)
+                        except OSError:
+                            continue
+                        path = Path(entry.path)
+                        if is_dir:
+                            stack.append(path)
+                        yield (
+                            self._rel(path),
+                            entry.name,
+                            is_dir,
+                            info.st_size,
+                            info.st_mtime_ns,
+                        )
+            except OSError:
+                continue
+
+    def _text(self, rel: str, size: int) -> str:
+        if not self.content or size > MAX_CONTENT_BYTES:
+            return ""
+        if os.path.splitext(rel)[1].lower() not in TEXT_SUFFIXES:
+            return ""
+        try:
+            return (self.root / rel).read_text(encoding="utf-8", errors="replace")
+        except OSError:
+            return ""
+
+    def _upsert(self, db: sqlite3.Connection, rows) -> None:
+        for rel, name, is_dir, size, mtime in rows:
+            db.execute(
+                "INSERT INTO files (path, name, is_dir, size, mtime) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(path) DO UPDATE SET is_dir=excluded.is_dir, "
+                "size=excluded.size, mtime=excluded.mtime",
+                (rel, name, int(is_dir), size, mtime),
+            )
+            # Looked up separately: RETURNING needs SQLite 3.35.
+            (row_id,) = db.execute(
+                "SELECT id FROM files WHERE path=?", (rel,)
+            ).fetchone()
+            if FTS:
+                db.execute("DELETE FROM names WHERE rowid=?", (row_id,))
+                db.execute(
+                    "INSERT INTO names (rowid, name, content) VALUES (?, ?, ?)",
+                    (row_id, name, "" if is_dir else self._text(rel, size)),
+                )
+
+    def _delete(self, db: sqlite3.Connection, rel: str) -> None:
+        """Delete ``rel`` and, if it is a folder, everything below it."""
+        # '0' sorts right after '/', so this range is exactly the subtree.
+        where = "path = ? OR (path >= ? AND path < ?)"
+        args = (rel, rel + "/", rel + "0")
+        if FTS:
+            db.execute(
+                f"DELETE FROM names WHERE rowid IN (SELECT id FROM files WHERE {where})",
+                args,
+            )
+        db.execute(f"DELETE FROM files WHERE {where}", args)
+
+    # -- maintenance ---------------------------------------------------
+
+    def build(self) -> int:
+        """Index the whole tree from scratch; returns the number of entries."""
+        with self.lock:
+            db = self._connect()
+            count = 0
+            with db:
+                db.execute("DELETE FROM files")
+                batch = []
+                for row in self._walk(self.root):
+                    batch.append(row)
+                    if len(batch) >= BATCH:
+                        count += self._insert(db, batch)
+                        batch = []
+                count += self._insert(db, batch)
+                if FTS:
+                    # Filling the FTS table in one statement is several times
+                    # faster than going row by row.
+                    db.execute("DELETE FROM names")
+                    if self.content:
+                        rows = db.execute(
+                            "SELECT id, path, name, is_dir, size FROM files"
+                        ).fetchall()
+                        db.executemany(
+                            "INSERT INTO names (rowid, name, content) VALUES (?, ?, ?)",
+                            (
+                                (i, name, "" if is_dir else self._text(rel, size))
+                                for i, rel, name, is_dir, size in rows
+                            ),
+                        )
+                    else:
+                        db.execute(
+                            "INSERT INTO names (rowid, name, content) SELECT id, name, '' FROM files"
+                        )
+                db.execute(
+                    "INSERT OR REPLACE INTO meta VALUES ('built', ?)",
+                    (str(time.time()),),
+                )
+                db.execute(
+                    "INSERT OR REPLACE INTO meta VALUES ('content', ?)",
+                    (str(int(self.content)),),
+                )
+            self._reconciled = time.monotonic()
+            logger.info("Indexed %d entries under %s", count, self.root)
+            return count
+
+    @staticmethod
+    def _insert(db: sqlite3.Connection, rows: list[tuple]) -> int:
+        db.executemany(
+            "INSERT INTO files (path, name, is_dir, size, mtime) VALUES (?, ?, ?, ?, ?)",
+            [
+                (rel, name, int(is_dir), size, mtime)
+                for rel, name, is_dir, size, mtime in rows
+            ],
+        )
+        return len(rows)
+
+    def reconcile(self) -> dict[str, int]:
+        """Apply changes made on disk since the last build or reconcile."""
+        with self.lock:
+            db = self._connect()
+            known = {
+                path: (size, mtime)
+                for path, size, mtime in db.execute(
+                    "SELECT path, size, mtime FROM files"
+                )
+            }
+        changed = []
+        for row in self._walk(self.root):
+            if known.pop(row[0], None) != (row[3], row[4]):
+                changed.append(row)
+        with self.lock:
+            db = self._connect()
+            with db:
+                for rel in known:
+                    self._delete(db, rel)
+                self._upsert(db, changed)
+            self._reconciled = time.monotonic()
+        return {"changed": len(changed), "removed": len(known)}
+
+    def _maybe_reconcile(self) -> None:
+        with self.lock:
+            due = time.monotonic() - self._reconciled >= self.reconcile_interval
+            if not due or self._reconciling:
+                return
+            self._reconciling = True
+        threading.Thread(target=self._reconcile_in_background, daemon=True).start()
+
+    def _reconcile_in_background(self) -> None:
+        try:
+            self.reconcile()
+        except Exception:  # pragma: no cover - retried on the next search
+            logger.exception("Reconciling file index under %s failed", self.root)
+        finally:
+            with self.lock:
+                self._reconciling = False
+
+    # -- incremental updates -------------------------------------------
+
+    def note_changed(self, path: Path) -> None:
+        """Index ``path`` (and its contents, for a folder) as it is now."""
+        try:
+            rel = self._rel(path)
+            info = path.stat()
+        except (OSError, ValueError):
+            return
+        if any(part.startswith(".") for part in Path(rel).parts):
+            return
+        rows = [(rel, path.name, path.is_dir(), info.st_size, info.st_mtime_ns)]
+        with self.lock:
+            db = self._connect()
+            with db:
+                # Parents created on the way (e.g. by an upload) count too.
+                parent = path.parent
+                while parent != self.root and self.root in parent.parents:
+                    try:
+                        parent_info = parent.stat()
+                    except OSError:
+                        break
+                    rows.append(
+                        (
+                            self._rel(parent),
+                            parent.name,
+                            True,
+                            parent_info.st_size,
+                            parent_info.st_mtime_ns,
+                        )
+                    )
+                    parent = parent.parent
+                if path.is_dir():
+                    rows.extend(self._walk(path))
+                self._upsert(db, rows)
+
+    def note_removed(self, path: Path) -> None:
+        """Drop ``path`` and anything below it from the index."""
+        try:
+            rel = self._rel(path)
+        except ValueError:
+            return
+        with self.lock:
+            db = self._connect()
+            with db:
+                self._delete(db, rel)
+
+    def note_renamed(self, old: Path, new: Path) -> None:
+        self.note_removed(old)
+        self.note_changed(new)
+
+    # -- queries -------------------------------------------------------
+
+    def search(
+        self, query: str, path: str = "", limit: int = 50, content: bool = False
+    ) -> list[dict[str, object]]:
+        """Return entries whose name (or text, with ``content``) contains ``query``.
+
+        Exact and prefix name matches rank first, then shorter paths.
+        ``path`` restricts results to that folder's subtree.
+        """
+        query = query.strip()
+        if not query:
+            return []
+        if not self.built:
+            self.build()
+        else:
+            self._maybe_reconcile()
+        where, args = [], []
+        if FTS and len(query) >= 3:
+            columns = "{name content}" if content and self.content else "name"
+            where.append("f.id IN (SELECT rowid FROM names WHERE names MATCH ?)")
+            args.append(f"{columns} : {_quote(query)}")
+        else:
+            where.append("f.name LIKE ? ESCAPE '\\'")
+            args.append(_like(query))
+        path = path.strip("/")
+        if path:
+            where.append("f.path >= ? AND f.path < ?")
+            args += [path + "/", path + "0"]
+        sql = (
+            "SELECT f.path, f.name, f.is_dir, f.size, f.mtime FROM files f "
+            f"WHERE {' AND '.join(where)} "
+            "ORDER BY (f.name = ? COLLATE NOCASE) DESC, (f.name LIKE ? ESCAPE '\\') DESC, "
+            "length(f.path), f.path LIMIT ?"
+        )
+        escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        args += [query, escaped + "%", limit]
+        with self.lock:
+            rows = self._connect().execute(sql, args).fetchall()
+        return [
+            {
+                "path": rel,
+                "name": name,
+                "isDir": bool(is_dir),
+                "size": size,
+                "mtime": mtime // 1_000_000_000,
+            }
+            for rel, name, is_dir, size, mtime in rows
+        ]
+
+
+class FileIndexes:
+    """One :class:`FileIndex` per user root, opened on first use."""
+
+    def __init__(
+        self, content: bool = False, reconcile_interval: float = 300.0
+    ) -> None:
+        self.content = content
+        self.reconcile_interval = reconcile_interval
+        self._indexes: dict[Path, FileIndex] = {}
+        self._lock = threading.Lock()
+
+    def index(self, root: Path) -> FileIndex:
+        with self._lock:
+            index = self._indexes.get(root)
+            if index is None:
+                index = self._indexes[root] = FileIndex(
+                    root,
+                    root / INDEX_DIR / "index.sqlite3",
+                    self.content,
+                    self.reconcile_interval,
+                )
+            return index
+
+    def existing(self, root: Path) -> FileIndex | None:
+        """Return the index of ``root`` if one has been built, else ``None``.
+
+        File endpoints use this so that users who never search pay nothing.
+        """
+        with self._lock:
+            index = self._indexes.get(root)
+        if index is None and not (root / INDEX_DIR / "index.sqlite3").exists():
+            return None
+        return index or self.index(root)
@@ -0,0 +1,151 @@
+"""Shrink chat images before they are sent to a vision model.
+
+Clients send screenshots and photos as base64 at full resolution, while
+vision models work on a few hundred pixels per side and resize anything
+larger themselves.  :class:`ImagePreprocessor` decodes an image once,
+downscales it to the model's useful resolution and re-encodes it as JPEG.
+Results are cached by content hash, so follow-up questions about the same
+image reuse the prepared copy.  Without Pillow images are passed through
+unchanged.
+"""
+
+from __future__ import annotations
+
+import base64
+import binascii
+import hashlib
+import io
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+
+logger = logging.getLogger("server")
+
+try:  # optional dependency
+    from PIL import Image, ImageOps  # type: ignore
+except Exception:  # pragma: no cover - best effort logging
+    Image = ImageOps = None
+    logger.warning("Pillow not found; chat images will be sent unchanged")
+
+
+@dataclass
+class PreparedImage:
+    """A chat image ready for Ollama and what preparing it saved."""
+
+    data: str
+    original_bytes: int
+    bytes: int
+    width: int | None = None
+    height: int | None = None
+    cached: bool = False
+
+    def as_dict(self) -> dict[str, object]:
+        return {
+            "bytes": self.bytes,
+            "originalBytes": self.original_bytes,
+            "saved": self.original_bytes - self.bytes,
+            "width": self.width,
+            "height": self.height,
+            "cached": self.cached,
+        }
+
+
+class ImagePreprocessor:
+    """Downscale and re-encode images, caching results by content hash.
+
+    Images are fitted into ``max_side`` pixels (``max_sides`` overrides it
+    per model; 0 disables resizing) and stored as JPEG at ``quality``.  An
+    image that needs no resizing is only replaced when that makes it
+    smaller.
+    """
+
+    def __init__(
+        self,
+        max_side: int = 1024,
+        quality: int = 85,
+        cache_size: int = 64,
+        max_sides: dict[str, int] | None = None,
+    ) -> None:
+        self.max_side = max_side
+        self.quality = quality
+        self.cache_size = cache_size
+        self.max_sides = dict(max_sides or {})
+        self._cache: OrderedDict[tuple[str, int], PreparedImage] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+
+    def max_side_for(self, model: str | None) -> int:
+        return self.max_sides.get(model or "", self.max_side)
+
+    def prepare(self, image_b64: str, model: str | None = None) -> PreparedImage:
+        """Return the prepared form of a base64 image.
+
+        Raises :class:`ValueError` if ``image_b64`` is not valid base64 or,
+        with Pillow installed, not a readable image.
+        """
+        if image_b64.startswith("data:"):
+            # Accept data URLs as produced by FileReader.readAsDataURL.
+            image_b64 = image_b64.partition(",")[2]
+        try:
+            raw = base64.b64decode(image_b64, validate=True)
+        except (binascii.Error, ValueError) as exc:
+            raise ValueError("image is not valid base64") from exc
+        max_side = self.max_side_for(model)
+        key = (hashlib.sha256(raw).hexdigest(), max_side)
+        with self._lock:
+            prepared = self._cache.get(key)
+            if prepared is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                self.bytes_saved += prepared.original_bytes - prepared.bytes
+                return replace(prepared, cached=True)
+            self.misses += 1
+        prepared = self._process(raw, image_b64, max_side)
+        with self._lock:
+            self.bytes_saved += prepared.original_bytes - prepared.bytes
+            if self.cache_size > 0:
+                self._cache[key] = prepared
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return prepared
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._cache),
+                "hits": self.hits,
+                "misses": self.misses,
+                "bytesSaved": self.bytes_saved,
+            }
+
+    def _process(self, raw: bytes, image_b64: str, max_side: int) -> PreparedImage:
+        size = len(image_b64)
+        if Image is None:
+            return PreparedImage(image_b64, size, size)
+        try:
+            with Image.open(io.BytesIO(raw)) as img:
+                img = ImageOps.exif_transpose(img)
+                original_size = img.size
+                resized = bool(max_side) and max(img.size) > max_side
+                if resized:
+                    img.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+                if img.mode in ("RGBA", "LA", "P"):
+                    # JPEG has no alpha; flatten onto white like a browser would.
+                    img = img.convert("RGBA")
+                    background = Image.new("RGB", img.size, (255, 255, 255))
+                    background.paste(img, mask=img.getchannel("A"))
+                    img = background
+                elif img.mode != "RGB":
+                    img = img.convert("RGB")
+                out = io.BytesIO()
+                img.save(out, format="JPEG", quality=self.quality, optimize=True)
+                width, height = img.size
+        except (OSError, ValueError, Image.DecompressionBombError) as exc:
+            raise ValueError("image could not be decoded") from exc
+        data = base64.b64encode(out.getvalue()).decode("ascii")
+        if not resized and len(data) >= size:
+            return PreparedImage(image_b64, size, size, *original_size)
+        return PreparedImage(data, size, len(data), width, height)
@@ -0,0 +1,82 @@
+"""Cached view of the models installed in Ollama.
+
+Listing models costs an HTTP round-trip to Ollama, and the chat endpoints
+need the list on almost every request.  :class:`ModelCatalog` keeps the last
+result for ``ttl`` seconds.  Once an entry is stale it is still returned
+immediately while a background thread fetches a fresh copy
+(stale-while-revalidate), so only the very first lookup waits on Ollama.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Callable
+
+logger = logging.getLogger("server")
+
+Fetcher = Callable[[], tuple[list[str], str | None]]
+
+
+class ModelCatalog:
+    """TTL cache around a ``fetch`` callable returning ``(models, error)``."""
+
+    def __init__(
+        self, fetch: Fetcher, ttl: float = 30.0, error_ttl: float = 5.0
+    ) -> None:
+        self._fetch = fetch
+        self.ttl = ttl
+        self.error_ttl = error_ttl
+        self._lock = threading.Lock()
+        self._models: list[str] = []
+        self._error: str | None = None
+        self._loaded = False
+        self._expires = 0.0
+        self._refreshing = False
+
+    def get(self) -> tuple[list[str], str | None]:
+        """Return the cached ``(models, error)`` pair.
+
+        The first call fetches synchronously.  Later calls never block: a
+        stale entry is returned as-is and refreshed in the background.
+        """
+        with self._lock:
+            loaded = self._loaded
+            fresh = time.monotonic() < self._expires
+            if loaded and not fresh and not self._refreshing:
+                self._refreshing = True
+                threading.Thread(target=self._refresh_background, daemon=True).start()
+            if loaded:
+                return list(self._models), self._error
+        return self.refresh()
+
+    def refresh(self) -> tuple[list[str], str | None]:
+        """Fetch the model list now and store the result."""
+        models, error = self._fetch()
+        with self._lock:
+            self._store(models, error)
+            return list(self._models), self._error
+
+    def invalidate(self) -> None:
+        """Drop the cached entry so the next :meth:`get` fetches again."""
+        with self._lock:
+            self._loaded = False
+            self._expires = 0.0
+
+    def _store(self, models: list[str], error: str | None) -> None:
+        self._models = list(models)
+        self._error = error
+        self._loaded = True
+        self._expires = time.monotonic() + (self.ttl if models else self.error_ttl)
+
+    def _refresh_background(self) -> None:
+        try:
+            models, error = self._fetch()
+            with self._lock:
+                self._store(models, error)
+        except Exception:  # pragma: no cover - fetch is expected to handle errors
+            logger.exception("Background model refresh failed")
+        finally:
+            with self._lock:
+                self._refreshing = False
@@ -0,0 +1,154 @@
+"""Keep the models people chat with resident in Ollama.
+
+Ollama unloads a model after its ``keep_alive`` expires, and the next
+request then pays the full load time.  :class:`ModelResidency` preloads the
+configured default models, chooses the ``keep_alive`` sent for each model
+and tracks which models are loaded according to Ollama's ``/api/ps``, so the
+UI can prefer one that answers without a cold start.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Callable
+
+logger = logging.getLogger("server")
+
+RunningFetcher = Callable[[], list[dict]]
+Loader = Callable[[str, str | None], object]
+
+
+class ModelResidency:
+    """Load state and ``keep_alive`` policy for Ollama models.
+
+    ``fetch_running()`` returns the entries of ``/api/ps`` and
+    ``load(model, keep_alive)`` asks Ollama to load a model.  ``keep_alive``
+    maps model names to durations; other models use ``default_keep_alive``
+    (``None`` leaves Ollama's own default).  ``/api/ps`` results are cached
+    for ``ttl`` seconds; like :class:`~.model_catalog.ModelCatalog`, a stale
+    result is still served while a background thread fetches a fresh one.
+    """
+
+    def __init__(
+        self,
+        fetch_running: RunningFetcher,
+        load: Loader,
+        keep_alive: dict[str, str] | None = None,
+        default_keep_alive: str | None = None,
+        ttl: float = 5.0,
+    ) -> None:
+        self._fetch_running = fetch_running
+        self._load = load
+        self.keep_alive = dict(keep_alive or {})
+        self.default_keep_alive = default_keep_alive or None
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._running: dict[str, dict] = {}
+        self._error: str | None = None
+        self._expires = 0.0
+        self._fetched = False
+        self._refreshing = False
+        self._loading: set[str] = set()
+
+    def keep_alive_for(self, model: str) -> str | None:
+        return self.keep_alive.get(model, self.default_keep_alive)
+
+    def running(self, refresh: bool = False) -> dict[str, dict]:
+        """Return the loaded models keyed by name.
+
+        Only the first call and ``refresh=True`` wait for ``/api/ps``; later
+        calls return the last known state and refresh it in the background
+        once it is older than ``ttl``.
+        """
+        with self._lock:
+            if self._fetched and not refresh:
+                if time.monotonic() >= self._expires and not self._refreshing:
+                    self._refreshing = True
+                    threading.Thread(
+                        target=self._refresh_background, daemon=True
+                    ).start()
+                return dict(self._running)
+        return self._refresh()
+
+    def _refresh(self) -> dict[str, dict]:
+        try:
+            entries = self._fetch_running()
+            error = None
+        except Exception as exc:
+            entries, error = None, str(exc)
+        with self._lock:
+            if entries is not None:
+                self._running = {e["name"]: e for e in entries if e.get("name")}
+            self._error = error
+            self._fetched = True
+            self._expires = time.monotonic() + self.ttl
+            return dict(self._running)
+
+    def _refresh_background(self) -> None:
+        try:
+            self._refresh()
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def state(self, model: str) -> str:
+        """Return ``loaded``, ``loading`` or ``unloaded`` for ``model``."""
+        running = self.running()
+        with self._lock:
+            if model in self._loading:
+                return "loading"
+        return "loaded" if model in running else "unloaded"
+
+    def mark_loaded(self, model: str) -> None:
+        """Record that ``model`` just answered, so it is resident now."""
+        with self._lock:
+            self._running.setdefault(model, {"name": model})
+
+    def warm(self, models: list[str]) -> threading.Thread | None:
+        """Load ``models`` one after another in a background thread."""
+        with self._lock:
+            pending = [m for m in models if m not in self._loading]
+            self._loading.update(pending)
+        if not pending:
+            return None
+        thread = threading.Thread(target=self._warm, args=(pending,), daemon=True)
+        thread.start()
+        return thread
+
+    def snapshot(self, refresh: bool = False) -> dict[str, object]:
+        """Return the load state of every known model for the API."""
+        running = self.running(refresh)
+        with self._lock:
+            models = {
+                name: {
+                    "state": "loaded",
+                    "expiresAt": entry.get("expires_at"),
+                    "sizeVram": entry.get("size_vram"),
+                    "keepAlive": self.keep_alive_for(name),
+                }
+                for name, entry in running.items()
+            }
+            for name in self._loading:
+                models[name] = {
+                    "state": "loading",
+                    "keepAlive": self.keep_alive_for(name),
+                }
+            return {"models": models, "error": self._error}
+
+    def _warm(self, models: list[str]) -> None:
+        for model in models:
+            started = time.monotonic()
+            try:
+                self._load(model, self.keep_alive_for(model))
+                logger.info("Warmed %s in %.1fs", model, time.monotonic() - started)
+                self.mark_loaded(model)
+            except Exception as exc:
+                logger.warning("Warming %s failed: %s", model, exc)
+            finally:
+                with self._lock:
+                    self._loading.discard(model)
+        # Pick up expiry times for the models just loaded.
+        with self._lock:
+            self._expires = 0.0
@@ -1,81 +1,308 @@
-import requests
 import json
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ReadTimeoutError
+from urllib3.util.retry import Retry
+
+
+class OllamaError(RuntimeError):
+    """Raised when Ollama rejects a request or cannot be reached."""
+
+
+class OllamaConnectionError(OllamaError):
+    """Raised when no connection to Ollama could be established."""
+
+
+class OllamaTimeout(OllamaError):
+    """Raised when Ollama did not answer within the read timeout."""
+
+
+class OllamaCancelled(OllamaError):
+    """Raised when a generation was stopped through its :class:`CancelToken`."""
+
+
+class CancelToken:
+    """Cancellation flag shared by a generation and whoever may stop it.
+
+    Streams check the flag before every chunk they hand out, so a cancelled
+    generation stops at the next token and its upstream connection is
+    closed, which makes Ollama abandon the request.
+    """
+
+    def __init__(self) -> None:
+        self._event = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self) -> None:
+        self._event.set()
+
+    def check(self) -> None:
+        if self._event.is_set():
+            raise OllamaCancelled("Generation cancelled")
+
+
+class _ResetRetry(Retry):
+    """Retry connection failures and resets, but never a read timeout.
+
+    A read timeout means Ollama is busy generating; retrying would only
+    multiply the time the caller waits.
+    """
+
+    def increment(
+        self,
+        method=None,
+        url=None,
+        response=None,
+        error=None,
+        _pool=None,
+        _stacktrace=None,
+    ):
+        if isinstance(error, ReadTimeoutError):
+            raise error
+        return super().increment(method, url, response, error, _pool, _stacktrace)
+
+
+def _wrap(exc: requests.RequestException) -> OllamaError:
+    if isinstance(exc, requests.ConnectionError):
+        return OllamaConnectionError(str(exc))
+    if isinstance(exc, requests.Timeout):
+        return OllamaTimeout(str(exc))
+    return OllamaError(str(exc))
 
 
 class OllamaClient:
-    """Simple wrapper around the Ollama HTTP API."""
+    """Simple wrapper around the Ollama HTTP API.
 
-    def __init__(self, base_url: str = "http://localhost:11434") -> None:
+    All requests go through a single pooled :class:`HTTPAdapter`, so
+    connections to Ollama are kept alive and reused between calls.  Each
+    thread gets its own :class:`requests.Session` mounted on that adapter,
+    which keeps the client safe to share across Flask worker threads.
+    """
+
+    def __init__(
+        self,
+        base_url: str = "http://localhost:11434",
+        pool_size: int = 10,
+        connect_timeout: float = 3.0,
+        read_timeout: float = 60.0,
+        retries: int = 2,
+        backoff: float = 0.2,
+    ) -> None:
         self.base_url = base_url.rstrip("/")
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        retry = _ResetRetry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            status=0,
+            other=0,
+            backoff_factor=backoff,
+            allowed_methods=frozenset({"GET", "POST"}),
+            raise_on_status=False,
+        )
+        self._adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=max(1, pool_size),
+            pool_block=False,
+            max_retries=retry,
+        )
+        self._local = threading.local()
+
+    @property
+    def session(self) -> requests.Session:
+        """Return the calling thread's session on the shared pool."""
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            session.mount("http://", self._adapter)
+            session.mount("https://", self._adapter)
+            self._local.session = session
+        return session
+
+    def close(self) -> None:
+        """Close all pooled connections."""
+        self._adapter.close()
+
+    def _check(self, resp: requests.Response) -> None:
+        if resp.status_code != 200:
+            message = resp.text or f"Ollama returned status {resp.status_code}"
+            raise OllamaError(message)
 
     def list_models(self) -> list[str]:
         """Return a list of available model names."""
         url = f"{self.base_url}/api/tags"
         try:
-            resp = requests.get(url, timeout=5)
-            resp.raise_for_status()
+            resp = self.session.get(url, timeout=(self.connect_timeout, 5))
+            self._check(resp)
             data = resp.json()
-        except requests.RequestException as exc:  # pragma: no cover - network
-            raise RuntimeError(str(exc)) from exc
+        except requests.RequestException as exc:
+            raise _wrap(exc) from exc
         models = [m.get("name") for m in data.get("models", []) if m.get("name")]
         return models
 
+    def running_models(self) -> list[dict]:
+        """Return the models Ollama currently holds in memory (``/api/ps``)."""
+        url = f"{self.base_url}/api/ps"
+        try:
+            resp = self.session.get(url, timeout=(self.connect_timeout, 5))
+            self._check(resp)
+            data = resp.json()
+        except requests.RequestException as exc:
+            raise _wrap(exc) from exc
+        return list(data.get("models", []))
+
+    def load_model(self, model: str, keep_alive: str | None = None) -> dict:
+        """Load ``model`` into memory without generating anything."""
+        payload: dict[str, object] = {"model": model, "stream": False}
+        if keep_alive:
+            payload["keep_alive"] = keep_alive
+        return self._post(f"{self.base_url}/api/generate", payload)
+
+    def _post(self, url: str, payload: dict[str, object]) -> dict:
+        try:
+            r = self.session.post(
+                url, json=payload, timeout=(self.connect_timeout, self.read_timeout)
+            )
+            self._check(r)
+            return r.json()
+        except requests.RequestException as exc:
+            raise _wrap(exc) from exc
+
+    def _stream(
+        self, url: str, payload: dict[str, object], cancel: CancelToken | None = None
+    ):
+        """Yield newline delimited JSON strings from a streaming endpoint.
+
+        Closing the generator, or cancelling ``cancel``, closes the upstream
+        response, which makes Ollama stop generating.
+        """
+        try:
+            with self.session.post(
+                url,
+                json=payload,
+                stream=True,
+                timeout=(self.connect_timeout, self.read_timeout),
+            ) as r:
+                self._check(r)
+                for line in r.iter_lines(decode_unicode=True):
+                    if cancel is not None:
+                        cancel.check()
+                    if line:
+                        yield line
+        except requests.RequestException as exc:
+            raise _wrap(exc) from exc
+
+    def _collect(
+        self, url: str, payload: dict[str, object], cancel: CancelToken
+    ) -> dict:
+        """Read a streamed reply and merge it into one response object.
+
+        Used for non-streaming calls that must stay cancellable: Ollama only
+        answers a ``"stream": false`` request once generation is complete.
+        """
+        parts: list[str] = []
+        final: dict = {}
+        lines = self._stream(url, dict(payload, stream=True), cancel)
+        try:
+            for line in lines:
+                chunk = json.loads(line)
+                if chunk.get("error"):
+                    raise OllamaError(chunk["error"])
+                if "message" in chunk:
+                    parts.append((chunk["message"] or {}).get("content", ""))
+                else:
+                    parts.append(chunk.get("response", ""))
+                if chunk.get("done"):
+                    final = chunk
+                    break
+        finally:
+            lines.close()
+        text = "".join(parts)
+        if "message" in final:
+            final["message"] = dict(final["message"] or {}, content=text)
+        else:
+            final["response"] = text
+        return final
+
     def generate(
         self,
         model: str,
         prompt: str,
         images: list[str] | None = None,
         stream: bool = False,
+        context: list[int] | None = None,
+        keep_alive: str | None = None,
+        cancel: CancelToken | None = None,
     ):
         """Generate text from a prompt.
 
         If ``stream`` is True this returns an iterator yielding newline
-        delimited JSON strings as produced by Ollama.
+        delimited JSON strings as produced by Ollama.  ``context`` is the
+        token array returned by a previous call; passing it back lets Ollama
+        continue from its cached state instead of re-reading the prompt.
+        With ``cancel`` the generation raises :class:`OllamaCancelled` once
+        the token is cancelled.
         """
         url = f"{self.base_url}/api/generate"
         payload: dict[str, object] = {"model": model, "prompt": prompt, "stream": stream}
         if images:
             payload["images"] = images
-        try:
-            if stream:
-                with requests.post(url, json=payload, stream=True, timeout=60) as r:
-                    r.raise_for_status()
-                    for line in r.iter_lines(decode_unicode=True):
-                        if line:
-                            yield line
-            else:
-                r = requests.post(url, json=payload, timeout=60)
-                r.raise_for_status()
-                return r.json()
-        except requests.RequestException as exc:  # pragma: no cover - network
-            raise RuntimeError(str(exc)) from exc
-
-    def chat(self, model: str, messages: list[dict[str, str]], stream: bool = False):
+        if context:
+            payload["context"] = context
+        if keep_alive:
+            payload["keep_alive"] = keep_alive
+        return self._send(url, payload, stream, cancel)
+
+    def chat(
+        self,
+        model: str,
+        messages: list[dict[str, str]],
+        stream: bool = False,
+        keep_alive: str | None = None,
+        cancel: CancelToken | None = None,
+    ):
         """Send a chat conversation to Ollama.
 
         ``messages`` should be a list of dicts with ``role`` and ``content``.
+        ``stream`` and ``cancel`` behave as for :meth:`generate`.
         """
         url = f"{self.base_url}/api/chat"
         payload: dict[str, object] = {"model": model, "messages": messages, "stream": stream}
-        try:
-            if stream:
-                with requests.post(url, json=payload, stream=True, timeout=60) as r:
-                    r.raise_for_status()
-                    for line in r.iter_lines(decode_unicode=True):
-                        if line:
-                            yield line
-            else:
-                r = requests.post(url, json=payload, timeout=60)
-                r.raise_for_status()
-                return r.json()
-        except requests.RequestException as exc:  # pragma: no cover - network
-            raise RuntimeError(str(exc)) from exc
+        if keep_alive:
+            payload["keep_alive"] = keep_alive
+        return self._send(url, payload, stream, cancel)
+
+    def _send(
+        self,
+        url: str,
+        payload: dict[str, object],
+        stream: bool,
+        cancel: CancelToken | None,
+    ):
+        if stream:
+            return self._stream(url, payload, cancel)
+        if cancel is not None:
+            return self._collect(url, payload, cancel)
+        return self._post(url, payload)
+
+    def embed(self, model: str, texts: list[str]) -> list[list[float]]:
+        """Return one embedding vector per text (``/api/embed``)."""
+        result = self._post(
+            f"{self.base_url}/api/embed", {"model": model, "input": texts}
+        )
+        return result.get("embeddings", [])
 
     def is_running(self) -> bool:
         """Return True if the Ollama server is responsive."""
         url = f"{self.base_url}/api/tags"
         try:
-            resp = requests.get(url, timeout=2)
+            resp = self.session.get(url, timeout=(self.connect_timeout, 2))
             resp.raise_for_status()
             return True
         except requests.RequestException:  # pragma: no cover - network
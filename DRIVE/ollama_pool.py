@@ -0,0 +1,274 @@
+"""Spread Ollama traffic over several servers.
+
+:class:`OllamaPool` offers the same methods as
+:class:`~DRIVE.ollama_client.OllamaClient` but holds one client per backend.
+A background thread checks every backend's health and installed models;
+each request goes to the healthy backend with the fewest requests in flight
+that has the model, and moves on to the next one if the backend cannot be
+reached.  Streams fail over only before their first chunk, because the
+tokens already sent cannot be taken back.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Callable, Iterator
+
+from .ollama_client import OllamaClient, OllamaConnectionError
+
+logger = logging.getLogger("server")
+
+
+class Backend:
+    """Health, inventory and load of one Ollama server."""
+
+    def __init__(self, client: OllamaClient) -> None:
+        self.client = client
+        self.healthy = True
+        self.models: set[str] = set()
+        self.active = 0
+        self.failures = 0
+        self.checked: float | None = None
+
+    @property
+    def url(self) -> str:
+        return self.client.base_url
+
+    def as_dict(self) -> dict[str, object]:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "models": sorted(self.models),
+            "active": self.active,
+            "failures": self.failures,
+            "checked": self.checked,
+        }
+
+
+class _PooledStream:
+    """A backend's stream that frees the backend once closed or exhausted."""
+
+    def __init__(
+        self, pool: OllamaPool, backend: Backend, stream, first: str | None
+    ) -> None:
+        self._pool = pool
+        self._backend = backend
+        self._stream = stream
+        self._first = first
+        self._closed = False
+
+    def __iter__(self) -> _PooledStream:
+        return self
+
+    def __next__(self) -> str:
+        if self._first is not None:
+            line, self._first = self._first, None
+            return line
+        try:
+            return next(self._stream)
+        except StopIteration:
+            self.close()
+            raise
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._stream.close()
+        self._pool._release(self._backend)
+
+
+class OllamaPool:
+    """Least-loaded routing with failover across Ollama backends.
+
+    Backends are checked every ``interval`` seconds once :meth:`start` has
+    been called, and on demand when a request finds the inventory stale.
+    """
+
+    def __init__(self, clients: list[OllamaClient], interval: float = 15.0) -> None:
+        if not clients:
+            raise ValueError("OllamaPool needs at least one backend")
+        self.backends = [Backend(client) for client in clients]
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def base_url(self) -> str:
+        return self.backends[0].url
+
+    # -- health checks -------------------------------------------------
+
+    def check(self) -> None:
+        """Refresh the health and model list of every backend."""
+        for backend in self.backends:
+            healthy = backend.client.is_running()
+            models = backend.models
+            if healthy:
+                try:
+                    models = set(backend.client.list_models())
+                except Exception as exc:
+                    logger.warning("Listing models on %s failed: %s", backend.url, exc)
+                    healthy = False
+            with self._lock:
+                if healthy != backend.healthy:
+                    logger.info(
+                        "Ollama backend %s is %s",
+                        backend.url,
+                        "up" if healthy else "down",
+                    )
+                backend.healthy = healthy
+                backend.models = models
+                backend.checked = time.time()
+
+    def start(self) -> None:
+        """Run :meth:`check` periodically in a daemon thread."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def close(self) -> None:
+        self._stop.set()
+        for backend in self.backends:
+            backend.client.close()
+
+    def stats(self) -> list[dict[str, object]]:
+        with self._lock:
+            return [backend.as_dict() for backend in self.backends]
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.check()
+            except Exception:  # pragma: no cover - checks handle their own errors
+                logger.exception("Ollama backend check failed")
+            self._stop.wait(self.interval)
+
+    # -- routing -------------------------------------------------------
+
+    def candidates(self, model: str | None = None) -> list[Backend]:
+        """Return backends in the order a request for ``model`` tries them.
+
+        Healthy backends that have the model come first, least loaded
+        first; then other healthy backends, then unhealthy ones so that a
+        recovered server is found even before the next check.
+        """
+        if self.backends[0].checked is None:
+            self.check()
+        with self._lock:
+
+            def rank(item: tuple[int, Backend]) -> tuple[int, int, int]:
+                index, backend = item
+                if not backend.healthy:
+                    tier = 2
+                elif model is None or model in backend.models:
+                    tier = 0
+                else:
+                    tier = 1
+                return (tier, backend.active, index)
+
+            return [
+                backend for _, backend in sorted(enumerate(self.backends), key=rank)
+            ]
+
+    def _mark_failed(self, backend: Backend, exc: Exception) -> None:
+        logger.warning("Ollama backend %s failed: %s", backend.url, exc)
+        with self._lock:
+            backend.healthy = False
+            backend.failures += 1
+
+    def _acquire(self, backend: Backend) -> None:
+        with self._lock:
+            backend.active += 1
+
+    def _release(self, backend: Backend) -> None:
+        with self._lock:
+            backend.active -= 1
+
+    def _call(self, model: str | None, call: Callable[[OllamaClient], object]):
+        error: Exception | None = None
+        for backend in self.candidates(model):
+            self._acquire(backend)
+            try:
+                return call(backend.client)
+            except OllamaConnectionError as exc:
+                self._mark_failed(backend, exc)
+                error = exc
+            finally:
+                self._release(backend)
+        raise error or OllamaConnectionError("No Ollama backend available")
+
+    def _call_stream(self, model: str, call: Callable[[OllamaClient], Iterator[str]]):
+        for backend in self.candidates(model):
+            self._acquire(backend)
+            try:
+                stream = call(backend.client)
+                first = next(stream, None)
+            except OllamaConnectionError as exc:
+                self._release(backend)
+                self._mark_failed(backend, exc)
+                continue
+            except BaseException:
+                self._release(backend)
+                raise
+            return _PooledStream(self, backend, stream, first)
+        raise OllamaConnectionError("No Ollama backend available")
+
+    # -- OllamaClient interface ------------------------------------------
+
+    def list_models(self) -> list[str]:
+        """Return the models installed on any reachable backend."""
+        self.check()
+        with self._lock:
+            if not any(backend.healthy for backend in self.backends):
+                raise OllamaConnectionError("No Ollama backend is reachable")
+            models = set().union(*(b.models for b in self.backends if b.healthy))
+        return sorted(models)
+
+    def running_models(self) -> list[dict]:
+        """Return the loaded models of every reachable backend."""
+        entries: list[dict] = []
+        reached = False
+        for backend in self.backends:
+            try:
+                running = backend.client.running_models()
+            except OllamaConnectionError:
+                continue
+            reached = True
+            entries.extend(dict(entry, backend=backend.url) for entry in running)
+        if not reached:
+            raise OllamaConnectionError("No Ollama backend is reachable")
+        return entries
+
+    def load_model(self, model: str, keep_alive: str | None = None) -> dict:
+        return self._call(model, lambda client: client.load_model(model, keep_alive))
+
+    def generate(self, model: str, prompt: str, stream: bool = False, **kwargs):
+        if stream:
+            return self._call_stream(
+                model,
+                lambda client: client.generate(model, prompt, stream=True, **kwargs),
+            )
+        return self._call(
+            model, lambda client: client.generate(model, prompt, **kwargs)
+        )
+
+    def chat(
+        self, model: str, messages: list[dict[str, str]], stream: bool = False, **kwargs
+    ):
+        if stream:
+            return self._call_stream(
+                model,
+                lambda client: client.chat(model, messages, stream=True, **kwargs),
+            )
+        return self._call(model, lambda client: client.chat(model, messages, **kwargs))
+
+    def embed(self, model: str, texts: list[str]) -> list[list[float]]:
+        return self._call(model, lambda client: client.embed(model, texts))
+
+    def is_running(self) -> bool:
+        return any(backend.client.is_running() for backend in self.backends)
@@ -0,0 +1,119 @@
+"""Shared, versioned snapshots of the host's process table.
+
+Walking every process with psutil is expensive, so :class:`ProcessTable`
+does it at most once per ``interval`` no matter how many windows poll, and
+asks psutil only for the few attributes the Processes app shows.  Each walk
+that changes anything gets a new version.  Responses are columnar (one list
+per attribute) and a client that already holds version ``n`` can ask for
+the rows ``added``, ``changed`` and ``removed`` since then, so a quiet
+system costs a few bytes per poll.  The last ``keep`` versions are kept
+for diffing; older ``since`` values get a full table.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+
+try:  # optional dependency
+    import psutil  # type: ignore
+except Exception:  # pragma: no cover - the table reports itself unavailable
+    psutil = None
+
+# Response columns; ``pid`` first.  ``rss`` is in KiB, ``cpu`` in percent.
+COLUMNS = ("pid", "name", "user", "status", "cpu", "rss", "started")
+_ATTRS = [
+    "pid",
+    "name",
+    "username",
+    "status",
+    "cpu_percent",
+    "memory_info",
+    "create_time",
+]
+
+Row = tuple
+
+
+def _row(info: dict) -> Row:
+    memory = info.get("memory_info")
+    return (
+        info["pid"],
+        info.get("name") or "",
+        info.get("username") or "",
+        info.get("status") or "",
+        round(info.get("cpu_percent") or 0.0, 1),
+        memory.rss // 1024 if memory else 0,
+        round(info.get("create_time") or 0.0),
+    )
+
+
+def _columns(rows: list[Row]) -> dict[str, list]:
+    return {name: [row[i] for row in rows] for i, name in enumerate(COLUMNS)}
+
+
+class ProcessTable:
+    """Process snapshots refreshed at most once per ``interval`` seconds."""
+
+    def __init__(self, interval: float = 2.0, keep: int = 30) -> None:
+        self.interval = interval
+        self.keep = keep
+        self.version = 0
+        self.walks = 0
+        self._rows: dict[int, Row] = {}
+        self._history: OrderedDict[int, dict[int, Row]] = OrderedDict()
+        self._taken = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        return psutil is not None
+
+    def refresh(self, force: bool = False) -> int:
+        """Walk the process table if the snapshot is stale; return the version."""
+        with self._lock:
+            if (
+                not force
+                and self.walks
+                and time.monotonic() - self._taken < self.interval
+            ):
+                return self.version
+            rows = {}
+            for proc in psutil.process_iter(_ATTRS, ad_value=None):
+                row = _row(proc.info)
+                rows[row[0]] = row
+            self._taken = time.monotonic()
+            self.walks += 1
+            if rows != self._rows or not self.version:
+                self.version += 1
+                self._rows = rows
+                self._history[self.version] = rows
+                while len(self._history) > self.keep:
+                    self._history.popitem(last=False)
+            return self.version
+
+    def snapshot(self, since: int | None = None) -> dict[str, object]:
+        """Return the table, or only what changed after version ``since``."""
+        self.refresh()
+        with self._lock:
+            version, rows = self.version, self._rows
+            previous = self._history.get(since) if since is not None else None
+        result: dict[str, object] = {"version": version, "columns": list(COLUMNS)}
+        if previous is None:
+            ordered = sorted(rows.values())
+            result.update(full=True, rows=_columns(ordered))
+            return result
+        added = [row for pid, row in rows.items() if pid not in previous]
+        changed = [
+            row for pid, row in rows.items() if pid in previous and previous[pid] != row
+        ]
+        removed = [pid for pid in previous if pid not in rows]
+        result.update(
+            full=False,
+            since=since,
+            added=_columns(sorted(added)),
+            changed=_columns(sorted(changed)),
+            removed=sorted(removed),
+        )
+        return result
@@ -0,0 +1,159 @@
+"""LRU cache and request coalescing for generated replies.
+
+Canned actions ("summarize", "explain") and retries after a timeout often
+send exactly the same input.  :class:`ResponseCache` remembers Ollama's
+answer for a key derived from the model, the normalised prompt, the
+conversation context and any images, evicting by size (LRU) and age (TTL).
+Concurrent misses for the same key are coalesced: one caller generates and
+the others wait for its result instead of starting their own generation.
+Coalescing works even with ``max_entries=0``, which only turns off storage.
+A waiter gives up with :class:`TimeoutError` after ``wait_timeout`` seconds
+so a stuck leader cannot hold every duplicate request forever.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Collapse runs of whitespace so trivial edits still share a key."""
+    return " ".join(prompt.split())
+
+
+def make_key(
+    model: str, prompt: str, context: object = None, images: list[str] | None = None
+) -> str:
+    """Return a stable cache key for one generation request."""
+    digest = hashlib.sha256()
+    digest.update(json.dumps([model, normalize_prompt(prompt)]).encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(
+        json.dumps(context, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    )
+    for image in images or []:
+        digest.update(b"\0")
+        digest.update(hashlib.sha256(image.encode("ascii", errors="ignore")).digest())
+    return digest.hexdigest()
+
+
+class _Flight:
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.value: dict | None = None
+        self.error: BaseException | None = None
+
+
+class ResponseCache:
+    """Size and TTL bounded LRU cache with single-flight computation."""
+
+    def __init__(
+        self,
+        max_entries: int = 128,
+        ttl: float = 300.0,
+        wait_timeout: float | None = None,
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.wait_timeout = wait_timeout
+        self._entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._flights: dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def get(self, key: str) -> dict | None:
+        with self._lock:
+            value = self._lookup(key)
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return value
+
+    def put(self, key: str, value: dict) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, key: str, compute: Callable[[], dict]) -> tuple[dict, str]:
+        """Return ``(value, status)`` with status ``hit``, ``miss`` or ``coalesced``.
+
+        Exceptions raised by ``compute`` propagate to every waiting caller;
+        a waiter still without a result after ``wait_timeout`` seconds gets
+        :class:`TimeoutError`.
+        """
+        with self._lock:
+            value = self._lookup(key)
+            if value is not None:
+                self.hits += 1
+                return value, "hit"
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            if not flight.done.wait(self.wait_timeout):
+                raise TimeoutError("Timed out waiting for an identical request")
+            if flight.error is not None:
+                raise flight.error
+            return flight.value, "coalesced"
+        try:
+            flight.value = compute()
+            self.put(key, flight.value)
+            return flight.value, "miss"
+        except BaseException as exc:
+            flight.error = exc
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict[str, int | float]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "maxEntries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "inFlight": len(self._flights),
+            }
+
+    def _lookup(self, key: str) -> dict | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires <= time.monotonic():
+            del self._entries[key]
+            self.evictions += 1
+            return None
+        self._entries.move_to_end(key)
+        return value
@@ -0,0 +1,223 @@
+"""Admission control for generation requests.
+
+Ollama serves only a few generations per model at a time and silently
+queues the rest, so without a limit every chat holds a worker thread until
+the upstream timeout fires.  :class:`ModelScheduler` bounds concurrency per
+model, parks extra requests in a bounded priority queue (FIFO for equal
+priorities) and rejects immediately once that queue is full.  Waiting
+clients can ask for their position, and wait/generation times are recorded
+per model.
+"""
+
+from __future__ import annotations
+
+import heapq
+import itertools
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+
+class QueueFull(Exception):
+    """Raised when a model's wait queue is at its maximum depth."""
+
+
+class QueueTimeout(Exception):
+    """Raised when a request gave up waiting for a model slot."""
+
+
+class Ticket:
+    """A request's place in a model's queue."""
+
+    def __init__(self, model: str, ticket_id: str, priority: int, seq: int) -> None:
+        self.model = model
+        self.id = ticket_id
+        self.priority = priority
+        self.seq = seq
+        self.enqueued = time.monotonic()
+        self.started: float | None = None
+        self.released = False
+        self.cancelled = False
+
+    @property
+    def sort_key(self) -> tuple[int, int]:
+        return (-self.priority, self.seq)
+
+
+class _Timing:
+    __slots__ = ("count", "total", "max")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def as_dict(self) -> dict[str, float]:
+        avg = self.total / self.count if self.count else 0.0
+        return {"count": self.count, "avg": round(avg, 3), "max": round(self.max, 3)}
+
+
+class _ModelState:
+    def __init__(self) -> None:
+        self.active = 0
+        self.waiting: list[tuple[tuple[int, int], Ticket]] = []
+        self.wait = _Timing()
+        self.generation = _Timing()
+        self.rejected = 0
+        self.timed_out = 0
+
+
+class ModelScheduler:
+    """Bounded per-model concurrency with a bounded wait queue.
+
+    ``max_concurrent`` generations run per model (``limits`` overrides it for
+    individual models) and at most ``max_queue`` more may wait.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = 2,
+        max_queue: int = 8,
+        limits: dict[str, int] | None = None,
+    ) -> None:
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max(0, max_queue)
+        self.limits = dict(limits or {})
+        self._cond = threading.Condition()
+        self._models: dict[str, _ModelState] = defaultdict(_ModelState)
+        self._tickets: dict[str, Ticket] = {}
+        self._seq = itertools.count()
+
+    def limit_for(self, model: str) -> int:
+        return max(1, self.limits.get(model, self.max_concurrent))
+
+    def enqueue(
+        self, model: str, priority: int = 0, ticket_id: str | None = None
+    ) -> Ticket:
+        """Register a request for ``model``; raises :class:`QueueFull`."""
+        with self._cond:
+            state = self._models[model]
+            ticket = Ticket(
+                model, ticket_id or uuid.uuid4().hex, priority, next(self._seq)
+            )
+            if state.active < self.limit_for(model) and not state.waiting:
+                self._start(state, ticket)
+            elif len(state.waiting) >= self.max_queue:
+                state.rejected += 1
+                raise QueueFull(f"Too many requests queued for {model}")
+            else:
+                heapq.heappush(state.waiting, (ticket.sort_key, ticket))
+            self._tickets[ticket.id] = ticket
+            return ticket
+
+    def wait(self, ticket: Ticket, timeout: float | None = None) -> bool:
+        """Block until ``ticket`` may run.
+
+        Returns False if ``timeout`` expired first or the ticket was
+        cancelled while waiting (see :meth:`cancel`).
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            state = self._models[ticket.model]
+            while ticket.started is None:
+                if ticket.cancelled:
+                    return False
+                if (
+                    state.waiting
+                    and state.waiting[0][1] is ticket
+                    and state.active < self.limit_for(ticket.model)
+                ):
+                    heapq.heappop(state.waiting)
+                    self._start(state, ticket)
+                    # Let the next queued request check for a free slot too.
+                    self._cond.notify_all()
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def position(self, ticket_id: str) -> int | None:
+        """Return 0 for a running request, 1.. for queued ones, else None."""
+        with self._cond:
+            ticket = self._tickets.get(ticket_id)
+            if ticket is None:
+                return None
+            if ticket.started is not None:
+                return 0
+            waiting = sorted(self._models[ticket.model].waiting)
+            for index, (_, queued) in enumerate(waiting, start=1):
+                if queued is ticket:
+                    return index
+            return None
+
+    def cancel(self, ticket_id: str) -> bool:
+        """Drop a queued ticket and wake its waiter; False if it is not queued."""
+        with self._cond:
+            ticket = self._tickets.get(ticket_id)
+            if ticket is None or ticket.started is not None:
+                return False
+            ticket.cancelled = True
+            self.abandon(ticket)
+            return True
+
+    def abandon(self, ticket: Ticket, timed_out: bool = False) -> None:
+        """Remove a ticket that gave up waiting."""
+        with self._cond:
+            state = self._models[ticket.model]
+            if ticket.started is None:
+                state.waiting = [
+                    entry for entry in state.waiting if entry[1] is not ticket
+                ]
+                heapq.heapify(state.waiting)
+                if timed_out:
+                    state.timed_out += 1
+                self._tickets.pop(ticket.id, None)
+                self._cond.notify_all()
+            else:
+                self._release(state, ticket)
+
+    def release(self, ticket: Ticket) -> None:
+        """Free the slot held by ``ticket``; safe to call more than once."""
+        with self._cond:
+            if ticket.started is None:
+                self.abandon(ticket)
+                return
+            self._release(self._models[ticket.model], ticket)
+
+    def stats(self) -> dict[str, dict[str, object]]:
+        with self._cond:
+            return {
+                model: {
+                    "active": state.active,
+                    "queued": len(state.waiting),
+                    "limit": self.limit_for(model),
+                    "maxQueue": self.max_queue,
+                    "rejected": state.rejected,
+                    "timedOut": state.timed_out,
+                    "wait": state.wait.as_dict(),
+                    "generation": state.generation.as_dict(),
+                }
+                for model, state in self._models.items()
+            }
+
+    def _start(self, state: _ModelState, ticket: Ticket) -> None:
+        ticket.started = time.monotonic()
+        state.active += 1
+        state.wait.add(ticket.started - ticket.enqueued)
+
+    def _release(self, state: _ModelState, ticket: Ticket) -> None:
+        if ticket.released:
+            return
+        ticket.released = True
+        state.active -= 1
+        state.generation.add(time.monotonic() - (ticket.started or ticket.enqueued))
+        self._tickets.pop(ticket.id, None)
+        self._cond.notify_all()
@@ -0,0 +1,518 @@
+"""Supervise the background Python scripts started from the desktop.
+
+Each script runs in its own session with stdout and stderr appended to a
+log file under ``runtime/scripts``, so its output survives a server restart
+and can be read back with ``offset`` or ``tail`` requests.  Logs are rotated
+copy-and-truncate style once they pass ``log_max_bytes``: the script keeps
+appending to the same open file, and offsets stay absolute because the
+bytes moved to backups are counted.
+
+A sampler thread records CPU and memory use of every script through psutil
+(when installed), notices scripts that exited and rotates logs.  Scripts
+may be started with CPU-time and address-space rlimits on POSIX hosts.
+The table of running scripts is written to ``processes.json`` at most once
+per ``save_delay`` seconds, and :meth:`ScriptSupervisor.reattach` picks the
+still-running scripts up again after a restart, checking the process
+creation time so that a reused PID is not mistaken for a script.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from .command_jobs import _complete_utf8
+
+logger = logging.getLogger("server")
+
+try:  # optional dependency
+    import psutil  # type: ignore
+except Exception:  # pragma: no cover - sampling is skipped instead
+    psutil = None
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - Windows has no rlimits
+    resource = None
+
+# Bytes read per step when searching backwards for the last lines of a log.
+TAIL_BLOCK = 8192
+
+
+class ScriptProcess:
+    """One supervised script and its latest resource sample."""
+
+    def __init__(
+        self,
+        pid: int,
+        script: str,
+        log_path: Path,
+        started: float,
+        create_time: float | None = None,
+        proc: subprocess.Popen | None = None,
+        limits: dict[str, int] | None = None,
+        rotated: int = 0,
+    ) -> None:
+        self.pid = pid
+        self.script = script
+        self.log_path = log_path
+        self.started = started
+        self.create_time = create_time
+        self.proc = proc
+        self.limits = dict(limits or {})
+        # Log bytes moved to backups; added to file positions for offsets.
+        self.rotated = rotated
+        self.status = "running"
+        self.returncode: int | None = None
+        self.ended: float | None = None
+        self.cpu_percent: float | None = None
+        self.cpu_seconds: float | None = None
+        self.rss: int | None = None
+        self.peak_rss: int | None = None
+        self._ps = None
+
+    @property
+    def running(self) -> bool:
+        return self.status == "running"
+
+    def as_dict(self) -> dict[str, object]:
+        return {
+            "pid": self.pid,
+            "script": self.script,
+            "status": self.status,
+            "returncode": self.returncode,
+            "started": self.started,
+            "ended": self.ended,
+            "cpuPercent": self.cpu_percent,
+            "cpuSeconds": self.cpu_seconds,
+            "rss": self.rss,
+            "peakRss": self.peak_rss,
+            "limits": self.limits,
+            "reattached": self.proc is None,
+        }
+
+    def state(self) -> dict[str, object]:
+        """Return what :meth:`ScriptSupervisor.reattach` needs after a restart."""
+        return {
+            "pid": self.pid,
+            "script": self.script,
+            "log": str(self.log_path),
+            "started": self.started,
+            "createTime": self.create_time,
+            "limits": self.limits,
+            "rotated": self.rotated,
+        }
+
+
+def _limiter(cpu_seconds: int, memory_bytes: int):
+    """Return a ``preexec_fn`` applying the rlimits, or ``None``."""
+    if resource is None or not (cpu_seconds or memory_bytes):
+        return None
+
+    def apply() -> None:
+        if cpu_seconds:
+            # SIGXCPU at the soft limit, SIGKILL a second later.
+            resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 1))
+        if memory_bytes:
+            resource.setrlimit(resource.RLIMIT_AS, (memory_bytes, memory_bytes))
+
+    return apply
+
+
+def _pid_alive(pid: int) -> bool:
+    if psutil is not None:
+        try:
+            return psutil.Process(pid).status() != psutil.STATUS_ZOMBIE
+        except psutil.Error:
+            return False
+    if os.name != "posix":
+        return False  # os.kill(pid, 0) would terminate the process on Windows
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _create_time(pid: int) -> float | None:
+    if psutil is None:
+        return None
+    try:
+        return psutil.Process(pid).create_time()
+    except psutil.Error:
+        return None
+
+
+class ScriptSupervisor:
+    """Start, watch, stop and reattach background scripts.
+
+    ``cpu_limit`` (seconds of CPU time) and ``memory_limit`` (bytes of
+    address space) are the default rlimits for new scripts; 0 disables
+    them.  The last ``keep_exited`` finished scripts stay listed so their
+    exit code and log remain reachable.
+    """
+
+    def __init__(
+        self,
+        state_file: Path,
+        log_dir: Path,
+        python: str = sys.executable,
+        log_max_bytes: int = 1024 * 1024,
+        log_backups: int = 3,
+        interval: float = 2.0,
+        save_delay: float = 1.0,
+        cpu_limit: int = 0,
+        memory_limit: int = 0,
+        keep_exited: int = 20,
+    ) -> None:
+        self.state_file = state_file
+        self.log_dir = log_dir
+        self.python = python
+        self.log_max_bytes = log_max_bytes
+        self.log_backups = log_backups
+        self.interval = interval
+        self.save_delay = save_delay
+        self.cpu_limit = cpu_limit
+        self.memory_limit = memory_limit
+        self.keep_exited = keep_exited
+        self._scripts: dict[int, ScriptProcess] = {}
+        self._lock = threading.Lock()
+        self._save_timer: threading.Timer | None = None
+        self._sampler: threading.Thread | None = None
+        self._stop = threading.Event()
+
+    # -- lifecycle -----------------------------------------------------
+
+    def start(
+        self,
+        script_path: Path,
+        name: str,
+        cpu_limit: int | None = None,
+        memory_limit: int | None = None,
+    ) -> ScriptProcess:
+        """Launch ``script_path`` with the supervisor's interpreter."""
+        cpu = self.cpu_limit if cpu_limit is None else cpu_limit
+        memory = self.memory_limit if memory_limit is None else memory_limit
+        self.log_dir.mkdir(parents=True, exist_ok=True)
+        log_path = (
+            self.log_dir
+            / f"{script_path.stem}-{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}.log"
+        )
+        with log_path.open("ab") as log:
+            proc = subprocess.Popen(
+                [self.python, str(script_path)],
+                stdin=subprocess.DEVNULL,
+                stdout=log,
+                stderr=subprocess.STDOUT,
+                env={**os.environ, "PYTHONUNBUFFERED": "1"},
+                # Own session: the script outlives a server restart.
+                start_new_session=os.name == "posix",
+                preexec_fn=_limiter(cpu, memory),
+            )
+        limits = {
+            key: value for key, value in (("cpu", cpu), ("memory", memory)) if value
+        }
+        entry = ScriptProcess(
+            proc.pid, name, log_path, time.time(), _create_time(proc.pid), proc, limits
+        )
+        with self._lock:
+            self._scripts[proc.pid] = entry
+        self._schedule_save()
+        self._start_sampler()
+        return entry
+
+    def stop(self, pid: int, timeout: float = 5.0) -> bool:
+        """Terminate script ``pid``; False if no such script is running."""
+        entry = self.get(pid)
+        if entry is None or not entry.running:
+            return False
+        if entry.proc is not None:
+            entry.proc.terminate()
+            try:
+                entry.proc.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                entry.proc.kill()
+                entry.proc.wait()
+            self._exited(entry, entry.proc.returncode)
+            return True
+        if psutil is not None:
+            try:
+                ps = psutil.Process(pid)
+                ps.terminate()
+                try:
+                    ps.wait(timeout)
+                except psutil.TimeoutExpired:
+                    ps.kill()
+            except psutil.Error:
+                pass
+        elif os.name == "posix":
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        self._exited(entry, None)
+        return True
+
+    def get(self, pid: int) -> ScriptProcess | None:
+        with self._lock:
+            return self._scripts.get(pid)
+
+    def snapshot(self) -> dict[str, list[dict[str, object]]]:
+        """Return running and recently exited scripts for the API."""
+        self._poll()
+        with self._lock:
+            entries = list(self._scripts.values())
+        return {
+            "processes": [e.as_dict() for e in entries if e.running],
+            "exited": [e.as_dict() for e in entries if not e.running],
+        }
+
+    def reattach(self) -> int:
+        """Adopt the scripts recorded in the state file that still run.
+
+        Returns how many were reattached.
+        """
+        try:
+            records = json.loads(self.state_file.read_text(encoding="utf-8")).get(
+                "scripts", []
+            )
+        except (OSError, ValueError, AttributeError):
+            return 0
+        adopted = 0
+        for record in records:
+            try:
+                pid = int(record["pid"])
+                log_path = Path(record["log"])
+            except (KeyError, TypeError, ValueError):
+                continue
+            if not _pid_alive(pid):
+                continue
+            created = _create_time(pid)
+            expected = record.get("createTime")
+            if (
+                created is not None
+                and expected is not None
+                and abs(created - expected) > 1
+            ):
+                continue  # the PID now belongs to another process
+            entry = ScriptProcess(
+                pid,
+                str(record.get("script", "")),
+                log_path,
+                float(record.get("started") or time.time()),
+                created,
+                None,
+                record.get("limits"),
+                int(record.get("rotated") or 0),
+            )
+            with self._lock:
+                self._scripts.setdefault(pid, entry)
+            adopted += 1
+        if adopted:
+            logger.info("Reattached %d background script(s)", adopted)
+            self._start_sampler()
+        self._schedule_save()
+        return adopted
+
+    def close(self) -> None:
+        self._stop.set()
+        self.save()
+
+    # -- logs ----------------------------------------------------------
+
+    def read_log(
+        self,
+        pid: int,
+        offset: int | None = None,
+        tail: int = 100,
+        limit: int = 64 * 1024,
+    ) -> dict[str, object] | None:
+        """Return log output of script ``pid``.
+
+        With ``offset`` the output after that absolute byte offset is
+        returned (at most ``limit`` bytes); without it the last ``tail``
+        lines.  ``offset`` in the result is where the next read continues.
+        """
+        entry = self.get(pid)
+        if entry is None:
+            return None
+        base = entry.rotated
+        try:
+            with entry.log_path.open("rb") as fh:
+                size = os.fstat(fh.fileno()).st_size
+                if offset is None:
+                    start = self._tail_start(fh, size, tail)
+                else:
+                    start = min(max(0, offset - base), size)
+                fh.seek(start)
+                data = fh.read(min(limit, size - start))
+        except OSError:
+            start, data = 0, b""
+        data = data[: _complete_utf8(data)]
+        return {
+            "pid": pid,
+            "status": entry.status,
+            "text": data.decode("utf-8", errors="replace"),
+            "offset": base + start + len(data),
+            "skipped": max(0, base - offset) if offset is not None else 0,
+        }
+
+    @staticmethod
+    def _tail_start(fh, size: int, lines: int) -> int:
+        """Return the position where the last ``lines`` lines begin."""
+        if lines <= 0:
+            return size
+        position = size
+        found = 0
+        while position > 0:
+            step = min(TAIL_BLOCK, position)
+            position -= step
+            fh.seek(position)
+            block = fh.read(step)
+            # A trailing newline ends the last line rather than starting one.
+            end = (
+                len(block) - 1
+                if position + step == size and block.endswith(b"\n")
+                else len(block)
+            )
+            index = end
+            while True:
+                index = block.rfind(b"\n", 0, index)
+                if index == -1:
+                    break
+                found += 1
+                if found >= lines:
+                    return position + index + 1
+        return 0
+
+    def _rotate(self, entry: ScriptProcess) -> None:
+        try:
+            size = entry.log_path.stat().st_size
+        except OSError:
+            return
+        if size <= self.log_max_bytes:
+            return
+        path = str(entry.log_path)
+        try:
+            for index in range(self.log_backups - 1, 0, -1):
+                if os.path.exists(f"{path}.{index}"):
+                    os.replace(f"{path}.{index}", f"{path}.{index + 1}")
+            with open(path, "r+b") as fh:
+                # Count what was actually moved aside, not the size checked
+                # above: the script may have appended since.
+                if self.log_backups:
+                    with open(f"{path}.1", "wb") as backup:
+                        shutil.copyfileobj(fh, backup)
+                    size = fh.tell()
+                else:
+                    size = os.fstat(fh.fileno()).st_size
+                # Copy-truncate: anything appended between the copy and this
+                # truncate is lost.  The script appends (O_APPEND), so it
+                # continues at the new end.
+                fh.truncate(0)
+        except OSError as exc:
+            logger.warning("Rotating %s failed: %s", path, exc)
+            return
+        entry.rotated += size
+        self._schedule_save()
+
+    # -- sampling ------------------------------------------------------
+
+    def sample(self) -> None:
+        """Refresh liveness, resource use and log rotation of every script."""
+        self._poll()
+        with self._lock:
+            running = [e for e in self._scripts.values() if e.running]
+        for entry in running:
+            self._rotate(entry)
+            if psutil is None:
+                continue
+            try:
+                if entry._ps is None:
+                    entry._ps = psutil.Process(entry.pid)
+                with entry._ps.oneshot():
+                    cpu = entry._ps.cpu_percent(None)
+                    times = entry._ps.cpu_times()
+                    rss = entry._ps.memory_info().rss
+            except psutil.Error:
+                continue
+            entry.cpu_percent = cpu
+            entry.cpu_seconds = round(times.user + times.system, 2)
+            entry.rss = rss
+            entry.peak_rss = max(entry.peak_rss or 0, rss)
+
+    def _poll(self) -> None:
+        with self._lock:
+            running = [e for e in self._scripts.values() if e.running]
+        for entry in running:
+            if entry.proc is not None:
+                returncode = entry.proc.poll()
+                if returncode is not None:
+                    self._exited(entry, returncode)
+            elif not _pid_alive(entry.pid):
+                self._exited(entry, None)
+
+    def _exited(self, entry: ScriptProcess, returncode: int | None) -> None:
+        with self._lock:
+            if not entry.running:
+                return
+            entry.status = "exited"
+            entry.returncode = returncode
+            entry.ended = time.time()
+            entry.cpu_percent = None
+            finished = [e for e in self._scripts.values() if not e.running]
+            for old in sorted(finished, key=lambda e: e.ended)[
+                : max(0, len(finished) - self.keep_exited)
+            ]:
+                del self._scripts[old.pid]
+        self._schedule_save()
+
+    def _start_sampler(self) -> None:
+        with self._lock:
+            if self._sampler is not None:
+                return
+            self._sampler = threading.Thread(target=self._run, daemon=True)
+        self._sampler.start()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.sample()
+            except Exception:  # pragma: no cover - keep sampling
+                logger.exception("Sampling background scripts failed")
+
+    # -- persistence ---------------------------------------------------
+
+    def _schedule_save(self) -> None:
+        """Write the state file after ``save_delay``, merging bursts of changes."""
+        with self._lock:
+            if self._save_timer is not None:
+                return
+            self._save_timer = threading.Timer(self.save_delay, self.save)
+            self._save_timer.daemon = True
+        self._save_timer.start()
+
+    def save(self) -> None:
+        with self._lock:
+            timer, self._save_timer = self._save_timer, None
+            records = [e.state() for e in self._scripts.values() if e.running]
+        if timer is not None:
+            timer.cancel()
+        try:
+            self.state_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.state_file.with_suffix(".tmp")
+            tmp.write_text(json.dumps({"scripts": records}), encoding="utf-8")
+            os.replace(tmp, self.state_file)
+        except OSError:
+            logger.exception("Failed saving process state")
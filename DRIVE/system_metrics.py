@@ -0,0 +1,190 @@
+"""Background sampling of host CPU, memory, disk and network use.
+
+``psutil.cpu_percent()`` without an interval measures the time since its
+previous call, so with several open Processes windows each poll saw a
+different, noisy slice and did its own psutil work.  :class:`MetricsSampler`
+instead takes one sample every ``interval`` seconds in a daemon thread and
+keeps the last ``capacity`` samples in preallocated ``array`` ring buffers
+(one per series, per-core CPU flattened into one), so requests only copy
+numbers out and any number of clients cost no extra psutil calls.  Disk and
+network counters are stored as bytes per second between samples.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from array import array
+
+logger = logging.getLogger("server")
+
+try:  # optional dependency
+    import psutil  # type: ignore
+except Exception:  # pragma: no cover - the sampler reports itself unavailable
+    psutil = None
+
+# Per-sample series stored as float64, in response order.
+SERIES = (
+    "time",
+    "cpu",
+    "ram",
+    "ramUsed",
+    "diskRead",
+    "diskWrite",
+    "netSent",
+    "netRecv",
+)
+
+
+class MetricsSampler:
+    """Fixed-interval host metrics with a ring buffer of history."""
+
+    def __init__(self, interval: float = 2.0, capacity: int = 900) -> None:
+        self.interval = interval
+        self.capacity = max(1, capacity)
+        self.cores = (psutil.cpu_count() or 1) if psutil is not None else 1
+        self._series = {name: array("d", [0.0]) * self.capacity for name in SERIES}
+        self._core_load = array("f", [0.0]) * (self.capacity * self.cores)
+        self._head = 0  # next slot to write
+        self._count = 0
+        self._lock = threading.Lock()
+        self._sample_lock = threading.Lock()
+        self._primed = 0.0
+        self._thread: threading.Thread | None = None
+        self._stop = threading.Event()
+        self._counters: tuple[float, object, object] | None = None
+
+    @property
+    def available(self) -> bool:
+        return psutil is not None
+
+    def start(self) -> None:
+        """Start the sampling thread if it is not running yet."""
+        with self._lock:
+            if self._thread is not None or psutil is None:
+                return
+            self._thread = threading.Thread(target=self._run, daemon=True)
+        self._prime()
+        self._thread.start()
+
+    def close(self) -> None:
+        self._stop.set()
+
+    def sample(self) -> None:
+        """Record one sample of every series."""
+        with self._sample_lock:
+            self._sample()
+
+    def _sample(self) -> None:
+        now = time.time()
+        per_core = psutil.cpu_percent(None, percpu=True)
+        memory = psutil.virtual_memory()
+        disk = _safe(psutil.disk_io_counters)
+        net = _safe(psutil.net_io_counters)
+        previous, self._counters = self._counters, (now, disk, net)
+        rates = [0.0, 0.0, 0.0, 0.0]
+        if previous is not None and now > previous[0]:
+            elapsed = now - previous[0]
+            for i, (old, new, attr) in enumerate(
+                (
+                    (previous[1], disk, "read_bytes"),
+                    (previous[1], disk, "write_bytes"),
+                    (previous[2], net, "bytes_sent"),
+                    (previous[2], net, "bytes_recv"),
+                )
+            ):
+                if old is not None and new is not None:
+                    rates[i] = max(
+                        0.0, (getattr(new, attr) - getattr(old, attr)) / elapsed
+                    )
+        values = (
+            now,
+            sum(per_core) / len(per_core) if per_core else 0.0,
+            memory.percent,
+            float(memory.used),
+            *rates,
+        )
+        with self._lock:
+            slot = self._head
+            for name, value in zip(SERIES, values):
+                self._series[name][slot] = value
+            base = slot * self.cores
+            for core in range(self.cores):
+                self._core_load[base + core] = (
+                    per_core[core] if core < len(per_core) else 0.0
+                )
+            self._head = (slot + 1) % self.capacity
+            self._count = min(self._count + 1, self.capacity)
+
+    def latest(self) -> dict[str, object]:
+        """Return the newest sample, taking one first if there is none yet."""
+        self.start()
+        with self._lock:
+            empty = self._count == 0
+        if empty:
+            # Give the CPU baseline taken by start() a moment to mean something.
+            time.sleep(max(0.0, self._primed + 0.1 - time.monotonic()))
+            self.sample()
+        with self._lock:
+            slot = (self._head - 1) % self.capacity
+            result: dict[str, object] = {
+                name: round(self._series[name][slot], 2) for name in SERIES
+            }
+            base = slot * self.cores
+            result["cores"] = [
+                round(v, 1) for v in self._core_load[base : base + self.cores]
+            ]
+        return result
+
+    def history(self, window: float | None = None) -> dict[str, object]:
+        """Return the samples of the last ``window`` seconds as columns."""
+        self.start()
+        with self._lock:
+            count = self._count
+            if window is not None:
+                count = min(count, max(1, int(window / self.interval)))
+            first = (self._head - count) % self.capacity
+            slots = [(first + i) % self.capacity for i in range(count)]
+            columns: dict[str, object] = {
+                name: [round(self._series[name][s], 2) for s in slots]
+                for name in SERIES
+            }
+            columns["cores"] = [
+                [
+                    round(v, 1)
+                    for v in self._core_load[s * self.cores : (s + 1) * self.cores]
+                ]
+                for s in slots
+            ]
+        return {
+            "interval": self.interval,
+            "count": count,
+            "cores": self.cores,
+            "series": columns,
+        }
+
+    def _prime(self) -> None:
+        # The first cpu_percent(None) call only sets the baseline.
+        psutil.cpu_percent(None, percpu=True)
+        self._primed = time.monotonic()
+        self._counters = (
+            time.time(),
+            _safe(psutil.disk_io_counters),
+            _safe(psutil.net_io_counters),
+        )
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.sample()
+            except Exception:  # pragma: no cover - keep sampling
+                logger.exception("Sampling system metrics failed")
+
+
+def _safe(counter):
+    """Return ``counter()``, or ``None`` where the platform has no such counters."""
+    try:
+        return counter()
+    except Exception:
+        return None
@@ -0,0 +1,196 @@
+"""In-process versions of the simple whitelisted terminal commands.
+
+``echo``, ``ls``, ``cat``, ``date``, ``whoami`` and ``uname`` are trivial,
+yet running them through :mod:`subprocess` costs a fork/exec and two pipe
+reader threads per call.  :func:`resolve` returns an implementation that
+writes straight into the :class:`~DRIVE.command_jobs.CommandJob` instead,
+or ``None`` when the command or one of its options is not covered here, in
+which case the caller runs the real program.  Output follows the POSIX
+tools run without a terminal (one ``ls`` entry per line and so on).
+"""
+
+from __future__ import annotations
+
+import getpass
+import os
+import time
+from typing import Callable
+
+from .command_jobs import READ_CHUNK, CommandJob
+
+# ``run(job, deadline)`` returns the exit code, or ``None`` on timeout.
+Builtin = Callable[[CommandJob, float], "int | None"]
+
+
+def _flags(args: list[str], allowed: str) -> tuple[set[str], list[str]] | None:
+    """Split leading ``-abc`` options from operands; ``None`` if one is unknown."""
+    flags: set[str] = set()
+    for index, arg in enumerate(args):
+        if arg == "--":
+            return flags, args[index + 1 :]
+        if not arg.startswith("-") or arg == "-":
+            return flags, args[index:]
+        if any(char not in allowed for char in arg[1:]):
+            return None
+        flags.update(arg[1:])
+    return flags, []
+
+
+def _echo(args: list[str]) -> Builtin | None:
+    newline = True
+    if args and args[0] == "-n":
+        newline, args = False, args[1:]
+    elif args and args[0].startswith("-") and args[0] != "-":
+        return None  # -e/-E escapes are left to the real echo
+
+    def run(job: CommandJob, deadline: float) -> int:
+        job.write(" ".join(args) + ("\n" if newline else ""))
+        return 0
+
+    return run
+
+
+def _ls(args: list[str]) -> Builtin | None:
+    parsed = _flags(args, "aA1")
+    if parsed is None:
+        return None
+    flags, paths = parsed
+
+    def visible(name: str) -> bool:
+        return "a" in flags or "A" in flags or not name.startswith(".")
+
+    def run(job: CommandJob, deadline: float) -> int:
+        status = 0
+        files: list[str] = []
+        dirs: list[str] = []
+        for path in paths or ["."]:
+            if os.path.isdir(path):
+                dirs.append(path)
+            elif os.path.lexists(path):
+                files.append(path)
+            else:
+                job.write(f"ls: cannot access '{path}': No such file or directory\n")
+                status = 2
+        blocks: list[str] = (
+            ["".join(f"{name}\n" for name in sorted(files))] if files else []
+        )
+        for path in sorted(dirs):
+            try:
+                with os.scandir(path) as entries:
+                    names = sorted(
+                        entry.name for entry in entries if visible(entry.name)
+                    )
+            except OSError as exc:
+                job.write(f"ls: cannot open directory '{path}': {exc.strerror}\n")
+                status = 2
+                continue
+            if "a" in flags:
+                names = [".", ".."] + names
+            header = f"{path}:\n" if len(files) + len(dirs) > 1 else ""
+            blocks.append(header + "".join(f"{name}\n" for name in names))
+        job.write("\n".join(blocks))
+        return status
+
+    return run
+
+
+def _cat(args: list[str]) -> Builtin | None:
+    parsed = _flags(args, "")
+    if parsed is None or not parsed[1] or "-" in parsed[1]:
+        return None  # reading stdin is left to the real cat
+    paths = parsed[1]
+
+    def run(job: CommandJob, deadline: float) -> int | None:
+        status = 0
+        for path in paths:
+            try:
+                with open(path, "rb") as handle:
+                    while chunk := handle.read(READ_CHUNK):
+                        job.write(chunk)
+                        if time.monotonic() > deadline:
+                            return None  # e.g. /dev/zero
+            except IsADirectoryError:
+                job.write(f"cat: {path}: Is a directory\n")
+                status = 1
+            except OSError as exc:
+                job.write(f"cat: {path}: {exc.strerror}\n")
+                status = 1
+        return status
+
+    return run
+
+
+def _date(args: list[str]) -> Builtin | None:
+    if len(args) > 1 or (args and not args[0].startswith("+")):
+        return None
+    fmt = args[0][1:] if args else "%a %b %e %H:%M:%S %Z %Y"
+
+    def run(job: CommandJob, deadline: float) -> int:
+        job.write(time.strftime(fmt) + "\n")
+        return 0
+
+    return run
+
+
+def _whoami(args: list[str]) -> Builtin | None:
+    if args:
+        return None
+
+    def run(job: CommandJob, deadline: float) -> int:
+        try:
+            import pwd
+
+            name = pwd.getpwuid(os.geteuid()).pw_name
+        except (ImportError, KeyError):
+            name = getpass.getuser()
+        job.write(name + "\n")
+        return 0
+
+    return run
+
+
+# uname fields in output order, keyed by option letter.
+_UNAME_FIELDS = {
+    "s": "sysname",
+    "n": "nodename",
+    "r": "release",
+    "v": "version",
+    "m": "machine",
+}
+
+
+def _uname(args: list[str]) -> Builtin | None:
+    parsed = _flags(args, "asnrvm")
+    if parsed is None or parsed[1] or not hasattr(os, "uname"):
+        return None
+    flags = parsed[0]
+    if "a" in flags:
+        flags = set(_UNAME_FIELDS)
+    letters = [letter for letter in _UNAME_FIELDS if letter in flags] or ["s"]
+
+    def run(job: CommandJob, deadline: float) -> int:
+        info = os.uname()
+        job.write(
+            " ".join(getattr(info, _UNAME_FIELDS[letter]) for letter in letters) + "\n"
+        )
+        return 0
+
+    return run
+
+
+BUILTINS: dict[str, Callable[[list[str]], Builtin | None]] = {
+    "echo": _echo,
+    "ls": _ls,
+    "cat": _cat,
+    "date": _date,
+    "whoami": _whoami,
+    "uname": _uname,
+}
+
+
+def resolve(tokens: list[str]) -> Builtin | None:
+    """Return the in-process implementation of ``tokens``, if there is one."""
+    if os.path.basename(tokens[0]) != tokens[0]:
+        return None  # an explicit path names a specific program
+    factory = BUILTINS.get(tokens[0].lower())
+    return factory(tokens[1:]) if factory else None
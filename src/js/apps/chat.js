@@ -174,11 +174,13 @@ export function mount(winEl, ctx) {
         if (!res.ok) throw new Error();
         const data = res.data;
         const models = Array.isArray(data.models) ? data.models : [];
+        const loaded = Array.isArray(data.loaded) ? data.loaded : [];
         if (models.length) {
           models.forEach((name) => {
             const opt = document.createElement('option');
             opt.value = name;
-            opt.textContent = name;
+            // Loaded models answer without waiting for a cold start.
+            opt.textContent = loaded.includes(name) ? `${name} (loaded)` : name;
             modelSelect.append(opt);
           });
           if (data.defaultText) modelSelect.value = data.defaultText;
@@ -7,6 +7,10 @@ import { pickOpen } from '../utils/file-dialogs.js';
 
 export const meta = { id: 'file-manager', name: 'File Manager', icon: '/icons/file-manager.png' };
 
+// Chunked uploads: chunks in flight at once, and tries per chunk.
+const UPLOAD_PARALLEL = 3;
+const UPLOAD_RETRIES = 3;
+
 export function launch(ctx) {
   const content = document.createElement('div');
   const id = ctx.windowManager.createWindow(meta.id, meta.name, content);
@@ -89,6 +93,9 @@ export function mount(winEl, ctx) {
     pickOpen: ctx?.fileDialogs?.pickOpen ?? pickOpen,
   };
   let renderedItems = [];
+  // Large folders arrive in pages; the first one is shown right away.
+  const LISTING_PAGE = 1000;
+  let listingToken = 0;
 
   function getUserId() {
     return (
@@ -98,11 +105,13 @@ export function mount(winEl, ctx) {
     );
   }
 
+  // Served by /api/download with Range and revalidation; the user travels in
+  // the query so media elements can stream the URL directly.
   function fileURL(relPath) {
-    const parts = relPath.split('/').filter(Boolean).map(encodeURIComponent);
-    const joined = parts.join('/');
+    const params = new URLSearchParams({ path: relPath });
     const uid = getUserId();
-    return uid ? `/users/${encodeURIComponent(uid)}/${joined}` : `/${joined}`;
+    if (uid) params.set('user', uid);
+    return `/api/download?${params}`;
   }
 
   function formatSize(bytes) {
@@ -172,14 +181,52 @@ export function mount(winEl, ctx) {
     await loadDirectory(currentPath);
   }
 
+  async function chunkChecksum(blob) {
+    if (typeof crypto === 'undefined' || !crypto.subtle) return null;
+    const digest = await crypto.subtle.digest('SHA-256', await blob.arrayBuffer());
+    return Array.from(new Uint8Array(digest), (b) => b.toString(16).padStart(2, '0')).join('');
+  }
+
+  // Chunked upload (/api/uploads): a few chunks in flight at once, each
+  // retried on failure, then one call to move the finished file into place.
+  async function uploadChunked(file, path) {
+    const started = await api.postJSON('/api/uploads', { path, name: file.name, size: file.size });
+    if (!started.ok || started.data.ok === false) {
+      throw new Error(started.error || started.data.error);
+    }
+    const { id, chunkSize, missing } = started.data;
+    const queue = [...missing];
+    async function worker() {
+      while (queue.length) {
+        const index = queue.shift();
+        const offset = index * chunkSize;
+        const blob = file.slice(offset, offset + chunkSize);
+        const headers = {};
+        const checksum = await chunkChecksum(blob);
+        if (checksum) headers['X-Chunk-Sha256'] = checksum;
+        let result;
+        for (let attempt = 0; attempt < UPLOAD_RETRIES; attempt += 1) {
+          result = await api.request(`/api/uploads/${id}?offset=${offset}`, {
+            method: 'PUT',
+            body: blob,
+            headers,
+          });
+          if (result.ok) break;
+        }
+        if (!result.ok) throw new Error(result.error);
+      }
+    }
+    await Promise.all(Array.from({ length: UPLOAD_PARALLEL }, worker));
+    const done = await api.post(`/api/uploads/${id}/complete`);
+    if (!done.ok || done.data.ok === false) throw new Error(done.error || done.data.error);
+  }
+
   async function uploadFileAction() {
     async function uploadFile(file) {
-      const fd = new FormData();
-      fd.append('path', currentPath);
-      fd.append('file', file, file.name);
-      const result = await api.post('/api/upload', fd);
-      if (!result.ok || result.data.ok === false) {
-        alert(result.error || result.data.error || 'Upload failed');
+      try {
+        await uploadChunked(file, currentPath);
+      } catch (err) {
+        alert(String(err.message || err) || 'Upload failed');
       }
       await loadDirectory(currentPath);
     }
@@ -245,7 +292,9 @@ export function mount(winEl, ctx) {
     if (node.wrapper.dataset.loaded === '1' && !force) return;
     node.wrapper.dataset.loading = '1';
     try {
-      const resp = await api.getJSON(`/api/list-directory?path=${encodeURIComponent(path)}`);
+      const resp = await api.getJSON(
+        `/api/list-directory?path=${encodeURIComponent(path)}&fields=name,path,isDir`
+      );
       if (!resp.ok || resp.data.ok === false) return;
       const data = resp.data.data || resp.data;
       node.children.innerHTML = '';
@@ -479,12 +528,11 @@ export function mount(winEl, ctx) {
           },
         ]);
       } else if (['mp3', 'wav', 'ogg', 'webm', 'mp4', 'm4a', 'm4v', 'mov'].includes(ext)) {
-        const res = await api.get(url, {}, 'blob');
-        if (!res.ok) throw new Error(res.error);
+        // Stream rather than download: seeking fetches only the needed ranges.
         mediaPlayer.launch(ctx, {
           name: item.name,
           path: item.path,
-          blob: res.data,
+          src: url,
         });
       } else if (ext === 'csv') {
         const res = await api.get(url, {}, 'text');
@@ -509,7 +557,36 @@ export function mount(winEl, ctx) {
     }
   }
 
-  searchInput.addEventListener('input', renderDetails);
+  // Typing filters the open folder; Enter searches its whole subtree.
+  let searching = false;
+  async function searchTree() {
+    const query = searchInput.value.trim();
+    if (!query) return;
+    const token = ++listingToken;
+    const resp = await api.getJSON(
+      `/api/search?q=${encodeURIComponent(query)}&path=${encodeURIComponent(currentPath)}&limit=500`
+    );
+    if (token !== listingToken) return;
+    if (!resp.ok || resp.data.ok === false) {
+      details.textContent = resp.error || resp.data.error || 'Search failed';
+      return;
+    }
+    searching = true;
+    currentItems = resp.data.results || [];
+    renderDetails();
+  }
+
+  searchInput.addEventListener('input', () => {
+    if (searching && !searchInput.value.trim()) {
+      searching = false;
+      loadDirectory(currentPath);
+      return;
+    }
+    renderDetails();
+  });
+  searchInput.addEventListener('keydown', (ev) => {
+    if (ev.key === 'Enter') searchTree();
+  });
   refreshBtn.addEventListener('click', () => loadDirectory(currentPath));
   listViewBtn.addEventListener('click', () => setViewMode('list'));
   gridViewBtn.addEventListener('click', () => setViewMode('grid'));
@@ -576,8 +653,17 @@ export function mount(winEl, ctx) {
 
   loadDirectory('');
 
+  function listingURL(path, cursor) {
+    let url = `/api/list-directory?path=${encodeURIComponent(path)}&limit=${LISTING_PAGE}`;
+    if (cursor) url += `&cursor=${encodeURIComponent(cursor)}`;
+    return url;
+  }
+
   async function loadDirectory(path) {
-    const resp = await api.getJSON(`/api/list-directory?path=${encodeURIComponent(path)}`);
+    const token = ++listingToken;
+    searching = false;
+    const resp = await api.getJSON(listingURL(path));
+    if (token !== listingToken) return;
     if (!resp.ok || resp.data.ok === false) {
       details.textContent = resp.error || resp.data.error || 'Failed to load directory';
       return;
@@ -588,6 +674,14 @@ export function mount(winEl, ctx) {
     renderTreeRoot();
     renderDetails();
     renderBreadcrumbs();
+    let cursor = data.nextCursor;
+    while (cursor) {
+      const more = await api.getJSON(listingURL(path, cursor));
+      if (token !== listingToken || !more.ok || more.data.ok === false) return;
+      currentItems = currentItems.concat(more.data.items || []);
+      cursor = more.data.nextCursor;
+      renderDetails();
+    }
   }
 
   function setViewMode(mode) {
@@ -32,7 +32,10 @@ export function mount(winEl, ctx) {
     contentArea.append(panel);
     const btn = document.createElement('button');
     btn.textContent = name;
-    btn.addEventListener('click', () => showPanel(name));
+    btn.addEventListener('click', () => {
+      showPanel(name);
+      if (name === 'Host') loadHost();
+    });
     tabs.append(btn);
     tabBtns[name] = btn;
     return panel;
@@ -57,7 +60,65 @@ export function mount(winEl, ctx) {
   const ramText = document.createElement('p');
   statsPanel.append(cpuText, ramText);
 
+  const hostPanel = makePanel('Host');
+  const hostTable = document.createElement('table');
+  hostTable.style.width = '100%';
+  hostTable.style.fontSize = '12px';
+  hostPanel.append(hostTable);
+
   container.append(tabs, contentArea);
+
+  // Host processes keyed by pid; refreshed with diffs against `hostVersion`.
+  const hostRows = new Map();
+  let hostVersion = null;
+
+  function rowsOf(columns, data) {
+    const rows = [];
+    const count = data.pid.length;
+    for (let i = 0; i < count; i += 1) {
+      const row = {};
+      columns.forEach((name) => {
+        row[name] = data[name][i];
+      });
+      rows.push(row);
+    }
+    return rows;
+  }
+
+  async function loadHost() {
+    const query = hostVersion === null ? '' : `?since=${hostVersion}`;
+    const resp = await api.getJSON(`/api/processes${query}`);
+    if (!resp.ok) {
+      hostTable.textContent = 'Failed to load host processes.';
+      hostVersion = null;
+      return;
+    }
+    const data = resp.data;
+    if (data.full) {
+      hostRows.clear();
+      rowsOf(data.columns, data.rows).forEach((row) => hostRows.set(row.pid, row));
+    } else {
+      data.removed.forEach((pid) => hostRows.delete(pid));
+      rowsOf(data.columns, data.added).forEach((row) => hostRows.set(row.pid, row));
+      rowsOf(data.columns, data.changed).forEach((row) => hostRows.set(row.pid, row));
+    }
+    hostVersion = data.version;
+    const sorted = [...hostRows.values()].sort((a, b) => b.cpu - a.cpu || b.rss - a.rss);
+    hostTable.innerHTML = '';
+    const head = hostTable.insertRow();
+    ['PID', 'Name', 'User', 'CPU %', 'Memory'].forEach((label) => {
+      const th = document.createElement('th');
+      th.textContent = label;
+      th.style.textAlign = 'left';
+      head.append(th);
+    });
+    sorted.forEach((proc) => {
+      const tr = hostTable.insertRow();
+      [proc.pid, proc.name, proc.user, proc.cpu, `${(proc.rss / 1024).toFixed(1)} MB`].forEach((value) => {
+        tr.insertCell().textContent = String(value);
+      });
+    });
+  }
   showPanel('Processes');
 
   async function load() {
@@ -89,7 +150,25 @@ export function mount(winEl, ctx) {
           const row = document.createElement('div');
           row.classList.add('file-item');
           const nameSpan = document.createElement('span');
-          nameSpan.textContent = `${proc.script} (PID ${proc.pid})`;
+          const usage = [];
+          if (proc.cpuPercent != null) usage.push(`CPU ${proc.cpuPercent}%`);
+          if (proc.rss != null) usage.push(`${(proc.rss / 1048576).toFixed(1)} MB`);
+          nameSpan.textContent = `${proc.script} (PID ${proc.pid})${usage.length ? ' – ' + usage.join(', ') : ''}`;
+          const logBtn = document.createElement('button');
+          logBtn.textContent = 'Log';
+          const logView = document.createElement('pre');
+          logView.style.display = 'none';
+          logView.style.maxHeight = '160px';
+          logView.style.overflow = 'auto';
+          logBtn.addEventListener('click', async () => {
+            if (logView.style.display === 'block') {
+              logView.style.display = 'none';
+              return;
+            }
+            const logResp = await api.getJSON(`/api/script-log/${proc.pid}?tail=50`);
+            logView.textContent = logResp.ok ? logResp.data.text || '(no output)' : 'Failed to load log.';
+            logView.style.display = 'block';
+          });
           const stopBtn = document.createElement('button');
           stopBtn.textContent = 'Stop';
           stopBtn.addEventListener('click', async () => {
@@ -106,8 +185,8 @@ export function mount(winEl, ctx) {
           stopBtn.style.borderLeft = `2px solid var(--btn-border-light)`;
           stopBtn.style.borderRight = `2px solid var(--btn-border-dark)`;
           stopBtn.style.borderBottom = `2px solid var(--btn-border-dark)`;
-          row.append(nameSpan, stopBtn);
-          scriptsSection.append(row);
+          row.append(nameSpan, logBtn, stopBtn);
+          scriptsSection.append(row, logView);
         });
       }
     } catch {
@@ -131,8 +210,13 @@ export function mount(winEl, ctx) {
     }
   }
 
-  load();
-  const interval = setInterval(load, 4000);
+  function refresh() {
+    load();
+    if (panels.Host.style.display === 'block') loadHost();
+  }
+
+  refresh();
+  const interval = setInterval(refresh, 4000);
   const closeBtn = winEl.querySelector('.controls button:last-child');
   if (closeBtn) closeBtn.addEventListener('click', () => clearInterval(interval));
 }
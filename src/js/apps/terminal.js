@@ -85,17 +85,28 @@ export function mount(winEl, ctx) {
         return;
       }
       appendLine('Running...', 'terminal-info');
+      // Poll with a byte offset so each response only carries new output;
+      // a trailing partial line is held until its newline arrives.
+      let offset = 0;
+      let pending = '';
       while (true) {
         await new Promise((resolve) => setTimeout(resolve, 400));
-        const status = await api.getJSON(`/api/command-status/${jobId}`);
+        const status = await api.getJSON(`/api/command-status/${jobId}?offset=${offset}`);
         if (!status.ok) {
+          if (pending) appendLine(pending);
           appendLine(`Error: ${status.error || 'Failed to fetch command status'}`, 'terminal-error');
           return;
         }
         const data = status.data;
+        pending += data?.output || '';
+        offset = data?.offset ?? offset;
+        const cut = pending.lastIndexOf('\n');
+        if (cut !== -1) {
+          appendLine(pending.slice(0, cut));
+          pending = pending.slice(cut + 1);
+        }
         if (data?.status === 'finished') {
-          const text = data.output || '';
-          if (text) appendLine(text);
+          if (pending) appendLine(pending);
           if (data.returncode && data.returncode !== 0) {
             appendLine(`Process exited with code ${data.returncode}`, 'terminal-error');
           }
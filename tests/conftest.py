@@ -0,0 +1,141 @@
+import json
+import re
+import sys
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+
+
+class OllamaStub:
+    """Minimal stand-in for the Ollama HTTP API used by the chat tests."""
+
+    def __init__(self) -> None:
+        self.models = ["stub:1b"]
+        self.tokens = ["Hello", " ", "world"]
+        self.calls: list[tuple[str, str, dict]] = []
+        self.peers: list[tuple[str, int]] = []
+        self.delay = 0.0
+        self.token_delay = 0.0
+        self.aborted = 0
+        self.loaded: list[str] = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):  # silence test output
+                pass
+
+            def _json(self, payload: dict, status: int = 200) -> None:
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                stub.peers.append(self.client_address)
+                stub.calls.append(("GET", self.path, {}))
+                if self.path == "/api/tags":
+                    self._json({"models": [{"name": m} for m in stub.models]})
+                elif self.path == "/api/ps":
+                    self._json(
+                        {"models": [{"name": m, "size_vram": 1} for m in stub.loaded]}
+                    )
+                else:
+                    self._json({"error": "not found"}, 404)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}")
+                stub.peers.append(self.client_address)
+                stub.calls.append(("POST", self.path, body))
+                time.sleep(stub.delay)
+                if self.path == "/api/embed":
+                    self._json(
+                        {"embeddings": [stub.embedding(t) for t in body["input"]]}
+                    )
+                    return
+                if self.path not in ("/api/generate", "/api/chat"):
+                    self._json({"error": "not found"}, 404)
+                    return
+                if body.get("model") not in stub.loaded:
+                    stub.loaded.append(body.get("model"))
+                chunks = [stub.chunk(self.path, t, False) for t in stub.tokens]
+                final = stub.chunk(self.path, "", True)
+                if not body.get("stream", True):
+                    final = stub.chunk(self.path, "".join(stub.tokens), True)
+                if self.path == "/api/generate":
+                    # Pretend each call appends one token to the KV context.
+                    final["context"] = body.get("context", []) + [len(stub.calls)]
+                if not body.get("stream", True):
+                    self._json(final)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                try:
+                    for chunk in chunks + [final]:
+                        data = (json.dumps(chunk) + "\n").encode()
+                        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                        self.wfile.flush()
+                        time.sleep(stub.token_delay)
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client hung up mid-generation.
+                    stub.aborted += 1
+                    self.close_connection = True
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def chunk(self, path: str, text: str, done: bool) -> dict:
+        if path == "/api/chat":
+            return {"message": {"role": "assistant", "content": text}, "done": done}
+        return {"response": text, "done": done}
+
+    @staticmethod
+    def embedding(text: str, dims: int = 32) -> list[float]:
+        """Deterministic bag-of-words vector: texts sharing words are close."""
+        vector = [0.0] * dims
+        for word in re.findall(r"\w+", text.lower()):
+            vector[zlib.crc32(word.encode()) % dims] += 1.0
+        return vector
+
+    def posts(self, path: str) -> list[dict]:
+        return [
+            body for method, p, body in self.calls if method == "POST" and p == path
+        ]
+
+
+@pytest.fixture
+def make_ollama_stub():
+    """Start any number of :class:`OllamaStub` servers for one test."""
+    stubs: list[OllamaStub] = []
+
+    def make() -> OllamaStub:
+        stub = OllamaStub()
+        stub.thread.start()
+        stubs.append(stub)
+        return stub
+
+    try:
+        yield make
+    finally:
+        for stub in stubs:
+            stub.server.shutdown()
+            stub.server.server_close()
+
+
+@pytest.fixture
+def ollama_stub(make_ollama_stub):
+    return make_ollama_stub()
@@ -0,0 +1,141 @@
+import assert from "node:assert/strict";
+import { setupTestDOM } from "./helpers/domStub.js";
+
+const env = setupTestDOM();
+const createElement = env.document.createElement.bind(env.document);
+env.document.createElement = (tagName) => {
+  const el = createElement(tagName);
+  if (tagName === "input") el.value = "";
+  return el;
+};
+globalThis.CSS = { escape: (value) => String(value) };
+globalThis.alert = (message) => {
+  throw new Error(`unexpected alert: ${message}`);
+};
+
+const calls = [];
+const routes = [];
+globalThis.fetch = async (url, options = {}) => {
+  calls.push({ url, method: options.method || "GET", options });
+  for (const [match, respond] of routes) {
+    if (match(url, options)) {
+      const body = await respond(url, options);
+      const status = body?.status ?? 200;
+      return {
+        ok: status < 400,
+        status,
+        json: async () => body,
+      };
+    }
+  }
+  throw new Error(`unexpected request ${options.method || "GET"} ${url}`);
+};
+
+const { mount } = await import("../src/js/apps/file-manager.js");
+
+function createWindowShell() {
+  const win = env.document.createElement("div");
+  win.classList.add("window");
+  const content = env.document.createElement("div");
+  content.classList.add("content");
+  win.append(content);
+  env.root.append(win);
+  return win;
+}
+
+const settle = () => new Promise((resolve) => setTimeout(resolve, 0));
+
+async function testLoadsFolderInPages() {
+  routes.length = 0;
+  calls.length = 0;
+  routes.push([
+    (url) => url.startsWith("/api/list-directory") && !url.includes("cursor="),
+    () => ({
+      ok: true,
+      path: "",
+      items: [{ name: "a.txt", path: "a.txt", type: "file", size: 1 }],
+      nextCursor: "c1",
+    }),
+  ]);
+  routes.push([
+    (url) => url.startsWith("/api/list-directory") && url.includes("cursor=c1"),
+    () => ({
+      ok: true,
+      items: [{ name: "b.txt", path: "b.txt", type: "file", size: 2 }],
+      nextCursor: null,
+    }),
+  ]);
+
+  mount(createWindowShell(), { fileDialogs: { pickOpen: async () => null } });
+  for (let i = 0; i < 10; i += 1) await settle();
+
+  // The tree asks for folders separately; only paged listings count here.
+  const listings = calls.filter((call) => call.url.includes("limit="));
+  assert.equal(listings.length, 2);
+  assert.match(listings[0].url, /limit=1000/);
+  assert.match(listings[1].url, /cursor=c1/);
+}
+
+async function testUploadSendsChunksWithRetries() {
+  routes.length = 0;
+  calls.length = 0;
+  const data = "0123456789";
+  const received = new Map();
+  let failures = 0;
+  routes.push([
+    (url) => url.startsWith("/api/list-directory"),
+    () => ({ ok: true, path: "", items: [] }),
+  ]);
+  routes.push([
+    (url, options) => url === "/api/uploads" && options.method === "POST",
+    (url, options) => {
+      assert.deepEqual(JSON.parse(options.body), { path: "", name: "big.bin", size: 10 });
+      return { ok: true, id: "u1", chunkSize: 4, missing: [0, 1, 2] };
+    },
+  ]);
+  routes.push([
+    (url, options) => url.startsWith("/api/uploads/u1?") && options.method === "PUT",
+    async (url, options) => {
+      const offset = Number(new URL(url, "http://x").searchParams.get("offset"));
+      if (offset === 4 && failures === 0) {
+        failures += 1;
+        return { status: 500 };
+      }
+      assert.ok(options.headers["X-Chunk-Sha256"]);
+      received.set(offset, await options.body.text());
+      return { ok: true };
+    },
+  ]);
+  routes.push([
+    (url, options) => url === "/api/uploads/u1/complete" && options.method === "POST",
+    () => {
+      assert.equal(received.size, 3);
+      return { ok: true, path: "big.bin" };
+    },
+  ]);
+
+  const file = new File([data], "big.bin");
+  mount(createWindowShell(), {
+    fileDialogs: { pickOpen: async () => [{ file }] },
+  });
+  await settle();
+  await window.fileManagerContext.uploadFile();
+
+  assert.equal(failures, 1);
+  const sorted = [...received.entries()].sort((a, b) => a[0] - b[0]);
+  assert.equal(sorted.map(([, text]) => text).join(""), data);
+  const puts = calls.filter((call) => call.method === "PUT");
+  assert.equal(puts.length, 4);
+  assert.ok(calls.some((call) => call.url === "/api/uploads/u1/complete"));
+}
+
+async function run() {
+  await testLoadsFolderInPages();
+  await testUploadSendsChunksWithRetries();
+  console.log("file manager tests passed");
+}
+
+run().catch((err) => {
+  console.error(err);
+  process.exitCode = 1;
+});
@@ -69,6 +69,53 @@ def test_windows_style_traversal_blocked(client):
     assert data.get("error") == "Invalid path"
 
 
+def test_download_ranges_and_revalidation(client, monkeypatch, tmp_path):
+    monkeypatch.setattr("DRIVE.app.BASE_DIR", tmp_path)
+    (tmp_path / "users" / "viewer" / "media").mkdir(parents=True)
+    (tmp_path / "users" / "viewer" / "media" / "clip.bin").write_bytes(
+        bytes(range(256)) * 4
+    )
+    (tmp_path / "users" / "other").mkdir()
+    (tmp_path / "users" / "other" / "secret.txt").write_text("no")
+    args = {"path": "media/clip.bin", "user": "viewer"}
+
+    full = client.get("/api/download", query_string=args)
+    assert full.status_code == 200 and len(full.data) == 1024
+    assert full.headers["Accept-Ranges"] == "bytes"
+    etag = full.headers["ETag"]
+
+    part = client.get(
+        "/api/download", query_string=args, headers={"Range": "bytes=1000-"}
+    )
+    assert part.status_code == 206
+    assert part.headers["Content-Range"] == "bytes 1000-1023/1024"
+    assert part.data == bytes(range(232, 256))
+
+    again = client.get(
+        "/api/download", query_string=args, headers={"If-None-Match": etag}
+    )
+    assert again.status_code == 304 and again.data == b""
+    since = client.get(
+        "/api/download",
+        query_string=args,
+        headers={"If-Modified-Since": full.headers["Last-Modified"]},
+    )
+    assert since.status_code == 304
+
+    bad = client.get(
+        "/api/download", query_string=args, headers={"Range": "bytes=2000-"}
+    )
+    assert bad.status_code == 416
+    escape = client.get(
+        "/api/download", query_string={"path": "../other/secret.txt", "user": "viewer"}
+    )
+    assert escape.status_code == 400
+    missing = client.get(
+        "/api/download", query_string={"path": "media", "user": "viewer"}
+    )
+    assert missing.status_code == 404
+
+
 def test_diagnostics_missing_icon():
     target = Path("src/js/apps/notepad.js")
     original = target.read_text(encoding="utf-8")
@@ -99,3 +146,35 @@ def test_log_client_error_endpoint(client):
     diag = resp.get_json()
     assert "errors" in diag
     assert any(err.get("app") == "tester" for err in diag.get("errors", []))
+
+
+def test_script_endpoints(client, monkeypatch, tmp_path):
+    import time
+
+    from DRIVE.script_supervisor import ScriptSupervisor
+
+    supervisor = ScriptSupervisor(
+        tmp_path / "processes.json", tmp_path / "logs", interval=60
+    )
+    monkeypatch.setattr("DRIVE.app.script_supervisor", supervisor)
+    monkeypatch.setattr("DRIVE.app.BASE_DIR", tmp_path)
+    (tmp_path / "hello.py").write_text("import time\nprint('hello')\ntime.sleep(30)\n")
+
+    pid = client.post("/api/run-script", json={"script_name": "hello.py"}).get_json()[
+        "pid"
+    ]
+    listed = client.get("/api/list-scripts").get_json()["processes"]
+    assert [p["pid"] for p in listed] == [pid]
+    for _ in range(100):
+        log = client.get(f"/api/script-log/{pid}").get_json()
+        if log["text"]:
+            break
+        time.sleep(0.02)
+    assert log["text"] == "hello\n" and log["offset"] == 6
+    assert client.get(f"/api/script-log/{pid}?offset=6").get_json()["text"] == ""
+    assert client.post("/api/stop-script", json={"pid": pid}).get_json() == {
+        "stopped": pid
+    }
+    assert client.post("/api/stop-script", json={"pid": pid}).status_code == 404
+    assert client.get("/api/list-scripts").get_json()["exited"][0]["pid"] == pid
+    assert client.get("/api/script-log/1").status_code == 404
@@ -0,0 +1,108 @@
+import json
+import threading
+import time
+
+import pytest
+
+from DRIVE import chat_store as module
+from DRIVE.app import app
+from DRIVE.chat_store import ChatLog, ChatStore
+
+
+def _messages(n, start=0):
+    return [{"role": "user", "content": f"m{i}"} for i in range(start, start + n)]
+
+
+def test_append_and_page(tmp_path):
+    log = ChatLog(tmp_path)
+    assert log.append(_messages(10)) == 10
+    messages, start = log.page(limit=3)
+    assert [m["content"] for m in messages] == ["m7", "m8", "m9"]
+    assert start == 7
+    messages, start = log.page(before=start, limit=3)
+    assert [m["content"] for m in messages] == ["m4", "m5", "m6"]
+    assert log.page(before=2, limit=5) == (_messages(2), 0)
+
+
+def test_reopen_recovers_torn_tail_and_stale_index(tmp_path):
+    log = ChatLog(tmp_path)
+    log.append(_messages(3))
+    with (tmp_path / "chat_history.jsonl").open("ab") as fh:
+        fh.write(b'{"role":"user","content":"m3"}\n{"role":"us')
+
+    reopened = ChatLog(tmp_path)
+    assert len(reopened) == 4
+    assert reopened.read()[-1]["content"] == "m3"
+    assert (tmp_path / "chat_history.jsonl").read_bytes().endswith(b"}\n")
+
+    (tmp_path / "chat_history.idx").write_bytes(b"\xff" * 8)
+    assert [m["content"] for m in ChatLog(tmp_path).read()] == ["m0", "m1", "m2", "m3"]
+
+
+def test_compaction_keeps_newest_messages(tmp_path):
+    log = ChatLog(tmp_path)
+    log.append(_messages(20))
+    log.compact(5)
+    assert [m["content"] for m in log.read()] == [f"m{i}" for i in range(15, 20)]
+    log.append(_messages(1, start=20))
+    assert [m["content"] for m in ChatLog(tmp_path).read()][-2:] == ["m19", "m20"]
+
+
+def test_appends_during_compaction_are_kept(tmp_path, monkeypatch):
+    log = ChatLog(tmp_path)
+    log.append(_messages(20))
+    copy, unblocked = module._copy, []
+
+    def copy_while_appending(src, dst, length):
+        if not unblocked:
+            worker = threading.Thread(target=log.append, args=(_messages(2, 20),))
+            worker.start()
+            worker.join(timeout=2)
+            unblocked.append(not worker.is_alive())
+        copy(src, dst, length)
+
+    monkeypatch.setattr(module, "_copy", copy_while_appending)
+    log.compact(5)
+    assert unblocked == [True]
+    expected = [f"m{i}" for i in range(15, 22)]
+    assert [m["content"] for m in log.read()] == expected
+    assert [m["content"] for m in ChatLog(tmp_path).read()] == expected
+
+
+def test_store_compacts_in_background(tmp_path):
+    store = ChatStore(lambda profile: tmp_path, max_messages=4)
+    store.append("p", _messages(6))
+    chat_log = store.log("p")
+    for _ in range(100):
+        if len(chat_log) == 4:
+            break
+        time.sleep(0.01)
+    assert [m["content"] for m in store.load("p")] == ["m2", "m3", "m4", "m5"]
+
+
+def test_legacy_history_is_migrated(tmp_path):
+    (tmp_path / "chat_history.json").write_text(json.dumps(_messages(2)))
+    assert ChatLog(tmp_path).read() == _messages(2)
+    assert not (tmp_path / "chat_history.json").exists()
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    monkeypatch.setattr("DRIVE.app.BASE_DIR", tmp_path)
+    app.config["TESTING"] = True
+    with app.test_client() as client:
+        yield client
+
+
+def test_history_endpoint_paginates(client):
+    from DRIVE.app import chat_store
+
+    chat_store.append("bob", _messages(5))
+    data = client.get("/api/ollama/history/bob", query_string={"limit": 2}).get_json()
+    assert [m["content"] for m in data["history"]] == ["m3", "m4"]
+    assert data["start"] == 3 and data["total"] == 5
+    data = client.get(
+        "/api/ollama/history/bob", query_string={"before": 3, "limit": 2}
+    ).get_json()
+    assert [m["content"] for m in data["history"]] == ["m1", "m2"]
+    assert len(client.get("/api/ollama/history/bob").get_json()["history"]) == 5
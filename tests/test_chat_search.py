@@ -0,0 +1,71 @@
+import pytest
+
+from DRIVE.app import app, chat_store
+from DRIVE.chat_search import ChatSearch
+from DRIVE.chat_store import ChatLog
+
+
+def _turns(*texts):
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": t}
+        for i, t in enumerate(texts)
+    ]
+
+
+def test_ranks_matches_and_cuts_snippets(tmp_path):
+    history = ChatLog(tmp_path)
+    history.append(_turns("How do I bake bread?", "Use flour, water, yeast and salt."))
+    conv = ChatLog(tmp_path, "trip")
+    conv.append(_turns("Plan a trip to Rome", "Bread in Rome is great; bread bread."))
+    search = ChatSearch(lambda profile: [(None, history), ("trip", conv)])
+
+    results = search.search("alice", "BREAD")
+    assert [(r["conversation"], r["index"]) for r in results] == [
+        ("trip", 1),
+        (None, 0),
+    ]
+    best = results[0]
+    assert best["role"] == "assistant" and best["offset"] == 0 and best["length"] == 5
+    assert best["snippet"].startswith("Bread in Rome")
+    assert search.search("alice", "yeast rome")[0]["index"] == 1
+    assert search.search("alice", "zebra") == []
+    assert search.search("alice", "  ") == []
+
+
+def test_index_is_updated_incrementally_and_rebuilt_after_compaction(tmp_path):
+    history = ChatLog(tmp_path)
+    history.append(_turns("first apple"))
+    search = ChatSearch(lambda profile: [(None, history)])
+    assert len(search.search("p", "apple")) == 1
+
+    history.append(_turns("second apple"))
+    search.note_append("p", None, history)
+    # Equal scores rank the newer message first.
+    assert [r["index"] for r in search.search("p", "apple")] == [1, 0]
+
+    history.append(_turns("third apple"))
+    history.compact(2)
+    results = search.search("p", "apple")
+    assert sorted(r["snippet"] for r in results) == ["second apple", "third apple"]
+
+
+@pytest.fixture
+def client(monkeypatch, tmp_path):
+    monkeypatch.setattr("DRIVE.app.BASE_DIR", tmp_path)
+    app.config["TESTING"] = True
+    with app.test_client() as client:
+        yield client
+
+
+def test_search_endpoint(client):
+    chat_store.append("carol", _turns("The meeting moved to Thursday."))
+    chat_store.conversation("carol", "c1").append(_turns("Remind me about the meeting"))
+    data = client.get(
+        "/api/ollama/search", query_string={"q": "meeting", "profile": "carol"}
+    ).get_json()
+    assert data["ok"] is True
+    assert {r["conversation"] for r in data["results"]} == {None, "c1"}
+    assert (
+        client.get("/api/ollama/search", query_string={"q": "meeting"}).status_code
+        == 400
+    )
@@ -0,0 +1,211 @@
+import hashlib
+import io
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from DRIVE.app import app
+from DRIVE.chunked_upload import ChunkedUploads, UploadError
+from DRIVE.dir_listing import ListingCache
+from DRIVE.file_index import FileIndexes
+
+KIB = 1024
+
+
+@pytest.fixture
+def root(tmp_path):
+    path = tmp_path / "user"
+    path.mkdir()
+    return path
+
+
+def _chunks(data, size):
+    return [
+        (offset, data[offset : offset + size]) for offset in range(0, len(data), size)
+    ]
+
+
+def test_parallel_chunks_then_atomic_rename(root):
+    uploads = ChunkedUploads(chunk_size=64 * KIB)
+    data = os.urandom(300 * KIB)
+    upload = uploads.create(root, root / "docs" / "big.bin", len(data))
+    assert upload["chunks"] == 5 and upload["missing"] == [0, 1, 2, 3, 4]
+
+    def send(item):
+        offset, chunk = item
+        checksum = hashlib.sha256(chunk).hexdigest()
+        return uploads.write_chunk(
+            root, upload["id"], offset, io.BytesIO(chunk), checksum
+        )
+
+    with ThreadPoolExecutor(4) as pool:
+        list(pool.map(send, reversed(_chunks(data, 64 * KIB))))
+    assert not (root / "docs" / "big.bin").exists()
+    dest = uploads.complete(root, upload["id"])
+    assert dest.read_bytes() == data
+    assert list((root / ".uploads").iterdir()) == []
+
+
+def test_bad_chunks_stay_missing_and_can_be_resent(root):
+    uploads = ChunkedUploads(chunk_size=64 * KIB)
+    data = b"a" * (64 * KIB) + b"tail"
+    upload = uploads.create(root, root / "f.txt", len(data))
+    first, last = _chunks(data, 64 * KIB)
+
+    with pytest.raises(UploadError) as exc:  # connection dropped mid-chunk
+        uploads.write_chunk(root, upload["id"], 0, io.BytesIO(first[1][:100]))
+    assert exc.value.status == 400
+    with pytest.raises(UploadError) as exc:
+        uploads.write_chunk(
+            root,
+            upload["id"],
+            last[0],
+            io.BytesIO(b"tall"),
+            hashlib.sha256(b"tail").hexdigest(),
+        )
+    assert exc.value.status == 422
+    with pytest.raises(UploadError):
+        uploads.write_chunk(root, upload["id"], 100, io.BytesIO(b"x"))
+    with pytest.raises(UploadError) as exc:
+        uploads.complete(root, upload["id"])
+    assert exc.value.status == 409
+
+    # A new instance (a restart) resumes from what is on disk.
+    resumed = ChunkedUploads(chunk_size=64 * KIB)
+    assert resumed.status(root, upload["id"])["missing"] == [0, 1]
+    resumed.write_chunk(root, upload["id"], 0, io.BytesIO(first[1]))
+    resumed.write_chunk(root, upload["id"], last[0], io.BytesIO(last[1]))
+    assert resumed.complete(root, upload["id"]).read_bytes() == data
+
+
+def test_limits_and_cleanup(root):
+    uploads = ChunkedUploads(chunk_size=64 * KIB, max_bytes=KIB, ttl=60)
+    with pytest.raises(UploadError) as exc:
+        uploads.create(root, root / "big", 2 * KIB)
+    assert exc.value.status == 413
+    with pytest.raises(UploadError):
+        uploads.status(root, "../../etc")
+    empty = uploads.create(root, root / "empty", 0)
+    uploads.write_chunk(root, empty["id"], 0, io.BytesIO(b""))
+    assert uploads.complete(root, empty["id"]).read_bytes() == b""
+
+    stale = uploads.create(root, root / "stale", 10)
+    uploads.ttl = 0
+    time.sleep(0.01)
+    assert uploads.cleanup(root) == 1
+    with pytest.raises(UploadError) as exc:
+        uploads.status(root, stale["id"])
+    assert exc.value.status == 404
+
+
+def test_damaged_session_is_an_upload_error(root):
+    uploads = ChunkedUploads(chunk_size=64 * KIB)
+    upload = uploads.create(root, root / "f", 4)
+    (root / ".uploads" / upload["id"] / "session.json").write_text('{"id": ')
+    with pytest.raises(UploadError) as exc:
+        uploads.status(root, upload["id"])
+    assert exc.value.status == 409
+    uploads.abort(root, upload["id"])
+
+
+def test_complete_onto_a_folder_is_a_conflict(root):
+    uploads = ChunkedUploads(chunk_size=64 * KIB)
+    upload = uploads.create(root, root / "taken", 4)
+    uploads.write_chunk(root, upload["id"], 0, io.BytesIO(b"data"))
+    (root / "taken" / "inside").mkdir(parents=True)
+    with pytest.raises(UploadError) as exc:
+        uploads.complete(root, upload["id"])
+    assert exc.value.status == 409
+    assert uploads.status(root, upload["id"])["missing"] == []
+
+    (root / "taken" / "inside").rmdir()
+    (root / "taken").rmdir()
+    assert uploads.complete(root, upload["id"]).read_bytes() == b"data"
+
+
+def test_complete_reports_other_os_errors(root, monkeypatch):
+    uploads = ChunkedUploads(chunk_size=64 * KIB)
+    upload = uploads.create(root, root / "f", 0)
+    uploads.write_chunk(root, upload["id"], 0, io.BytesIO(b""))
+
+    def replace(src, dst):
+        raise PermissionError(13, "Permission denied")
+
+    monkeypatch.setattr("DRIVE.chunked_upload.os.replace", replace)
+    with pytest.raises(UploadError) as exc:
+        uploads.complete(root, upload["id"])
+    assert exc.value.status == 500
+
+
+def test_upload_endpoints(monkeypatch, tmp_path):
+    monkeypatch.setattr("DRIVE.app.BASE_DIR", tmp_path)
+    monkeypatch.setattr(
+        "DRIVE.app.chunked_uploads", ChunkedUploads(chunk_size=64 * KIB)
+    )
+    monkeypatch.setattr("DRIVE.app.directory_listings", ListingCache())
+    monkeypatch.setattr("DRIVE.app.file_indexes", FileIndexes())
+    headers = {"X-User-Id": "uploader"}
+    data = os.urandom(100 * KIB)
+    app.config["TESTING"] = True
+    with app.test_client() as client:
+        bad = client.post(
+            "/api/uploads", json={"path": "..", "name": "x", "size": 1}, headers=headers
+        )
+        assert bad.status_code == 400
+        bad = client.post(
+            "/api/uploads", json={"name": "../x", "size": 1}, headers=headers
+        )
+        assert bad.status_code == 400
+        for body in ({"size": True}, {"size": 1, "chunk_size": "big"}):
+            bad = client.post(
+                "/api/uploads", json={"name": "x", **body}, headers=headers
+            )
+            assert bad.status_code == 400
+
+        upload = client.post(
+            "/api/uploads",
+            json={"path": "in", "name": "blob.bin", "size": len(data)},
+            headers=headers,
+        ).get_json()
+        assert upload["ok"] and upload["chunks"] == 2
+        url = f"/api/uploads/{upload['id']}"
+        chunk = data[64 * KIB :]
+        sent = client.put(
+            url,
+            query_string={"offset": 64 * KIB},
+            data=chunk,
+            headers={**headers, "X-Chunk-Sha256": hashlib.sha256(chunk).hexdigest()},
+        ).get_json()
+        assert sent["index"] == 1 and sent["missing"] == [0]
+        assert client.get(url, headers=headers).get_json()["missing"] == [0]
+        root_listing = client.get("/api/list-directory", headers=headers).get_json()
+        assert root_listing["items"] == []  # .uploads is not listed
+        assert client.post(f"{url}/complete", headers=headers).status_code == 409
+
+        client.put(
+            url, query_string={"offset": 0}, data=data[: 64 * KIB], headers=headers
+        )
+        done = client.post(f"{url}/complete", headers=headers).get_json()
+        assert done == {"ok": True, "path": "in/blob.bin"}
+        assert (
+            tmp_path / "users" / "uploader" / "in" / "blob.bin"
+        ).read_bytes() == data
+
+        listing = client.get(
+            "/api/list-directory", query_string={"path": "in"}, headers=headers
+        )
+        assert [item["name"] for item in listing.get_json()["items"]] == ["blob.bin"]
+        assert client.get(url, headers=headers).status_code == 404
+
+        other = client.post(
+            "/api/uploads", json={"name": "gone", "size": 5}, headers=headers
+        ).get_json()
+        assert client.delete(f"/api/uploads/{other['id']}", headers=headers).get_json()[
+            "ok"
+        ]
+        assert (
+            client.get(f"/api/uploads/{other['id']}", headers=headers).status_code
+            == 404
+        )
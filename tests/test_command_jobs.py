@@ -0,0 +1,76 @@
+import threading
+import time
+
+import pytest
+
+from DRIVE.command_jobs import CommandJob, JobQueueFull, JobRegistry
+
+
+def test_output_keeps_only_the_newest_bytes():
+    job = CommandJob("cat big", max_output=8)
+    job.write(b"0123456789")
+    assert job.dropped == 2
+    assert job.read(0) == ("23456789", 10, False)
+    assert job.read(7) == ("789", 10, False)
+
+    job = CommandJob("cat", max_output=4)
+    job.write("aéxyz".encode())
+    # The kept window never starts inside the two-byte character.
+    assert job.read(0) == ("xyz", 6, False)
+
+
+def test_registry_bounds_queue_and_reports_latency():
+    release = threading.Event()
+    registry = JobRegistry(workers=1, max_queue=1)
+
+    def block(job):
+        release.wait(2)
+        job.finish("finished", 0)
+
+    first = registry.submit("a", block)
+    for _ in range(100):
+        if first.status == "running":
+            break
+        time.sleep(0.01)
+    second = registry.submit("b", block)
+    assert second.status == "queued"
+    with pytest.raises(JobQueueFull):
+        registry.submit("c", block)
+    stats = registry.stats()
+    assert (stats["running"], stats["queued"], stats["rejected"]) == (1, 1, 1)
+
+    release.set()
+    assert second.wait(0, 2) and second.returncode == 0
+    for _ in range(100):
+        if registry.stats()["runMs"]["count"] == 2:
+            break
+        time.sleep(0.01)
+    assert registry.stats()["queueWaitMs"]["count"] == 2
+
+
+def test_registry_evicts_expired_and_least_recently_used_jobs():
+    registry = JobRegistry(workers=2, max_jobs=2, ttl=60)
+    done = lambda job: job.finish("finished", 0)  # noqa: E731
+    jobs = [registry.submit(str(i), done) for i in range(2)]
+    for job in jobs:
+        job.wait(0, 2)
+    registry.get(jobs[0].id)  # touch: jobs[1] is now least recently used
+    third = registry.submit("2", done)
+    third.wait(0, 2)
+    assert registry.get(jobs[1].id) is None
+    assert registry.get(jobs[0].id) is jobs[0]
+
+    registry.ttl = 0
+    time.sleep(0.01)
+    assert len(registry) == 0
+
+
+def test_failing_target_finishes_job_as_error():
+    registry = JobRegistry(workers=1)
+
+    def boom(job):
+        raise RuntimeError("exploded")
+
+    job = registry.submit("x", boom)
+    assert job.wait(0, 2)
+    assert (job.status, job.error, job.output()) == ("error", "exploded", "exploded")
@@ -0,0 +1,57 @@
+import time
+
+from DRIVE.chat_store import ChatLog
+from DRIVE.context_builder import (
+    ContextBuilder,
+    Summarizer,
+    message_tokens,
+    window_start,
+)
+
+
+def _msg(content, role="user"):
+    return {"role": role, "content": content}
+
+
+def test_window_start_keeps_newest_messages_within_budget():
+    assert window_start([5, 5, 5], 10) == 1
+    assert window_start([5, 5, 5], 100) == 0
+    assert window_start([5, 50], 10) == 2
+
+
+def test_fit_uses_per_model_budget():
+    builder = ContextBuilder(100, {"tiny": 20})
+    history = [_msg("x" * 40) for _ in range(5)]  # 14 tokens each
+    assert len(builder.fit(history, "big", "hi")) == 5
+    assert len(builder.fit(history, "tiny", "hi")) == 1
+
+
+def test_token_estimates_are_stored_with_the_log(tmp_path):
+    log = ChatLog(tmp_path, "conv")
+    log.append([_msg("a" * 400), _msg("b" * 8), _msg("c" * 8)])
+    assert (tmp_path / "conv.tok").stat().st_size == 12
+    assert log.window_start(20) == 1
+
+    (tmp_path / "conv.tok").unlink()
+    reopened = ChatLog(tmp_path, "conv")
+    assert reopened.window_start(20) == 1
+    assert reopened.window_start(message_tokens(_msg("a" * 400)) + 12) == 0
+
+
+def test_summarizer_caches_summary_of_old_turns(tmp_path):
+    prompts = []
+
+    def generate(model, prompt):
+        prompts.append(prompt)
+        return " the user said hello "
+
+    log = ChatLog(tmp_path, "conv")
+    log.append([_msg(f"m{i}") for i in range(6)])
+    summarizer = Summarizer(generate)
+    assert summarizer.schedule(log, "stub", 4)
+    for _ in range(100):
+        if log.load_summary():
+            break
+        time.sleep(0.01)
+    assert log.load_summary() == {"upto": 4, "text": "the user said hello"}
+    assert "user: m3" in prompts[0] and "m4" not in prompts[0]
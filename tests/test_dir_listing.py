@@ -0,0 +1,132 @@
+import io
+import os
+
+import pytest
+
+from DRIVE.app import app
+from DRIVE.dir_listing import ListingCache
+
+
+@pytest.fixture
+def folder(tmp_path):
+    for name, size in [("b.txt", 3), ("A.md", 10), ("c.py", 1)]:
+        (tmp_path / name).write_bytes(b"x" * size)
+    (tmp_path / "zdir").mkdir()
+    (tmp_path / "adir").mkdir()
+    # Dot entries (the app's own state among them) are never listed.
+    (tmp_path / ".uploads").mkdir()
+    (tmp_path / ".hidden").write_bytes(b"")
+    return tmp_path
+
+
+def _names(entries):
+    return [entry.name for entry in entries]
+
+
+def test_sorts_with_folders_first(folder):
+    cache = ListingCache()
+    assert _names(cache.page(folder)[0]) == ["adir", "zdir", "A.md", "b.txt", "c.py"]
+    assert _names(cache.page(folder, sort="size")[0])[2:] == ["c.py", "b.txt", "A.md"]
+    assert _names(cache.page(folder, descending=True)[0]) == [
+        "zdir",
+        "adir",
+        "c.py",
+        "b.txt",
+        "A.md",
+    ]
+    assert _names(cache.page(folder, dirs_first=False)[0]) == [
+        "A.md",
+        "adir",
+        "b.txt",
+        "c.py",
+        "zdir",
+    ]
+    with pytest.raises(ValueError):
+        cache.page(folder, sort="colour")
+
+
+@pytest.mark.parametrize("descending", [False, True])
+def test_cursor_pages_cover_the_listing_once(folder, descending):
+    cache = ListingCache()
+    expected = _names(cache.page(folder, descending=descending)[0])
+    seen, cursor = [], None
+    while True:
+        entries, total, cursor = cache.page(
+            folder, descending=descending, cursor=cursor, limit=2
+        )
+        seen += _names(entries)
+        if cursor is None:
+            break
+    assert seen == expected and total == 5
+
+
+def test_cursor_survives_changes_between_pages(folder):
+    cache = ListingCache()
+    first, _, cursor = cache.page(folder, limit=3)
+    (folder / "0-new.txt").write_text("")  # sorts before the cursor
+    (folder / "b.txt").unlink()
+    rest, total, _ = cache.page(folder, cursor=cursor)
+    assert _names(first) == ["adir", "zdir", "A.md"]
+    assert _names(rest) == ["c.py"] and total == 5
+
+
+def test_listing_is_reused_until_the_directory_changes(folder):
+    cache = ListingCache()
+    cache.page(folder)
+    cache.page(folder, sort="mtime")
+    assert (cache.hits, cache.misses) == (1, 1)
+    (folder / "new.txt").write_text("")
+    stat = folder.stat()
+    os.utime(folder, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert "new.txt" in _names(cache.page(folder)[0])
+    assert cache.misses == 2
+
+
+def test_list_directory_endpoint(monkeypatch, tmp_path):
+    monkeypatch.setattr("DRIVE.app.BASE_DIR", tmp_path)
+    monkeypatch.setattr("DRIVE.app.directory_listings", ListingCache())
+    headers = {"X-User-Id": "lister"}
+    app.config["TESTING"] = True
+    with app.test_client() as client:
+        for name in ("one.txt", "two.txt", "three.txt"):
+            data = {"path": "docs", "file": (io.BytesIO(b"hi"), name)}
+            client.post("/api/upload", data=data, headers=headers)
+        page = client.get(
+            "/api/list-directory",
+            query_string={"path": "docs", "limit": 2, "fields": "name,size"},
+            headers=headers,
+        ).get_json()
+        assert page["items"] == [
+            {"name": "one.txt", "size": 2},
+            {"name": "three.txt", "size": 2},
+        ]
+        assert page["total"] == 3 and page["nextCursor"]
+
+        # Overwriting a file keeps the folder's mtime; the upload invalidates.
+        client.post(
+            "/api/upload",
+            data={"path": "docs", "file": (io.BytesIO(b"longer"), "two.txt")},
+            headers=headers,
+        )
+        rest = client.get(
+            "/api/list-directory",
+            query_string={
+                "path": "docs",
+                "cursor": page["nextCursor"],
+                "fields": "name,size",
+            },
+            headers=headers,
+        ).get_json()
+        assert (
+            rest["items"] == [{"name": "two.txt", "size": 6}]
+            and rest["nextCursor"] is None
+        )
+
+        bad = client.get(
+            "/api/list-directory", query_string={"fields": "owner"}, headers=headers
+        )
+        assert bad.status_code == 400
+        bad = client.get(
+            "/api/list-directory", query_string={"cursor": "!!"}, headers=headers
+        )
+        assert bad.status_code == 400
@@ -0,0 +1,134 @@
+import os
+import threading
+import time
+
+import pytest
+
+from DRIVE.doc_index import DocumentIndex, chunk_spans
+
+
+def _embed_counting(ollama_stub, calls):
+    def embed(texts):
+        calls.extend(texts)
+        return [ollama_stub.embedding(t) for t in texts]
+
+    return embed
+
+
+def test_chunk_spans_break_on_whitespace_and_overlap():
+    text = ("word " * 50 + "\n\n") * 4
+    spans = chunk_spans(text, size=120, overlap=20)
+    assert spans[0][0] == 0 and spans[-1][1] == len(text)
+    for (_, end), (start, _) in zip(spans, spans[1:]):
+        assert start < end  # consecutive chunks overlap
+    assert all(text[end - 1].isspace() for _, end in spans[:-1])
+
+
+def test_index_updates_incrementally_and_searches(ollama_stub, tmp_path):
+    root = tmp_path / "documents"
+    (root / "notes").mkdir(parents=True)
+    (root / "notes" / "garden.md").write_text("Tomatoes need sun and water every day.")
+    (root / "recipes.txt").write_text("Bake the bread at high heat for forty minutes.")
+    (root / "photo.png").write_bytes(b"\x89PNG")
+    calls = []
+    index = DocumentIndex(
+        root, tmp_path / ".idx", _embed_counting(ollama_stub, calls), "stub"
+    )
+
+    assert index.update() == {"embedded": 2, "removed": 0}
+    assert index.update() == {"embedded": 0, "removed": 0}
+    results = index.search("how long to bake bread", k=1)
+    assert results[0]["path"] == "recipes.txt" and "forty minutes" in results[0]["text"]
+
+    # Only the modified file is embedded again; deleted files drop out.
+    calls.clear()
+    garden = root / "notes" / "garden.md"
+    garden.write_text("Tomatoes need sun. Water them in the evening.")
+    os.utime(garden, ns=(1, 1))
+    (root / "recipes.txt").unlink()
+    assert index.update() == {"embedded": 1, "removed": 1}
+    assert calls == ["Tomatoes need sun. Water them in the evening."]
+
+    # A fresh instance reads the stored vectors instead of re-embedding.
+    calls.clear()
+    reopened = DocumentIndex(
+        root, tmp_path / ".idx", _embed_counting(ollama_stub, calls), "stub"
+    )
+    assert reopened.search("water tomatoes", k=3)[0]["path"] == "notes/garden.md"
+    assert calls == ["water tomatoes"]
+    assert len(reopened) == 1
+
+
+def test_changing_model_rebuilds(ollama_stub, tmp_path):
+    root = tmp_path / "documents"
+    root.mkdir()
+    (root / "a.txt").write_text("alpha")
+    DocumentIndex(
+        root, tmp_path / ".idx", _embed_counting(ollama_stub, []), "one"
+    ).update()
+    other = DocumentIndex(
+        root, tmp_path / ".idx", _embed_counting(ollama_stub, []), "two"
+    )
+    assert other.update() == {"embedded": 1, "removed": 0}
+
+
+def _until(check, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not check():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_search_builds_and_rescans_in_the_background(ollama_stub, tmp_path):
+    root = tmp_path / "documents"
+    root.mkdir()
+    (root / "a.txt").write_text("alpha")
+    release = threading.Event()
+
+    def slow_embed(texts):
+        release.wait(5)
+        return [ollama_stub.embedding(t) for t in texts]
+
+    index = DocumentIndex(root, tmp_path / ".idx", slow_embed, "stub")
+    assert index.search("alpha") == []  # does not wait for the first build
+    release.set()
+    _until(lambda: len(index) == 1)
+    assert index.search("alpha")[0]["path"] == "a.txt"
+
+    (root / "b.txt").write_text("beta")
+    index.search("beta")
+    time.sleep(0.05)
+    assert len(index) == 1  # rescans are rate-limited
+    index.rescan_interval = 0
+    index.search("beta")
+    _until(lambda: len(index) == 2)
+
+
+def test_changed_embedding_size_rebuilds(ollama_stub, tmp_path):
+    root = tmp_path / "documents"
+    root.mkdir()
+    (root / "a.txt").write_text("alpha")
+    DocumentIndex(
+        root, tmp_path / ".idx", _embed_counting(ollama_stub, []), "stub"
+    ).update()
+    (root / "b.txt").write_text("beta")
+    calls = []
+
+    def embed(texts):
+        calls.extend(texts)
+        return [ollama_stub.embedding(t, dims=8) for t in texts]
+
+    index = DocumentIndex(root, tmp_path / ".idx", embed, "stub")
+    assert index.update() == {"embedded": 2, "removed": 0}
+    assert sorted(calls) == ["alpha", "beta"]
+    assert index.search("alpha", k=1)[0]["path"] == "a.txt"
+
+
+def test_embedder_returning_too_few_vectors_is_rejected(ollama_stub, tmp_path):
+    root = tmp_path / "documents"
+    root.mkdir()
+    (root / "a.txt").write_text("alpha")
+    index = DocumentIndex(root, tmp_path / ".idx", lambda texts: [], "stub")
+    with pytest.raises(ValueError):
+        index.update()
+    assert len(index) == 0
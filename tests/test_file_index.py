@@ -0,0 +1,138 @@
+import io
+import os
+
+import pytest
+
+from DRIVE.app import app
+from DRIVE.file_index import FileIndex, FileIndexes
+
+
+@pytest.fixture
+def tree(tmp_path):
+    root = tmp_path / "user"
+    (root / "docs" / "reports").mkdir(parents=True)
+    (root / "docs" / "reports" / "budget_2024.xlsx").write_bytes(b"x" * 10)
+    (root / "docs" / "notes.md").write_text("remember the quarterly budget")
+    (root / "budget.txt").write_text("top level")
+    (root / ".hidden").mkdir()
+    (root / ".hidden" / "budget-secret.txt").write_text("")
+    return root
+
+
+def _index(root, **kwargs):
+    return FileIndex(root, root / ".file_index" / "index.sqlite3", **kwargs)
+
+
+def _paths(results):
+    return [result["path"] for result in results]
+
+
+def test_search_builds_on_first_use_and_ranks_prefixes_first(tree):
+    index = _index(tree)
+    assert not index.built
+    results = index.search("budget")
+    assert index.built
+    assert _paths(results) == ["budget.txt", "docs/reports/budget_2024.xlsx"]
+    assert results[1]["size"] == 10 and results[1]["isDir"] is False
+    assert _paths(index.search("GET_20")) == ["docs/reports/budget_2024.xlsx"]
+    # Short queries fall back to LIKE; '_' is not a wildcard.
+    assert _paths(index.search("s_")) == []
+    assert _paths(index.search("rep")) == ["docs/reports"]
+
+
+def test_search_within_a_folder(tree):
+    index = _index(tree)
+    assert _paths(index.search("budget", path="docs")) == [
+        "docs/reports/budget_2024.xlsx"
+    ]
+    assert _paths(index.search("budget", path="doc")) == []
+
+
+def test_content_is_optional(tree):
+    assert _index(tree).search("quarterly", content=True) == []
+    index = _index(tree, content=True)
+    assert _paths(index.search("quarterly", content=True)) == ["docs/notes.md"]
+    assert index.search("quarterly") == []
+
+
+def test_incremental_updates(tree):
+    index = _index(tree)
+    index.search("budget")
+    (tree / "docs" / "reports").rename(tree / "docs" / "archive")
+    index.note_renamed(tree / "docs" / "reports", tree / "docs" / "archive")
+    assert _paths(index.search("budget_")) == ["docs/archive/budget_2024.xlsx"]
+    (tree / "new" / "deep").mkdir(parents=True)
+    (tree / "new" / "deep" / "budget.csv").write_text("")
+    index.note_changed(tree / "new" / "deep" / "budget.csv")
+    assert "new/deep" in _paths(index.search("deep"))
+    (tree / "budget.txt").unlink()
+    index.note_removed(tree / "budget.txt")
+    assert _paths(index.search("budget")) == [
+        "new/deep/budget.csv",
+        "docs/archive/budget_2024.xlsx",
+    ]
+
+
+def test_reconcile_picks_up_outside_changes(tree):
+    index = _index(tree)
+    index.search("budget")
+    (tree / "docs" / "budget-draft.doc").write_text("")
+    (tree / "budget.txt").unlink()
+    stat = (tree / "docs" / "notes.md").stat()
+    os.utime(
+        tree / "docs" / "notes.md",
+        ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000),
+    )
+    assert index.reconcile() == {"changed": 3, "removed": 1}  # docs/ changed too
+    assert _paths(index.search("budget")) == [
+        "docs/budget-draft.doc",
+        "docs/reports/budget_2024.xlsx",
+    ]
+
+
+def test_search_endpoint_follows_file_operations(monkeypatch, tmp_path):
+    monkeypatch.setattr("DRIVE.app.BASE_DIR", tmp_path)
+    monkeypatch.setattr("DRIVE.app.file_indexes", FileIndexes())
+    headers = {"X-User-Id": "finder"}
+    app.config["TESTING"] = True
+    with app.test_client() as client:
+        client.post(
+            "/api/upload",
+            data={"path": "a", "file": (io.BytesIO(b"hi"), "plan.txt")},
+            headers=headers,
+        )
+        found = client.get(
+            "/api/search", query_string={"q": "plan"}, headers=headers
+        ).get_json()
+        assert found["ok"] and _paths(found["results"]) == ["a/plan.txt"]
+
+        client.post(
+            "/api/upload",
+            data={"path": "b", "file": (io.BytesIO(b"hi"), "plan2.txt")},
+            headers=headers,
+        )
+        client.post(
+            "/api/rename",
+            json={"path": "a/plan.txt", "new_name": "idea.txt"},
+            headers=headers,
+        )
+        client.post(
+            "/api/create-folder",
+            json={"path": "b", "name": "planning"},
+            headers=headers,
+        )
+        client.post("/api/delete", json={"path": "b/plan2.txt"}, headers=headers)
+        found = client.get(
+            "/api/search", query_string={"q": "plan"}, headers=headers
+        ).get_json()
+        assert _paths(found["results"]) == ["b/planning"]
+        found = client.get(
+            "/api/search", query_string={"q": "idea", "path": "b"}, headers=headers
+        ).get_json()
+        assert found["results"] == []
+
+        bad = client.get(
+            "/api/search", query_string={"q": "x", "path": "../.."}, headers=headers
+        )
+        assert bad.status_code == 400
+        assert client.get("/api/search", headers=headers).status_code == 400
@@ -0,0 +1,54 @@
+import base64
+import io
+
+import pytest
+from PIL import Image
+
+from DRIVE.image_prep import ImagePreprocessor
+
+
+def _image_b64(size=(2000, 1500), mode="RGB", fmt="PNG") -> str:
+    # Noise, like a photo, so the image does not compress to almost nothing.
+    img = Image.effect_noise(size, 40).convert(mode)
+    out = io.BytesIO()
+    img.save(out, format=fmt)
+    return base64.b64encode(out.getvalue()).decode()
+
+
+def _decode(data: str) -> Image.Image:
+    return Image.open(io.BytesIO(base64.b64decode(data)))
+
+
+def test_large_image_is_downscaled_and_cached():
+    prep = ImagePreprocessor(max_side=512, max_sides={"small": 128})
+    original = _image_b64()
+    first = prep.prepare(original)
+    assert (first.width, first.height) == (512, 384)
+    assert _decode(first.data).format == "JPEG"
+    assert first.bytes < first.original_bytes and not first.cached
+
+    second = prep.prepare("data:image/png;base64," + original)
+    assert second.cached and second.data == first.data
+    assert prep.prepare(original, model="small").width == 128
+    stats = prep.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 2
+    assert stats["bytesSaved"] > 2 * (first.original_bytes - first.bytes)
+
+
+def test_transparent_image_is_flattened():
+    prepared = ImagePreprocessor(max_side=256).prepare(_image_b64(mode="RGBA"))
+    assert _decode(prepared.data).mode == "RGB"
+
+
+def test_original_kept_when_reencoding_does_not_help():
+    tiny = _image_b64(size=(4, 4), fmt="GIF")
+    prepared = ImagePreprocessor().prepare(tiny)
+    assert prepared.data == tiny and prepared.as_dict()["saved"] == 0
+
+
+def test_invalid_input_raises_value_error():
+    prep = ImagePreprocessor()
+    with pytest.raises(ValueError):
+        prep.prepare("not base64!")
+    with pytest.raises(ValueError):
+        prep.prepare(base64.b64encode(b"plain text").decode())
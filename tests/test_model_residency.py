@@ -0,0 +1,71 @@
+import threading
+import time
+
+from DRIVE.model_residency import ModelResidency
+
+
+def test_running_is_cached_and_errors_are_reported():
+    calls = []
+    entries = [{"name": "a", "expires_at": "soon", "size_vram": 10}]
+
+    def fetch():
+        calls.append(1)
+        if len(calls) > 1:
+            raise RuntimeError("down")
+        return entries
+
+    residency = ModelResidency(fetch, lambda model, keep_alive: None, ttl=60)
+    assert residency.state("a") == "loaded"
+    assert residency.state("b") == "unloaded"
+    assert len(calls) == 1
+    snapshot = residency.snapshot(refresh=True)
+    # The last known state survives a failed refresh.
+    assert snapshot["models"]["a"]["expiresAt"] == "soon"
+    assert snapshot["error"] == "down"
+
+
+def test_stale_state_is_served_while_refreshing_in_the_background():
+    release = threading.Event()
+    fetched = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        if len(calls) == 1:
+            return [{"name": "a"}]
+        release.wait(2)
+        fetched.set()
+        return [{"name": "b"}]
+
+    residency = ModelResidency(fetch, lambda model, keep_alive: None, ttl=0)
+    assert list(residency.running()) == ["a"]
+    # Ollama is slow now; callers still get the last known state at once.
+    assert list(residency.running()) == ["a"]
+    assert list(residency.running()) == ["a"]
+    release.set()
+    assert fetched.wait(2)
+    for _ in range(100):
+        if list(residency.running()) == ["b"]:
+            break
+        time.sleep(0.01)
+    assert list(residency.running()) == ["b"]
+
+
+def test_warm_loads_each_model_once_with_keep_alive():
+    release = threading.Event()
+    loads = []
+
+    def load(model, keep_alive):
+        loads.append((model, keep_alive))
+        release.wait(1)
+
+    residency = ModelResidency(
+        lambda: [], load, keep_alive={"a": "1h"}, default_keep_alive="5m", ttl=0
+    )
+    thread = residency.warm(["a", "b"])
+    assert residency.warm(["a"]) is None
+    assert residency.snapshot()["models"]["b"]["state"] == "loading"
+    release.set()
+    thread.join(2)
+    assert loads == [("a", "1h"), ("b", "5m")]
+    assert residency.keep_alive_for("c") == "5m"
@@ -0,0 +1,473 @@
+import base64
+import io
+import json
+import threading
+import time
+
+import pytest
+from PIL import Image
+
+from DRIVE import app as app_module
+from DRIVE.app import app, detect_ollama_models, generations
+from DRIVE.context_builder import ContextBuilder
+from DRIVE.image_prep import ImagePreprocessor
+from DRIVE.model_catalog import ModelCatalog
+from DRIVE.model_residency import ModelResidency
+from DRIVE.ollama_client import OllamaClient, OllamaConnectionError
+from DRIVE.response_cache import ResponseCache
+from DRIVE.scheduler import ModelScheduler
+
+
+@pytest.fixture
+def client(ollama_stub, monkeypatch, tmp_path):
+    monkeypatch.setattr("DRIVE.app.BASE_DIR", tmp_path)
+    stub_client = OllamaClient(ollama_stub.url)
+    monkeypatch.setattr("DRIVE.app.ollama_client", stub_client)
+    monkeypatch.setattr(
+        "DRIVE.app.residency",
+        ModelResidency(
+            stub_client.running_models, stub_client.load_model, {"stub:1b": "30m"}
+        ),
+    )
+    monkeypatch.setattr("DRIVE.app.model_catalog", ModelCatalog(detect_ollama_models))
+    monkeypatch.setattr("DRIVE.app.scheduler", ModelScheduler())
+    monkeypatch.setattr("DRIVE.app.response_cache", ResponseCache())
+    app.config["TESTING"] = True
+    with app.test_client() as client:
+        yield client
+
+
+def _lines(resp) -> list[dict]:
+    return [
+        json.loads(line) for line in resp.get_data(as_text=True).splitlines() if line
+    ]
+
+
+def test_client_generate_without_stream_returns_json(ollama_stub):
+    result = OllamaClient(ollama_stub.url).generate("stub:1b", "hi")
+    assert result["response"] == "Hello world"
+
+
+def test_client_reuses_pooled_connection(ollama_stub):
+    ollama = OllamaClient(ollama_stub.url)
+    for _ in range(3):
+        assert ollama.list_models() == ["stub:1b"]
+    ollama.generate("stub:1b", "hi")
+    assert len(set(ollama_stub.peers)) == 1
+
+
+def test_client_maps_connection_errors():
+    ollama = OllamaClient("http://127.0.0.1:9", retries=0)
+    with pytest.raises(OllamaConnectionError):
+        ollama.list_models()
+
+
+def test_chat_uses_default_model_from_catalog(client, ollama_stub):
+    resp = client.post("/api/ollama/chat", json={"prompt": "hi"})
+    data = resp.get_json()
+    assert data["ok"] is True
+    assert data["model"] == "stub:1b"
+    assert data["response"] == "Hello world"
+
+
+def test_chat_stream_forwards_tokens_and_saves_history(client, ollama_stub, tmp_path):
+    resp = client.post(
+        "/api/ollama/chat",
+        json={"model": "stub:1b", "prompt": "hi", "profile": "alice", "stream": True},
+    )
+    assert resp.status_code == 200
+    assert resp.mimetype == "application/x-ndjson"
+    events = _lines(resp)
+    assert [e["token"] for e in events if "token" in e] == ["Hello", " ", "world"]
+    final = events[-1]
+    assert final["done"] is True
+    assert final["response"] == "Hello world"
+    resp = client.get("/api/ollama/history/alice")
+    assert resp.get_json()["history"][-1] == {
+        "role": "assistant",
+        "content": "Hello world",
+    }
+    assert ollama_stub.posts("/api/generate")[0]["stream"] is True
+
+
+def test_model_catalog_serves_stale_and_refreshes_in_background():
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        return [f"m{len(calls)}"], None
+
+    catalog = ModelCatalog(fetch, ttl=0.05)
+    assert catalog.get() == (["m1"], None)
+    assert catalog.get() == (["m1"], None)
+    assert len(calls) == 1
+
+    time.sleep(0.06)
+    assert catalog.get() == (["m1"], None)  # stale value returned immediately
+    for _ in range(50):
+        if catalog.get()[0] == ["m2"]:
+            break
+        time.sleep(0.01)
+    assert catalog.get() == (["m2"], None)
+
+    catalog.invalidate()
+    assert catalog.get() == (["m3"], None)
+
+
+def test_models_endpoint_uses_catalog(client, ollama_stub):
+    for _ in range(3):
+        resp = client.get("/api/ollama/models")
+        assert resp.get_json()["models"] == ["stub:1b"]
+    tags = [c for c in ollama_stub.calls if c[1] == "/api/tags"]
+    assert len(tags) == 1
+
+
+def test_conversation_mode_sends_only_deltas(client, ollama_stub):
+    body = {"model": "stub:1b", "profile": "carol", "conversation": "c1", "version": 0}
+    first = client.post("/api/ollama/chat", json={**body, "prompt": "first"}).get_json()
+    assert first["version"] == 2
+    assert first["message"] == {"role": "assistant", "content": "Hello world"}
+    assert "history" not in first and "resync" not in first
+
+    second = client.post(
+        "/api/ollama/chat", json={**body, "prompt": "second", "version": 2}
+    ).get_json()
+    assert second["version"] == 4
+    assert "user: first" in ollama_stub.posts("/api/generate")[-1]["prompt"]
+
+    stale = client.post(
+        "/api/ollama/chat", json={**body, "prompt": "third", "version": 2}
+    ).get_json()
+    assert stale["resync"] is True
+
+    data = client.get(
+        "/api/ollama/conversations/carol/c1", query_string={"since": 4}
+    ).get_json()
+    assert data["version"] == 6
+    assert [m["content"] for m in data["messages"]] == ["third", "Hello world"]
+
+
+def test_conversation_mode_validates_input(client):
+    resp = client.post("/api/ollama/chat", json={"prompt": "x", "conversation": "c1"})
+    assert resp.status_code == 400
+    resp = client.post(
+        "/api/ollama/chat", json={"prompt": "x", "profile": "p", "conversation": "../x"}
+    )
+    assert resp.status_code == 400
+
+
+def test_context_mode_reuses_generate_context(client, ollama_stub):
+    body = {
+        "model": "stub:1b",
+        "profile": "dave",
+        "conversation": "k",
+        "context_mode": "context",
+    }
+    client.post("/api/ollama/chat", json={**body, "prompt": "first"})
+    first = ollama_stub.posts("/api/generate")[-1]
+    assert "context" not in first
+
+    resp = client.post(
+        "/api/ollama/chat", json={**body, "prompt": "second", "stream": True}
+    )
+    assert _lines(resp)[-1]["version"] == 4
+    second = ollama_stub.posts("/api/generate")[-1]
+    assert second["prompt"] == "second"
+    assert second["context"] == [len(ollama_stub.calls) - 1]
+
+    # A different model cannot reuse the tokens and gets the flattened history.
+    client.post("/api/ollama/chat", json={**body, "prompt": "third", "model": "other"})
+    third = ollama_stub.posts("/api/generate")[-1]
+    assert "context" not in third
+    assert "user: second" in third["prompt"]
+
+
+def test_chat_mode_sends_message_list(client, ollama_stub):
+    body = {
+        "model": "stub:1b",
+        "profile": "erin",
+        "conversation": "m",
+        "context_mode": "chat",
+        "keep_alive": "30m",
+    }
+    client.post("/api/ollama/chat", json={**body, "prompt": "first"})
+    resp = client.post(
+        "/api/ollama/chat", json={**body, "prompt": "second", "stream": True}
+    )
+    tokens = [e["token"] for e in _lines(resp) if "token" in e]
+    assert "".join(tokens) == "Hello world"
+    sent = ollama_stub.posts("/api/chat")[-1]
+    assert sent["keep_alive"] == "30m"
+    assert [m["content"] for m in sent["messages"]] == [
+        "first",
+        "Hello world",
+        "second",
+    ]
+
+
+def test_unknown_context_mode_is_rejected(client):
+    resp = client.post(
+        "/api/ollama/chat", json={"prompt": "x", "context_mode": "bogus"}
+    )
+    assert resp.status_code == 400
+
+
+def test_prompt_history_is_trimmed_to_token_budget(client, ollama_stub, monkeypatch):
+    monkeypatch.setattr("DRIVE.app.context_builder", ContextBuilder(40))
+    history = [{"role": "user", "content": f"{i}" * 60} for i in range(4)]
+    client.post(
+        "/api/ollama/chat",
+        json={"model": "stub:1b", "prompt": "hi", "history": history},
+    )
+    sent = ollama_stub.posts("/api/generate")[-1]["prompt"]
+    assert "3" * 60 in sent
+    assert "2" * 60 not in sent
+
+
+def test_full_queue_is_rejected_with_429(client, monkeypatch):
+    scheduler = ModelScheduler(max_concurrent=1, max_queue=0)
+    monkeypatch.setattr("DRIVE.app.scheduler", scheduler)
+    scheduler.enqueue("stub:1b")
+    resp = client.post("/api/ollama/chat", json={"model": "stub:1b", "prompt": "hi"})
+    assert resp.status_code == 429
+    assert resp.headers["Retry-After"]
+
+
+def test_queue_wait_timeout_returns_503(client, monkeypatch):
+    scheduler = ModelScheduler(max_concurrent=1, max_queue=1)
+    monkeypatch.setattr("DRIVE.app.scheduler", scheduler)
+    monkeypatch.setattr("DRIVE.app.settings.ollama_queue_timeout", 0.05)
+    scheduler.enqueue("stub:1b")
+    resp = client.post("/api/ollama/chat", json={"model": "stub:1b", "prompt": "hi"})
+    assert resp.status_code == 503
+    assert scheduler.stats()["stub:1b"]["timedOut"] == 1
+
+
+def test_summaries_queue_behind_chat_requests(client, ollama_stub, monkeypatch):
+    scheduler = ModelScheduler(max_concurrent=1, max_queue=2)
+    monkeypatch.setattr("DRIVE.app.scheduler", scheduler)
+    holder = scheduler.enqueue("stub:1b")
+    summaries = []
+    worker = threading.Thread(
+        target=lambda: summaries.append(app_module._summarize("stub:1b", "old"))
+    )
+    worker.start()
+    while scheduler.stats()["stub:1b"]["queued"] < 1:
+        time.sleep(0.01)
+    chat = scheduler.enqueue("stub:1b")
+    scheduler.release(holder)
+    assert scheduler.wait(chat, timeout=1)
+    assert scheduler.stats()["stub:1b"]["queued"] == 1
+    assert ollama_stub.posts("/api/generate") == []
+    scheduler.release(chat)
+    worker.join(timeout=2)
+    assert summaries == ["".join(ollama_stub.tokens)]
+    assert scheduler.stats()["stub:1b"]["active"] == 0
+
+
+def test_queued_stream_reports_position_then_streams(client, monkeypatch):
+    scheduler = ModelScheduler(max_concurrent=1, max_queue=2)
+    monkeypatch.setattr("DRIVE.app.scheduler", scheduler)
+    monkeypatch.setattr("DRIVE.app.QUEUE_REPORT_INTERVAL", 0.02)
+    holder = scheduler.enqueue("stub:1b")
+    threading.Timer(0.1, scheduler.release, args=(holder,)).start()
+    resp = client.post(
+        "/api/ollama/chat",
+        json={"model": "stub:1b", "prompt": "hi", "stream": True, "request_id": "r1"},
+    )
+    events = _lines(resp)
+    assert events[0] == {"queued": 1}
+    assert events[-1]["done"] is True
+    stats = client.get("/api/ollama/queue").get_json()["models"]["stub:1b"]
+    assert stats["active"] == 0
+    assert stats["generation"]["count"] == 2
+
+
+def test_identical_requests_are_served_from_cache(client, ollama_stub):
+    body = {"model": "stub:1b", "prompt": "Summarize  this"}
+    first = client.post("/api/ollama/chat", json=body).get_json()
+    second = client.post(
+        "/api/ollama/chat", json=dict(body, prompt="Summarize this ")
+    ).get_json()
+    assert "cached" not in first
+    assert second["cached"] is True and second["response"] == first["response"]
+    assert len(ollama_stub.posts("/api/generate")) == 1
+
+    client.post("/api/ollama/chat", json=dict(body, cache=False))
+    assert len(ollama_stub.posts("/api/generate")) == 2
+    stats = client.get("/api/ollama/cache").get_json()["cache"]
+    assert stats["hits"] == 1 and stats["misses"] == 1
+
+
+@pytest.mark.parametrize("cache_size", [128, 0])
+def test_concurrent_identical_requests_share_one_generation(
+    client, ollama_stub, monkeypatch, cache_size
+):
+    monkeypatch.setattr("DRIVE.app.response_cache", ResponseCache(cache_size))
+    ollama_stub.delay = 0.2
+    results = []
+
+    def ask():
+        with app.test_client() as c:
+            results.append(
+                c.post("/api/ollama/chat", json={"model": "stub:1b", "prompt": "same"})
+            )
+
+    threads = [threading.Thread(target=ask) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert [r.status_code for r in results] == [200, 200, 200]
+    assert len(ollama_stub.posts("/api/generate")) == 1
+    assert sum(1 for r in results if r.get_json().get("cached")) == 2
+    # Without storage, a later identical request generates again.
+    client.post("/api/ollama/chat", json={"model": "stub:1b", "prompt": "same"})
+    assert len(ollama_stub.posts("/api/generate")) == (2 if cache_size == 0 else 1)
+
+
+def test_streamed_reply_fills_cache_for_later_streams(client, ollama_stub):
+    body = {"model": "stub:1b", "prompt": "hi", "stream": True, "context_mode": "chat"}
+    _lines(client.post("/api/ollama/chat", json=body))
+    events = _lines(client.post("/api/ollama/chat", json=body))
+    assert events[0] == {"token": "Hello world"}
+    assert events[-1]["done"] is True and events[-1]["cached"] is True
+    assert len(ollama_stub.posts("/api/chat")) == 1
+
+
+def _wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.01)
+
+
+def test_cancel_stops_running_generation(client, ollama_stub):
+    ollama_stub.tokens = ["tok "] * 50
+    ollama_stub.token_delay = 0.02
+    results = []
+
+    def ask():
+        with app.test_client() as c:
+            body = {"model": "stub:1b", "prompt": "long", "request_id": "c1"}
+            results.append(c.post("/api/ollama/chat", json=body))
+
+    thread = threading.Thread(target=ask)
+    thread.start()
+    _wait_for(lambda: ollama_stub.posts("/api/generate"))
+    resp = client.post("/api/ollama/cancel", json={"request_id": "c1"})
+    assert resp.get_json() == {"ok": True, "request_id": "c1"}
+    thread.join(2)
+    assert results[0].status_code == 409
+    assert results[0].get_json()["cancelled"] is True
+    _wait_for(lambda: ollama_stub.aborted == 1)
+    assert (
+        client.post("/api/ollama/cancel", json={"request_id": "c1"}).status_code == 404
+    )
+
+
+def test_cancel_drops_queued_request(client, monkeypatch):
+    scheduler = ModelScheduler(max_concurrent=1, max_queue=1)
+    monkeypatch.setattr("DRIVE.app.scheduler", scheduler)
+    scheduler.enqueue("stub:1b")
+    results = []
+
+    def ask():
+        with app.test_client() as c:
+            body = {"model": "stub:1b", "prompt": "hi", "request_id": "q1"}
+            results.append(c.post("/api/ollama/chat", json=body))
+
+    thread = threading.Thread(target=ask)
+    thread.start()
+    _wait_for(lambda: scheduler.position("q1") == 1)
+    client.post("/api/ollama/cancel", json={"request_id": "q1"})
+    thread.join(2)
+    assert results[0].status_code == 409
+    assert scheduler.stats()["stub:1b"]["queued"] == 0
+
+
+def test_stream_disconnect_closes_upstream(client, ollama_stub):
+    ollama_stub.tokens = ["tok "] * 50
+    ollama_stub.token_delay = 0.02
+    resp = client.post(
+        "/api/ollama/chat",
+        json={"model": "stub:1b", "prompt": "hi", "stream": True, "request_id": "s1"},
+        buffered=False,
+    )
+    assert json.loads(next(resp.response)) == {"token": "tok "}
+    resp.close()
+    _wait_for(lambda: ollama_stub.aborted == 1)
+    assert "s1" not in generations
+    assert (
+        client.get("/api/ollama/queue").get_json()["models"]["stub:1b"]["active"] == 0
+    )
+
+
+def test_warm_loads_model_with_its_keep_alive(client, ollama_stub):
+    resp = client.post("/api/ollama/warm", json={"model": "stub:1b"})
+    assert resp.status_code == 202
+
+    def loaded():
+        models = client.get("/api/ollama/ps?refresh=1").get_json()["models"]
+        return models.get("stub:1b", {}).get("state") == "loaded"
+
+    _wait_for(loaded)
+    load = ollama_stub.posts("/api/generate")[0]
+    assert load["keep_alive"] == "30m" and "prompt" not in load
+    assert client.get("/api/ollama/models").get_json()["loaded"] == ["stub:1b"]
+
+
+def test_chat_uses_per_model_keep_alive(client, ollama_stub):
+    client.post("/api/ollama/chat", json={"model": "stub:1b", "prompt": "hi"})
+    client.post(
+        "/api/ollama/chat",
+        json={"model": "stub:1b", "prompt": "yo", "keep_alive": "5m"},
+    )
+    assert [b["keep_alive"] for b in ollama_stub.posts("/api/generate")] == [
+        "30m",
+        "5m",
+    ]
+
+
+def test_chat_image_is_downscaled_before_sending(client, ollama_stub, monkeypatch):
+    monkeypatch.setattr("DRIVE.app.image_preprocessor", ImagePreprocessor(max_side=64))
+    out = io.BytesIO()
+    Image.new("RGB", (640, 480), (0, 128, 255)).save(out, format="PNG")
+    image = base64.b64encode(out.getvalue()).decode()
+    reply = client.post(
+        "/api/ollama/chat", json={"model": "stub:1b", "prompt": "what?", "image": image}
+    ).get_json()
+    sent = ollama_stub.posts("/api/generate")[0]["images"][0]
+    assert Image.open(io.BytesIO(base64.b64decode(sent))).size == (64, 48)
+    assert reply["image"]["width"] == 64 and reply["image"]["bytes"] == len(sent)
+    bad = client.post("/api/ollama/chat", json={"model": "stub:1b", "image": "%%%"})
+    assert bad.status_code == 400
+
+
+def test_documents_are_retrieved_into_prompt(client, ollama_stub, tmp_path):
+    docs = tmp_path / "users" / "alice" / "documents"
+    docs.mkdir(parents=True)
+    (docs / "wifi.txt").write_text("The office wifi password is hunter2.")
+    (docs / "lunch.txt").write_text("Lunch is served at noon in the cafeteria.")
+    body = {
+        "model": "stub:1b",
+        "prompt": "what is the wifi password",
+        "profile": "alice",
+    }
+    # The first chat does not wait for the documents to be embedded.
+    first = client.post("/api/ollama/chat", json={**body, "documents": True})
+    assert "sources" not in first.get_json()
+    index = app_module.document_indexes.index("alice")
+    for _ in range(500):
+        if len(index) == 2:
+            break
+        time.sleep(0.01)
+    reply = client.post("/api/ollama/chat", json={**body, "documents": True}).get_json()
+    sent = ollama_stub.posts("/api/generate")[-1]["prompt"]
+    assert "hunter2" in sent and sent.endswith("what is the wifi password")
+    assert reply["sources"][0]["path"] == "wifi.txt"
+    # The saved history keeps the user's own words only.
+    assert reply["history"][-2]["content"] == "what is the wifi password"
+
+    found = client.get("/api/ollama/documents/alice/search?q=lunch&k=1").get_json()
+    assert found["results"][0]["path"] == "lunch.txt"
@@ -0,0 +1,83 @@
+import json
+
+import pytest
+
+from DRIVE.app import app
+from DRIVE.ollama_client import OllamaClient, OllamaConnectionError
+from DRIVE.ollama_pool import OllamaPool
+
+
+def _dead_url(make_ollama_stub) -> str:
+    stub = make_ollama_stub()
+    stub.server.shutdown()
+    stub.server.server_close()
+    return stub.url
+
+
+def _pool(*urls) -> OllamaPool:
+    return OllamaPool([OllamaClient(url, retries=0) for url in urls])
+
+
+def test_routes_to_backend_with_model(make_ollama_stub):
+    first, second = make_ollama_stub(), make_ollama_stub()
+    first.models, second.models = ["a:1b"], ["b:1b"]
+    pool = _pool(first.url, second.url)
+    assert pool.list_models() == ["a:1b", "b:1b"]
+    pool.generate("b:1b", "hi")
+    assert not first.posts("/api/generate")
+    assert second.posts("/api/generate")[0]["model"] == "b:1b"
+
+
+def test_least_loaded_backend_is_chosen(make_ollama_stub):
+    first, second = make_ollama_stub(), make_ollama_stub()
+    pool = _pool(first.url, second.url)
+    stream = pool.generate("stub:1b", "long", stream=True)
+    assert json.loads(next(stream))["response"] == "Hello"
+    assert [b["active"] for b in pool.stats()] == [1, 0]
+    pool.chat("stub:1b", [{"role": "user", "content": "hi"}])
+    assert second.posts("/api/chat")
+    stream.close()
+    assert [b["active"] for b in pool.stats()] == [0, 0]
+
+
+def test_fails_over_from_unreachable_backend(make_ollama_stub):
+    dead = _dead_url(make_ollama_stub)
+    live = make_ollama_stub()
+    pool = _pool(dead, live.url)
+    # Let the dead backend look healthy and first in line, as it would
+    # until the next health check notices it went away.
+    pool.check()
+    pool.backends[0].healthy = True
+    pool.backends[0].models = {"stub:1b"}
+    assert pool.generate("stub:1b", "hi")["response"] == "Hello world"
+    lines = list(pool.generate("stub:1b", "hi", stream=True))
+    assert json.loads(lines[-1])["done"] is True
+    dead_stats, live_stats = pool.stats()
+    assert dead_stats["healthy"] is False and dead_stats["failures"] == 1
+    assert live_stats["healthy"] is True
+
+
+def test_no_reachable_backend_raises(make_ollama_stub):
+    pool = _pool(_dead_url(make_ollama_stub), _dead_url(make_ollama_stub))
+    with pytest.raises(OllamaConnectionError):
+        pool.list_models()
+    with pytest.raises(OllamaConnectionError):
+        pool.generate("stub:1b", "hi")
+
+
+def test_backends_endpoint_and_chat_through_pool(
+    make_ollama_stub, monkeypatch, tmp_path
+):
+    first, second = make_ollama_stub(), make_ollama_stub()
+    pool = _pool(first.url, second.url)
+    monkeypatch.setattr("DRIVE.app.BASE_DIR", tmp_path)
+    monkeypatch.setattr("DRIVE.app.ollama_client", pool)
+    app.config["TESTING"] = True
+    with app.test_client() as client:
+        resp = client.post(
+            "/api/ollama/chat",
+            json={"model": "stub:1b", "prompt": "hi", "cache": False},
+        )
+        assert resp.get_json()["response"] == "Hello world"
+        backends = client.get("/api/ollama/backends").get_json()["backends"]
+    assert [b["models"] for b in backends] == [["stub:1b"], ["stub:1b"]]
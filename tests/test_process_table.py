@@ -0,0 +1,49 @@
+import subprocess
+import sys
+
+import pytest
+
+from DRIVE import process_table as module
+from DRIVE.app import app
+from DRIVE.process_table import COLUMNS, ProcessTable
+
+pytestmark = pytest.mark.skipif(module.psutil is None, reason="psutil not installed")
+
+
+def test_walks_once_per_interval():
+    table = ProcessTable(interval=60)
+    first = table.snapshot()
+    assert first["full"] is True and first["columns"] == list(COLUMNS)
+    assert len(first["rows"]["pid"]) == len(first["rows"]["name"]) > 0
+    table.snapshot()
+    table.snapshot(first["version"])
+    assert table.walks == 1
+    quiet = table.snapshot(first["version"])
+    assert quiet["full"] is False
+    assert quiet["added"]["pid"] == quiet["changed"]["pid"] == quiet["removed"] == []
+
+
+def test_diff_reports_added_and_removed_processes():
+    table = ProcessTable(interval=0)
+    before = table.snapshot()
+    child = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])
+    try:
+        added = table.snapshot(before["version"])
+        assert child.pid in added["added"]["pid"]
+    finally:
+        child.kill()
+        child.wait()
+    removed = table.snapshot(added["version"])
+    assert child.pid in removed["removed"]
+    # A version that was never issued gets the whole table.
+    assert table.snapshot(10**6)["full"] is True
+
+
+def test_processes_endpoint(monkeypatch):
+    monkeypatch.setattr("DRIVE.app.process_table", ProcessTable(interval=60))
+    app.config["TESTING"] = True
+    with app.test_client() as client:
+        data = client.get("/api/processes").get_json()
+        assert data["ok"] is True and data["full"] is True
+        diff = client.get(f"/api/processes?since={data['version']}").get_json()
+        assert diff["full"] is False and diff["since"] == data["version"]
@@ -0,0 +1,97 @@
+import threading
+import time
+
+import pytest
+
+from DRIVE.response_cache import ResponseCache, make_key
+
+
+def test_key_normalizes_whitespace_and_separates_inputs():
+    assert make_key("m", "a  b\n") == make_key("m", " a b")
+    assert make_key("m", "a") != make_key("n", "a")
+    assert make_key("m", "a", {"history": [1]}) != make_key("m", "a", {"history": [2]})
+    assert make_key("m", "a", images=["x"]) != make_key("m", "a", images=["y"])
+
+
+def test_lru_and_ttl_eviction(monkeypatch):
+    cache = ResponseCache(max_entries=2, ttl=10)
+    cache.put("a", {"v": 1})
+    cache.put("b", {"v": 2})
+    assert cache.get("a") == {"v": 1}
+    cache.put("c", {"v": 3})
+    assert cache.get("b") is None
+    assert cache.get("a") == {"v": 1}
+
+    now = time.monotonic()
+    monkeypatch.setattr("DRIVE.response_cache.time.monotonic", lambda: now + 11)
+    assert cache.get("a") is None
+    stats = cache.stats()
+    assert stats["entries"] == 1 and stats["evictions"] == 2
+
+
+def test_get_or_compute_coalesces_concurrent_callers():
+    cache = ResponseCache()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(1)
+        return {"response": "x"}
+
+    statuses = []
+    leader = threading.Thread(
+        target=lambda: statuses.append(cache.get_or_compute("k", compute)[1])
+    )
+    leader.start()
+    started.wait(1)
+    follower = threading.Thread(
+        target=lambda: statuses.append(cache.get_or_compute("k", compute)[1])
+    )
+    follower.start()
+    time.sleep(0.05)
+    release.set()
+    leader.join()
+    follower.join()
+    assert calls == [1]
+    assert sorted(statuses) == ["coalesced", "miss"]
+    assert cache.get_or_compute("k", compute) == ({"response": "x"}, "hit")
+
+
+def test_waiters_give_up_after_wait_timeout():
+    cache = ResponseCache(wait_timeout=0.05)
+    started = threading.Event()
+    release = threading.Event()
+
+    def compute():
+        started.set()
+        release.wait(1)
+        return {"response": "x"}
+
+    leader = threading.Thread(target=cache.get_or_compute, args=("k", compute))
+    leader.start()
+    started.wait(1)
+    with pytest.raises(TimeoutError):
+        cache.get_or_compute("k", compute)
+    release.set()
+    leader.join()
+    assert cache.get("k") == {"response": "x"}
+
+
+def test_errors_reach_waiters_and_are_not_cached():
+    cache = ResponseCache()
+
+    def fail():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_compute("k", fail)
+    assert cache.get_or_compute("k", lambda: {"ok": 1}) == ({"ok": 1}, "miss")
+
+
+def test_zero_size_disables_storage():
+    cache = ResponseCache(max_entries=0)
+    cache.put("k", {"v": 1})
+    assert not cache.enabled and cache.get("k") is None
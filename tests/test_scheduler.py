@@ -0,0 +1,74 @@
+import threading
+import time
+
+import pytest
+
+from DRIVE.scheduler import ModelScheduler, QueueFull
+
+
+def test_limits_concurrency_and_rejects_when_queue_full():
+    scheduler = ModelScheduler(max_concurrent=1, max_queue=1)
+    running = scheduler.enqueue("m")
+    assert running.started is not None
+    queued = scheduler.enqueue("m", ticket_id="q")
+    assert scheduler.position("q") == 1
+    with pytest.raises(QueueFull):
+        scheduler.enqueue("m")
+    # Other models have their own slots.
+    assert scheduler.enqueue("other").started is not None
+
+    assert scheduler.wait(queued, timeout=0.01) is False
+    scheduler.release(running)
+    assert scheduler.wait(queued, timeout=1) is True
+    assert scheduler.position("q") == 0
+    stats = scheduler.stats()["m"]
+    assert stats["active"] == 1 and stats["rejected"] == 1
+
+
+def test_priority_then_fifo_order():
+    scheduler = ModelScheduler(max_concurrent=1, max_queue=5)
+    running = scheduler.enqueue("m")
+    low = scheduler.enqueue("m", ticket_id="low")
+    scheduler.enqueue("m", ticket_id="low2")
+    high = scheduler.enqueue("m", priority=5, ticket_id="high")
+    assert [scheduler.position(t) for t in ("high", "low", "low2")] == [1, 2, 3]
+
+    order = []
+
+    def worker(ticket, name):
+        scheduler.wait(ticket, timeout=2)
+        order.append(name)
+        scheduler.release(ticket)
+
+    threads = [
+        threading.Thread(target=worker, args=(low, "low")),
+        threading.Thread(target=worker, args=(high, "high")),
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.05)
+    scheduler.release(running)
+    for thread in threads:
+        thread.join(2)
+    assert order == ["high", "low"]
+
+
+def test_abandon_removes_waiting_ticket():
+    scheduler = ModelScheduler(max_concurrent=1, max_queue=1)
+    scheduler.enqueue("m")
+    queued = scheduler.enqueue("m", ticket_id="gone")
+    scheduler.abandon(queued, timed_out=True)
+    assert scheduler.position("gone") is None
+    assert scheduler.stats()["m"]["timedOut"] == 1
+    scheduler.enqueue("m")  # the freed queue place can be reused
+
+
+def test_cancel_wakes_queued_waiter():
+    scheduler = ModelScheduler(max_concurrent=1, max_queue=1)
+    running = scheduler.enqueue("m")
+    queued = scheduler.enqueue("m", ticket_id="q")
+    threading.Timer(0.05, scheduler.cancel, args=("q",)).start()
+    assert scheduler.wait(queued, timeout=2) is False
+    assert queued.cancelled
+    assert scheduler.position("q") is None
+    assert scheduler.cancel(running.id) is False
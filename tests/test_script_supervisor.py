@@ -0,0 +1,132 @@
+import json
+import time
+
+import pytest
+
+from DRIVE import script_supervisor as module
+from DRIVE.script_supervisor import ScriptSupervisor
+
+
+def _until(check, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if check():
+            return True
+        time.sleep(0.02)
+    raise AssertionError("condition not met in time")
+
+
+@pytest.fixture
+def supervisor(tmp_path):
+    sup = ScriptSupervisor(
+        tmp_path / "processes.json", tmp_path / "logs", interval=60, save_delay=0.05
+    )
+    yield sup
+    for entry in sup.snapshot()["processes"]:
+        sup.stop(entry["pid"], timeout=1)
+    sup.close()
+
+
+def _script(tmp_path, body, name="job.py"):
+    path = tmp_path / name
+    path.write_text(body)
+    return path
+
+
+def test_captures_output_with_tail_and_offset_reads(tmp_path, supervisor):
+    script = _script(
+        tmp_path,
+        "for i in range(5):\n    print(f'line {i}')\nimport sys; print('oops', file=sys.stderr)\n",
+    )
+    entry = supervisor.start(script, "job.py")
+    _until(lambda: supervisor.snapshot()["exited"])
+    assert supervisor.get(entry.pid).returncode == 0
+
+    tail = supervisor.read_log(entry.pid, tail=2)
+    assert tail["text"] == "line 4\noops\n"
+    first = supervisor.read_log(entry.pid, offset=0, limit=7)
+    assert first["text"] == "line 0\n" and first["offset"] == 7
+    rest = supervisor.read_log(entry.pid, offset=first["offset"])
+    assert rest["text"].startswith("line 1\n") and rest["text"].endswith("oops\n")
+    assert supervisor.read_log(12345678) is None
+
+
+def test_samples_resources_and_rotates_logs(tmp_path, supervisor):
+    supervisor.log_max_bytes = 100
+    script = _script(tmp_path, "import time\nprint('x' * 300)\ntime.sleep(30)\n")
+    entry = supervisor.start(script, "job.py")
+    _until(lambda: entry.log_path.exists() and entry.log_path.stat().st_size > 100)
+    supervisor.sample()
+    if module.psutil is not None:
+        assert entry.rss and entry.peak_rss >= entry.rss
+    assert entry.rotated == 301
+    assert (
+        (tmp_path / "logs" / f"{entry.log_path.name}.1").read_text().startswith("xxx")
+    )
+    assert supervisor.read_log(entry.pid, offset=0) == {
+        "pid": entry.pid,
+        "status": "running",
+        "text": "",
+        "offset": 301,
+        "skipped": 301,
+    }
+    assert supervisor.stop(entry.pid)
+    assert not supervisor.stop(entry.pid)
+
+
+def test_rotation_counts_bytes_appended_after_the_size_check(
+    tmp_path, supervisor, monkeypatch
+):
+    supervisor.log_max_bytes = 100
+    script = _script(tmp_path, "print('x' * 300)\n")
+    entry = supervisor.start(script, "job.py")
+    _until(lambda: supervisor.snapshot()["exited"])
+    copy = module.shutil.copyfileobj
+
+    def append_then_copy(src, dst):
+        with open(entry.log_path, "ab") as fh:
+            fh.write(b"late\n")
+        copy(src, dst)
+
+    monkeypatch.setattr(module.shutil, "copyfileobj", append_then_copy)
+    supervisor._rotate(entry)
+    assert entry.rotated == 306
+    backup = tmp_path / "logs" / f"{entry.log_path.name}.1"
+    assert backup.read_text().endswith("late\n")
+
+
+def test_state_is_persisted_and_reattached(tmp_path, supervisor):
+    script = _script(tmp_path, "import time\nprint('hi')\ntime.sleep(30)\n")
+    entry = supervisor.start(script, "job.py")
+    _until(lambda: (tmp_path / "processes.json").exists())
+    records = json.loads((tmp_path / "processes.json").read_text())["scripts"]
+    assert [r["pid"] for r in records] == [entry.pid]
+
+    restarted = ScriptSupervisor(
+        tmp_path / "processes.json", tmp_path / "logs", interval=60
+    )
+    assert restarted.reattach() == 1
+    adopted = restarted.snapshot()["processes"]
+    assert adopted[0]["pid"] == entry.pid and adopted[0]["reattached"] is True
+    _until(lambda: restarted.read_log(entry.pid)["text"] == "hi\n")
+
+    # A recorded PID that now belongs to another process is not adopted.
+    records[0]["createTime"] = 1.0
+    (tmp_path / "other.json").write_text(json.dumps({"scripts": records}))
+    if module.psutil is not None:
+        assert (
+            ScriptSupervisor(tmp_path / "other.json", tmp_path / "logs").reattach() == 0
+        )
+
+    assert restarted.stop(entry.pid, timeout=2)
+    _until(lambda: entry.proc.poll() is not None)
+    restarted.close()
+
+
+@pytest.mark.skipif(module.resource is None, reason="rlimits need POSIX")
+def test_cpu_limit_stops_runaway_script(tmp_path, supervisor):
+    script = _script(tmp_path, "while True:\n    pass\n")
+    entry = supervisor.start(script, "spin.py", cpu_limit=1)
+    assert entry.limits == {"cpu": 1}
+    _until(lambda: supervisor.snapshot()["exited"], timeout=10)
+    assert supervisor.get(entry.pid).returncode < 0
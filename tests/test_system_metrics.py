@@ -0,0 +1,34 @@
+import pytest
+
+from DRIVE import system_metrics as module
+from DRIVE.app import app
+from DRIVE.system_metrics import SERIES, MetricsSampler
+
+pytestmark = pytest.mark.skipif(module.psutil is None, reason="psutil not installed")
+
+
+def test_ring_buffer_keeps_the_newest_samples():
+    sampler = MetricsSampler(interval=1, capacity=3)
+    sampler._prime()
+    for _ in range(5):
+        sampler.sample()
+    history = sampler.history()
+    assert history["count"] == 3
+    times = history["series"]["time"]
+    assert times == sorted(times) and set(history["series"]) == {*SERIES, "cores"}
+    assert all(len(cores) == sampler.cores for cores in history["series"]["cores"])
+    assert sampler.history(window=2)["series"]["time"] == times[-2:]
+    assert sampler.latest()["time"] == times[-1]
+
+
+def test_system_stats_endpoints(monkeypatch):
+    sampler = MetricsSampler(interval=60, capacity=10)
+    monkeypatch.setattr("DRIVE.app.system_metrics", sampler)
+    app.config["TESTING"] = True
+    with app.test_client() as client:
+        stats = client.get("/api/system-stats").get_json()
+        assert {"cpu", "ram", "cores", "netRecv"} <= set(stats)
+        history = client.get("/api/system-stats/history?window=60").get_json()
+        assert history["ok"] is True and history["count"] == 1
+        assert client.get("/api/system-stats/history?window=0").status_code == 400
+    sampler.close()
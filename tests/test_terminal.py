@@ -1,3 +1,7 @@
+import io
+import json
+import os
+import threading
 import time
 
 import pytest
@@ -41,12 +45,14 @@ def test_windows_builtins_use_cmd(monkeypatch, client):
     outputs = {"calls": []}
 
     class DummyProc:
-        def __init__(self, args, stdout=None, stderr=None, text=None, shell=None):
+        def __init__(self, args, stdout=None, stderr=None, shell=None):
             outputs["calls"].append({"args": args, "shell": shell})
+            self.stdout = io.BytesIO(b"ok")
+            self.stderr = io.BytesIO(b"")
             self.returncode = 0
 
-        def communicate(self, timeout=None):
-            return ("ok", "")
+        def wait(self, timeout=None):
+            return self.returncode
 
         def kill(self):
             pass
@@ -78,3 +84,139 @@ def test_command_rejects_operators(client):
     resp = client.post("/api/execute-command", json={"command": "ls && whoami"})
     assert resp.status_code == 400
     assert resp.get_json()["error"] == "Command contains unsupported operators"
+
+
+class PipeProc:
+    """Fake process whose stdout the test writes to while it runs."""
+
+    def __init__(self, args, stdout=None, stderr=None, shell=None):
+        read_fd, self.write_fd = os.pipe()
+        self.stdout = os.fdopen(read_fd, "rb", buffering=0)
+        self.stderr = None
+        self.exited = threading.Event()
+        PipeProc.current = self
+
+    def feed(self, data: bytes) -> None:
+        os.write(self.write_fd, data)
+
+    def exit(self) -> None:
+        os.close(self.write_fd)
+        self.exited.set()
+
+    def wait(self, timeout=None):
+        self.exited.wait(timeout)
+        return 0
+
+    def kill(self):
+        pass
+
+
+def _wait_for_output(client, job_id, offset, expected):
+    for _ in range(50):
+        data = client.get(f"/api/command-status/{job_id}?offset={offset}").get_json()
+        if data["output"] == expected:
+            return data
+        time.sleep(0.02)
+    raise AssertionError(f"output {expected!r} never arrived")
+
+
+def test_status_with_offset_returns_only_new_output(client, monkeypatch):
+    monkeypatch.setattr("DRIVE.app._is_windows", lambda: False)
+    monkeypatch.setattr("DRIVE.app.subprocess.Popen", PipeProc)
+    PipeProc.current = None
+    job_id = client.post(
+        "/api/execute-command", json={"command": "ping localhost"}
+    ).get_json()["job_id"]
+    for _ in range(50):
+        if PipeProc.current is not None:
+            break
+        time.sleep(0.01)
+    proc = PipeProc.current
+    proc.feed(b"line one\n")
+    first = _wait_for_output(client, job_id, 0, "line one\n")
+    assert first["status"] == "running" and first["offset"] == 9
+    assert client.get(f"/api/command-status/{job_id}").get_json() == {
+        "status": "running"
+    }
+
+    # A character split across writes is held back until complete.
+    proc.feed("é".encode()[:1])
+    time.sleep(0.05)
+    assert (
+        client.get(f"/api/command-status/{job_id}?offset=9").get_json()["output"] == ""
+    )
+    proc.feed("é".encode()[1:] + b"two\n")
+    second = _wait_for_output(client, job_id, 9, "étwo\n")
+    proc.exit()
+    job = _wait_for_job(client, job_id)
+    assert job["output"] == "line one\nétwo"
+    final = client.get(
+        f"/api/command-status/{job_id}?offset={second['offset']}"
+    ).get_json()
+    assert final == {
+        "status": "finished",
+        "output": "",
+        "offset": second["offset"],
+        "returncode": 0,
+    }
+
+
+def test_command_stream_sends_output_events(client, monkeypatch):
+    monkeypatch.setattr("DRIVE.app._is_windows", lambda: False)
+    resp = client.post("/api/execute-command", json={"command": "echo streamed"})
+    job_id = resp.get_json()["job_id"]
+    _wait_for_job(client, job_id)
+
+    resp = client.get(f"/api/command-stream/{job_id}")
+    assert resp.mimetype == "text/event-stream"
+    events = [block for block in resp.get_data(as_text=True).split("\n\n") if block]
+    output = events[0].splitlines()
+    assert output[0] == f"id: {len('streamed') + 1}"
+    assert json.loads(output[2][len("data: ") :])["output"] == "streamed\n"
+    assert events[-1].startswith("event: end")
+    assert json.loads(events[-1].splitlines()[1][len("data: ") :])["returncode"] == 0
+
+    # Resuming after the last event id replays nothing but the end event.
+    resp = client.get(f"/api/command-stream/{job_id}", headers={"Last-Event-ID": "9"})
+    assert resp.get_data(as_text=True).startswith("event: end")
+    assert client.get("/api/command-stream/missing").status_code == 404
+
+
+def test_execute_command_rejects_when_queue_is_full(client, monkeypatch):
+    from DRIVE.command_jobs import JobRegistry
+
+    registry = JobRegistry(workers=1, max_queue=1)
+    monkeypatch.setattr("DRIVE.app.command_jobs", registry)
+    monkeypatch.setattr("DRIVE.app._is_windows", lambda: False)
+    monkeypatch.setattr("DRIVE.app.subprocess.Popen", PipeProc)
+    PipeProc.current = None
+    assert (
+        client.post("/api/execute-command", json={"command": "ping a"}).status_code
+        == 200
+    )
+    # Only queue "ping b" once the worker has taken "ping a" off the queue.
+    for _ in range(200):
+        if PipeProc.current is not None:
+            break
+        time.sleep(0.01)
+    assert PipeProc.current is not None
+    assert (
+        client.post("/api/execute-command", json={"command": "ping b"}).status_code
+        == 200
+    )
+    resp = client.post("/api/execute-command", json={"command": "ping c"})
+    assert resp.status_code == 429 and resp.headers["Retry-After"]
+    stats = client.get("/api/command-jobs").get_json()["jobs"]
+    assert stats["rejected"] == 1 and stats["queued"] == 1
+    PipeProc.current.exit()
+
+
+def test_builtin_commands_do_not_spawn(client, monkeypatch):
+    def no_popen(*args, **kwargs):
+        raise AssertionError("builtin command spawned a process")
+
+    monkeypatch.setattr("DRIVE.app._is_windows", lambda: False)
+    monkeypatch.setattr("DRIVE.app.subprocess.Popen", no_popen)
+    resp = client.post("/api/execute-command", json={"command": "echo fast path"})
+    job = _wait_for_job(client, resp.get_json()["job_id"])
+    assert job["returncode"] == 0 and job["output"] == "fast path"
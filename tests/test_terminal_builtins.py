@@ -0,0 +1,71 @@
+import os
+import shutil
+import subprocess
+import time
+
+import pytest
+
+from DRIVE.command_jobs import CommandJob
+from DRIVE.terminal_builtins import resolve
+
+
+def _run(*tokens):
+    builtin = resolve(list(tokens))
+    assert builtin is not None, tokens
+    job = CommandJob(" ".join(tokens))
+    return builtin(job, time.monotonic() + 5), job.output()
+
+
+def _real(*tokens):
+    proc = subprocess.run(
+        list(tokens), capture_output=True, env={**os.environ, "LC_ALL": "C"}
+    )
+    return proc.returncode, (proc.stdout + proc.stderr).decode()
+
+
+@pytest.mark.skipif(os.name != "posix", reason="compares with POSIX tools")
+@pytest.mark.parametrize(
+    "tokens",
+    [
+        ("echo", "hello", "world"),
+        ("echo", "-n", "no newline"),
+        ("uname",),
+        ("uname", "-sr"),
+        ("whoami",),
+        ("date", "+%Y-%m-%d"),
+    ],
+)
+def test_builtins_match_real_commands(tokens):
+    if shutil.which(tokens[0]) is None:
+        pytest.skip(f"{tokens[0]} not installed")
+    assert _run(*tokens) == _real(*tokens)
+
+
+def test_ls_and_cat(tmp_path):
+    (tmp_path / "b.txt").write_text("bee\n")
+    (tmp_path / "a.txt").write_bytes(b"x" * 200_000)
+    (tmp_path / ".hidden").write_text("")
+    (tmp_path / "sub").mkdir()
+
+    assert _run("ls", str(tmp_path)) == (0, "a.txt\nb.txt\nsub\n")
+    assert _run("ls", "-A", str(tmp_path))[1].startswith(".hidden\n")
+    code, text = _run("ls", str(tmp_path / "b.txt"), str(tmp_path / "sub"))
+    assert (code, text) == (0, f"{tmp_path / 'b.txt'}\n\n{tmp_path / 'sub'}:\n")
+    assert _run("ls", str(tmp_path / "missing"))[0] == 2
+
+    code, text = _run("cat", str(tmp_path / "a.txt"), str(tmp_path / "b.txt"))
+    assert code == 0 and len(text) == 200_004 and text.endswith("bee\n")
+    assert _run("cat", str(tmp_path / "sub")) == (
+        1,
+        f"cat: {tmp_path / 'sub'}: Is a directory\n",
+    )
+    assert _run("cat", str(tmp_path / "nope"))[0] == 1
+
+
+def test_unsupported_forms_use_the_real_program():
+    assert resolve(["echo", "-e", "a\\tb"]) is None
+    assert resolve(["ls", "-l"]) is None
+    assert resolve(["cat"]) is None
+    assert resolve(["date", "-u"]) is None
+    assert resolve(["/bin/ls"]) is None
+    assert resolve(["ping", "localhost"]) is None